@@ -1,9 +1,35 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session
+import click
+from flask import (Flask, Response, abort, render_template, request, redirect, url_for, flash, session,
+                   g, make_response, stream_with_context)
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
+from collections import namedtuple
 from datetime import datetime, date, timedelta
+from functools import wraps
+import base64
+import binascii
+import csv
+import hashlib
+import io
+import json
 import os
 
+from cache import CacheLocal, crear_cache_resultados
+from catalogo import agrupar_ejercicios, combinar_menu, copiar_ejercicio
+from compresion import init_compresion
+from contrasenas import HashOcupado, ServicioContrasenas
+from escrituras import ColaEscriturasLlena, ComprometedorAgrupado, EscrituraSinConfirmar
+from estaticos import init_estaticos
+from instrumentacion import init_instrumentacion, presupuesto_sql
+from metricas import QueuePoolMedido, init_metricas, requiere_token_metricas, vigilar_pool
+from migraciones import Migraciones
+from muestreo import lttb
+from records import NOMBRES as NOMBRES_RECORD, TIPOS as TIPOS_RECORD, mejores_marcas, mejores_repeticiones
+from replicas import SesionEnrutada, init_replica
+from transferencia import booleano, copiar_filas, generar_csv, generar_jsonl, leer_registros
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 
@@ -17,7 +43,94 @@ else:
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-db = SQLAlchemy(app)
+# Réplica de solo lectura opcional: las consultas de las peticiones GET se leen de
+# ella salvo justo después de que el usuario escriba o si se queda atrás (replicas.py)
+app.config['REPLICA_VENTANA_ESCRITURA'] = int(os.environ.get('REPLICA_VENTANA_ESCRITURA', 10))
+app.config['REPLICA_MAX_RETRASO'] = float(os.environ.get('REPLICA_MAX_RETRASO', 5))
+app.config['REPLICA_INTERVALO'] = float(os.environ.get('REPLICA_INTERVALO', 5))
+app.config['REPLICA_TIMEOUT_CONEXION'] = int(os.environ.get('REPLICA_TIMEOUT_CONEXION', 2))
+if os.environ.get('DATABASE_REPLICA_URL'):
+    bind_replica = {'url': os.environ['DATABASE_REPLICA_URL']}
+    if bind_replica['url'].startswith('postgresql'):
+        # Con la réplica caída, no esperar al timeout de conexión por defecto
+        bind_replica['connect_args'] = {'connect_timeout': app.config['REPLICA_TIMEOUT_CONEXION']}
+    app.config['SQLALCHEMY_BINDS'] = {'replica': bind_replica}
+
+# En PostgreSQL se mide la espera por conexión del pool (métrica gym_db_pool_wait_seconds)
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql'):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'poolclass': QueuePoolMedido}
+
+# Token opcional para proteger /metrics y /estado/...
+app.config['METRICAS_TOKEN'] = os.environ.get('METRICAS_TOKEN')
+
+# Cabeceras X-SQL-Queries / X-SQL-Time-ms también fuera de modo debug
+app.config['SQL_CONTADOR_CABECERAS'] = os.environ.get('SQL_CONTADOR_CABECERAS') == '1'
+
+# Segundos que se mantiene en memoria el catálogo de ejercicios de cada worker
+app.config['CATALOGO_CACHE_TTL'] = int(os.environ.get('CATALOGO_CACHE_TTL', 300))
+
+# Caché de resultados de las gráficas: en memoria por defecto, o Redis compartido
+# entre workers si se define CACHE_RESULTADOS_URL (redis://...)
+app.config['CACHE_RESULTADOS_URL'] = os.environ.get('CACHE_RESULTADOS_URL')
+app.config['CACHE_RESULTADOS_TTL'] = int(os.environ.get('CACHE_RESULTADOS_TTL', 300))
+app.config['CACHE_RESULTADOS_MAX'] = int(os.environ.get('CACHE_RESULTADOS_MAX', 2048))
+
+# Hash de contraseñas: método de Werkzeug (factor de trabajo), procesos del pool
+# (0 = en el propio hilo), hashes simultáneos admitidos por worker y segundos
+# de espera por una plaza antes de responder 503
+app.config['HASH_METODO'] = os.environ.get('HASH_METODO', 'pbkdf2:sha256:600000')
+app.config['HASH_PROCESOS'] = int(os.environ.get('HASH_PROCESOS', 2))
+app.config['HASH_MAX_PENDIENTES'] = int(os.environ.get('HASH_MAX_PENDIENTES', 3))
+app.config['HASH_ESPERA'] = float(os.environ.get('HASH_ESPERA', 0.2))
+
+# Escrituras agrupadas: registrar_ejercicio y registrar_peso confirman en lotes de
+# hasta ESCRITURAS_LOTE_MAX escrituras, esperando como mucho ESCRITURAS_ESPERA_MS
+# a que se llene el lote; cada petición espera su commit como mucho
+# ESCRITURAS_TIMEOUT segundos (escrituras.py)
+app.config['ESCRITURAS_AGRUPADAS'] = os.environ.get('ESCRITURAS_AGRUPADAS') == '1'
+app.config['ESCRITURAS_LOTE_MAX'] = int(os.environ.get('ESCRITURAS_LOTE_MAX', 50))
+app.config['ESCRITURAS_ESPERA_MS'] = float(os.environ.get('ESCRITURAS_ESPERA_MS', 5))
+app.config['ESCRITURAS_COLA_MAX'] = int(os.environ.get('ESCRITURAS_COLA_MAX', 1000))
+app.config['ESCRITURAS_TIMEOUT'] = float(os.environ.get('ESCRITURAS_TIMEOUT', 10))
+
+# Respuestas HTML/JSON a partir de este tamaño se envían comprimidas (gzip o brotli)
+app.config['COMPRESION_MIN_BYTES'] = int(os.environ.get('COMPRESION_MIN_BYTES', 1024))
+
+db = SQLAlchemy(app, session_options={'class_': SesionEnrutada})
+init_instrumentacion(app)
+replica = init_replica(app, db)
+init_compresion(app)
+init_estaticos(app)
+
+escrituras = None
+if app.config['ESCRITURAS_AGRUPADAS']:
+    escrituras = ComprometedorAgrupado(app, db,
+                                       max_lote=app.config['ESCRITURAS_LOTE_MAX'],
+                                       espera_ms=app.config['ESCRITURAS_ESPERA_MS'],
+                                       max_cola=app.config['ESCRITURAS_COLA_MAX'],
+                                       timeout=app.config['ESCRITURAS_TIMEOUT'])
+
+contrasenas = ServicioContrasenas(app.config['HASH_METODO'],
+                                  procesos=app.config['HASH_PROCESOS'],
+                                  max_pendientes=app.config['HASH_MAX_PENDIENTES'],
+                                  espera=app.config['HASH_ESPERA'])
+
+# Cachés del menú de ejercicios (por proceso)
+cache_catalogo_sistema = CacheLocal(ttl=app.config['CATALOGO_CACHE_TTL'], max_entradas=1)
+cache_ejercicios_usuario = CacheLocal(ttl=app.config['CATALOGO_CACHE_TTL'], max_entradas=2048)
+cache_resultados = crear_cache_resultados(app.config['CACHE_RESULTADOS_URL'],
+                                          app.config['CACHE_RESULTADOS_TTL'],
+                                          app.config['CACHE_RESULTADOS_MAX'])
+
+init_metricas(app, {
+    'resultados': cache_resultados,
+    'catalogo_sistema': cache_catalogo_sistema,
+    'ejercicios_usuario': cache_ejercicios_usuario
+})
+with app.app_context():
+    vigilar_pool(db.engine)
+    if replica:
+        vigilar_pool(replica.engine, 'replica')
 
 # Modelos de base de datos
 class Usuario(db.Model):
@@ -26,6 +139,10 @@ class Usuario(db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
     fecha_registro = db.Column(db.DateTime, default=datetime.utcnow)
+    # Se incrementa con cada escritura del usuario; base de los ETag de las gráficas
+    version_datos = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Se incrementa al crear o quitar ejercicios personalizados; versión de su caché del menú
+    version_ejercicios = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relaciones
     registros = db.relationship('RegistroEjercicio', backref='usuario', lazy=True)
@@ -52,17 +169,39 @@ class RegistroEjercicio(db.Model):
     fecha_registro = db.Column(db.DateTime, default=datetime.utcnow)  # Cuándo se registró
     notas = db.Column(db.Text)
     
+    __table_args__ = (
+        # Progreso de un ejercicio en un rango de fechas
+        db.Index('ix_registro_ejercicio_usuario_ejercicio_fecha', 'usuario_id', 'ejercicio_id', 'fecha'),
+        # Historial paginado por (fecha, id)
+        db.Index('ix_registro_ejercicio_usuario_fecha_id', 'usuario_id', 'fecha', 'id'),
+    )
+    
     # Relación con las series individuales
-    series = db.relationship('SerieEjercicio', backref='registro', lazy=True, cascade='all, delete-orphan')
+    series = db.relationship('SerieEjercicio', backref='registro', lazy=True, cascade='all, delete-orphan',
+                             order_by='SerieEjercicio.numero_serie')
+    # Resumen precalculado de la sesión (ver ResumenRegistro)
+    resumen = db.relationship('ResumenRegistro', backref='registro', uselist=False, lazy=True,
+                              cascade='all, delete-orphan')
 
 class SerieEjercicio(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    registro_id = db.Column(db.Integer, db.ForeignKey('registro_ejercicio.id'), nullable=False)
+    registro_id = db.Column(db.Integer, db.ForeignKey('registro_ejercicio.id'), nullable=False, index=True)
     numero_serie = db.Column(db.Integer, nullable=False)  # 1, 2, 3, etc.
     peso = db.Column(db.Float, nullable=False)
     repeticiones = db.Column(db.Integer, nullable=False)
     completada = db.Column(db.Boolean, default=True)  # Si la serie se completó
 
+class ResumenRegistro(db.Model):
+    """Métricas de una sesión, guardadas al registrarla (una sesión no cambia después)"""
+    registro_id = db.Column(db.Integer, db.ForeignKey('registro_ejercicio.id'), primary_key=True)
+    series_total = db.Column(db.Integer, nullable=False)
+    repeticiones_total = db.Column(db.Integer, nullable=False)
+    volumen_total = db.Column(db.Float, nullable=False)  # Suma de peso × repeticiones
+    peso_max = db.Column(db.Float, nullable=False)
+    peso_promedio = db.Column(db.Float, nullable=False)
+    peso_primera_serie = db.Column(db.Float, nullable=False)
+    reps_primera_serie = db.Column(db.Integer, nullable=False)
+
 class RegistroPeso(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), nullable=False)
@@ -70,6 +209,749 @@ class RegistroPeso(db.Model):
     fecha = db.Column(db.Date, nullable=False, default=date.today)
     fecha_registro = db.Column(db.DateTime, default=datetime.utcnow)
     notas = db.Column(db.Text)  # Observaciones opcionales
+    
+    __table_args__ = (
+        # Un único peso por usuario y día (también sirve de índice para las gráficas)
+        db.Index('uq_registro_peso_usuario_fecha', 'usuario_id', 'fecha', unique=True),
+    )
+
+class LoteEntrenamiento(db.Model):
+    """Claves de idempotencia de /api/entrenamientos (un reintento no duplica sesiones)"""
+    id = db.Column(db.Integer, primary_key=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), nullable=False)
+    clave = db.Column(db.String(64), nullable=False)
+    registro_ids = db.Column(db.Text)  # Lista JSON de los registros creados
+    fecha_registro = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('uq_lote_entrenamiento_usuario_clave', 'usuario_id', 'clave', unique=True),
+    )
+
+class RecordPersonal(db.Model):
+    """Mejor marca de cada usuario por ejercicio y tipo (ver records.py)"""
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), primary_key=True)
+    ejercicio_id = db.Column(db.Integer, db.ForeignKey('ejercicio.id'), primary_key=True)
+    tipo = db.Column(db.String(20), primary_key=True)
+    valor = db.Column(db.Float, nullable=False)
+    peso = db.Column(db.Float)  # Serie de la marca (vacío en el récord de volumen)
+    repeticiones = db.Column(db.Integer)
+    registro_id = db.Column(db.Integer, db.ForeignKey('registro_ejercicio.id'), nullable=False)
+    fecha = db.Column(db.Date, nullable=False)
+
+class RecordRepeticiones(db.Model):
+    """Más repeticiones en una serie de cada usuario por ejercicio y peso (ver records.py)"""
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), primary_key=True)
+    ejercicio_id = db.Column(db.Integer, db.ForeignKey('ejercicio.id'), primary_key=True)
+    peso = db.Column(db.Float, primary_key=True)
+    repeticiones = db.Column(db.Integer, nullable=False)
+    registro_id = db.Column(db.Integer, db.ForeignKey('registro_ejercicio.id'), nullable=False)
+    fecha = db.Column(db.Date, nullable=False)
+
+class ResumenEjercicioPeriodo(db.Model):
+    """Sesiones de un ejercicio agregadas por semana o mes (se recalculan al escribir)"""
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), primary_key=True)
+    ejercicio_id = db.Column(db.Integer, db.ForeignKey('ejercicio.id'), primary_key=True)
+    periodo = db.Column(db.String(6), primary_key=True)  # 'semana' o 'mes'
+    inicio = db.Column(db.Date, primary_key=True)  # Lunes de la semana o día 1 del mes
+    sesiones = db.Column(db.Integer, nullable=False)
+    series_total = db.Column(db.Integer, nullable=False)
+    repeticiones_total = db.Column(db.Integer, nullable=False)
+    volumen_total = db.Column(db.Float, nullable=False)
+    peso_max = db.Column(db.Float, nullable=False)
+    suma_peso_promedio = db.Column(db.Float, nullable=False)  # Para la media de las sesiones
+    peso_primera_serie = db.Column(db.Float, nullable=False)  # Mejor primera serie del periodo
+    reps_primera_serie = db.Column(db.Integer, nullable=False)
+    peso_primera_inicial = db.Column(db.Float, nullable=False)  # Primera serie de la primera sesión
+    peso_primera_final = db.Column(db.Float, nullable=False)  # ... y de la última
+
+class ResumenPesoPeriodo(db.Model):
+    """Pesos corporales agregados por semana o mes (se recalculan al escribir)"""
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), primary_key=True)
+    periodo = db.Column(db.String(6), primary_key=True)
+    inicio = db.Column(db.Date, primary_key=True)
+    registros = db.Column(db.Integer, nullable=False)
+    suma_peso = db.Column(db.Float, nullable=False)
+    peso_inicial = db.Column(db.Float, nullable=False)  # Primer peso del periodo
+    peso_final = db.Column(db.Float, nullable=False)  # Último peso del periodo
+
+class VolumenGrupoSemana(db.Model):
+    """Volumen semanal por grupo muscular (se recalcula al escribir)"""
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), primary_key=True)
+    grupo_muscular = db.Column(db.String(50), primary_key=True)
+    inicio = db.Column(db.Date, primary_key=True)  # Lunes de la semana
+    sesiones = db.Column(db.Integer, nullable=False)
+    series_total = db.Column(db.Integer, nullable=False)
+    repeticiones_total = db.Column(db.Integer, nullable=False)
+    volumen_total = db.Column(db.Float, nullable=False)
+
+# Últimos registros del dashboard (orden descendente por momento de registro)
+db.Index('ix_registro_ejercicio_usuario_fecha_registro',
+         RegistroEjercicio.usuario_id, RegistroEjercicio.fecha_registro.desc())
+
+def guardar_pesos(usuario_id, pesos):
+    """Insertar o actualizar pesos diarios en una sola sentencia (sin carreras)
+
+    ``pesos`` es una lista de dicts con fecha, peso y notas.
+    """
+    ahora = datetime.utcnow()
+    filas = [dict(peso, usuario_id=usuario_id, fecha_registro=ahora) for peso in pesos]
+    dialecto = db.session.get_bind().dialect.name
+    if dialecto in ('postgresql', 'sqlite'):
+        insertar = (postgresql.insert if dialecto == 'postgresql' else sqlite.insert)(RegistroPeso)
+        sentencia = insertar.on_conflict_do_update(
+            index_elements=['usuario_id', 'fecha'],
+            set_={
+                'peso': insertar.excluded.peso,
+                'notas': insertar.excluded.notas,
+                'fecha_registro': insertar.excluded.fecha_registro
+            }
+        )
+        db.session.execute(sentencia, filas)
+    else:
+        # Otros motores: buscar y actualizar
+        for fila in filas:
+            registro = RegistroPeso.query.filter_by(usuario_id=usuario_id, fecha=fila['fecha']).first()
+            if registro:
+                registro.peso = fila['peso']
+                registro.notas = fila['notas']
+                registro.fecha_registro = ahora
+            else:
+                db.session.add(RegistroPeso(**fila))
+        db.session.flush()
+    
+    actualizar_resumenes_peso(usuario_id, [fila['fecha'] for fila in filas])
+
+def eliminar_pesos_duplicados():
+    """Dejar un solo peso por usuario y día, el registrado más tarde (sin commit)
+
+    Bases anteriores al índice único pueden tener duplicados de cuando se
+    buscaba y luego se insertaba. Devuelve cuántas filas se han borrado.
+    """
+    otro = db.aliased(RegistroPeso)
+    registrado = lambda modelo: db.func.coalesce(modelo.fecha_registro, datetime.min)
+    posterior = db.session.query(otro.id).filter(
+        otro.usuario_id == RegistroPeso.usuario_id,
+        otro.fecha == RegistroPeso.fecha,
+        db.or_(registrado(otro) > registrado(RegistroPeso),
+               db.and_(registrado(otro) == registrado(RegistroPeso), otro.id > RegistroPeso.id))
+    ).exists()
+    return db.session.query(RegistroPeso).filter(posterior).delete(synchronize_session=False)
+
+def guardar_peso(usuario_id, fecha, peso, notas):
+    """Insertar o actualizar el peso de un día"""
+    guardar_pesos(usuario_id, [{'fecha': fecha, 'peso': peso, 'notas': notas}])
+
+def marcar_datos_modificados(usuario_id):
+    """Subir la versión de datos del usuario (en la transacción en curso, sin commit)
+
+    El UPDATE bloquea la fila del usuario hasta el commit, así que las
+    escrituras de un mismo usuario se ejecutan de una en una. Se llama antes
+    de tocar sus datos: los resúmenes se recalculan con INSERT ... SELECT y,
+    sin este bloqueo, dos transacciones a la vez no verían las sesiones de la
+    otra y la última en confirmar pisaría el resumen de la primera.
+    """
+    db.session.query(Usuario).filter_by(id=usuario_id).update(
+        {Usuario.version_datos: Usuario.version_datos + 1}, synchronize_session=False
+    )
+
+def escribir(trabajo):
+    """Ejecutar una escritura y confirmarla; devuelve lo que devuelva ``trabajo``
+
+    ``trabajo`` es una función sin argumentos que escribe con db.session sin
+    hacer commit ni usar la petición. Con ESCRITURAS_AGRUPADAS se confirma
+    en el siguiente lote del committer y si no, aquí mismo.
+    """
+    if escrituras is None:
+        resultado = trabajo()
+        db.session.commit()
+        return resultado
+    # La petición no necesita su conexión mientras espera al lote
+    db.session.close()
+    return escrituras.enviar(trabajo)
+
+def _escrituras_ocupadas():
+    flash('Hay muchos registros en curso, inténtalo de nuevo en unos segundos', 'error')
+    return redirect(url_for('dashboard'))
+
+def _escritura_sin_confirmar(error):
+    """503 cuando el lote de una escritura agrupada no se confirmó a tiempo"""
+    if error.descartada:
+        mensaje = 'No se ha podido guardar el registro, inténtalo de nuevo en unos segundos'
+    else:
+        mensaje = 'El registro está tardando en guardarse: revisa el historial antes de repetirlo'
+    respuesta = make_response(mensaje, 503)
+    respuesta.headers['Retry-After'] = '5'
+    return respuesta
+
+def _versiones_usuario():
+    # Las dos versiones del usuario de la sesión en una consulta por petición como máximo
+    if 'versiones_usuario' not in g:
+        g.versiones_usuario = db.session.query(
+            Usuario.version_datos, Usuario.version_ejercicios
+        ).filter_by(id=session['user_id']).first() or (None, None)
+    return g.versiones_usuario
+
+def version_datos():
+    """Versión de datos del usuario de la sesión"""
+    return _versiones_usuario()[0]
+
+def version_ejercicios():
+    """Versión de los ejercicios personalizados del usuario de la sesión"""
+    return _versiones_usuario()[1]
+
+def respuesta_condicional(vista):
+    """ETag basado en la versión de datos del usuario para los endpoints JSON de gráficas
+
+    Si el cliente ya tiene la respuesta (If-None-Match) se contesta 304 sin
+    ejecutar la vista. El ETag incluye la fecha de hoy porque los periodos se
+    calculan desde hoy, y la URL completa porque cada filtro da otro resultado.
+    """
+    @wraps(vista)
+    def envoltura(*args, **kwargs):
+        if 'user_id' not in session:
+            return vista(*args, **kwargs)
+        
+        etag = hashlib.sha1(
+            f'{session["user_id"]}:{version_datos()}:{date.today()}:{request.full_path}'.encode()
+        ).hexdigest()
+        
+        if request.if_none_match.contains_weak(etag):
+            respuesta = make_response('', 304)
+        else:
+            respuesta = make_response(vista(*args, **kwargs))
+            if respuesta.status_code != 200:
+                return respuesta
+        respuesta.set_etag(etag, weak=True)
+        # El navegador puede guardarla, pero debe revalidar siempre
+        respuesta.headers['Cache-Control'] = 'private, no-cache'
+        return respuesta
+    return envoltura
+
+class _SinCache(Exception):
+    """La vista devolvió algo distinto de un dict (error, redirección...): no se guarda"""
+    def __init__(self, respuesta):
+        self.respuesta = respuesta
+
+def cachear_resultado(vista):
+    """Guardar en cache_resultados el dict que calcula una vista de gráficas
+
+    La clave incluye la versión de datos del usuario, así que cualquier
+    escritura suya invalida sus entradas en todos los workers.
+    """
+    @wraps(vista)
+    def envoltura(*args, **kwargs):
+        if 'user_id' not in session:
+            return vista(*args, **kwargs)
+        
+        clave = (
+            vista.__name__,
+            session['user_id'],
+            date.today().isoformat(),
+            tuple(sorted(kwargs.items())),
+            tuple(sorted(request.args.items(multi=True)))
+        )
+        
+        def calcular():
+            resultado = vista(*args, **kwargs)
+            if not isinstance(resultado, dict):
+                raise _SinCache(resultado)
+            return resultado
+        
+        try:
+            return cache_resultados.obtener(clave, calcular, version=version_datos())
+        except _SinCache as e:
+            return e.respuesta
+    return envoltura
+
+def _cargar_catalogo_sistema():
+    ejercicios = tuple(copiar_ejercicio(e) for e in Ejercicio.query.filter_by(
+        usuario_id=None, activo=True
+    ).order_by(Ejercicio.id).all())
+    return ejercicios, agrupar_ejercicios(ejercicios)
+
+def menu_ejercicios(usuario_id):
+    """Ejercicios del sistema + personalizados, agrupados, desde la caché en memoria
+
+    Los personalizados se guardan con la versión de ejercicios del usuario,
+    guardada en la base de datos, así que tras crear o eliminar uno cualquier
+    worker ve el cambio al instante, venga de la sesión o del dispositivo que venga.
+    Devuelve (todos, agrupados, grupos_ordenados, personalizados).
+    """
+    sistema = cache_catalogo_sistema.obtener('sistema', _cargar_catalogo_sistema)
+    personalizados = cache_ejercicios_usuario.obtener(
+        usuario_id,
+        lambda: tuple(copiar_ejercicio(e) for e in Ejercicio.query.filter_by(
+            usuario_id=usuario_id, activo=True
+        ).order_by(Ejercicio.id).all()),
+        version=version_ejercicios()
+    )
+    todos, agrupados, grupos_ordenados = combinar_menu(sistema, personalizados)
+    return todos, agrupados, grupos_ordenados, list(personalizados)
+
+def invalidar_ejercicios_usuario(usuario_id):
+    """Subir la versión de ejercicios del usuario (en la transacción en curso, sin commit)"""
+    db.session.query(Usuario).filter_by(id=usuario_id).update(
+        {Usuario.version_ejercicios: Usuario.version_ejercicios + 1}, synchronize_session=False
+    )
+    cache_ejercicios_usuario.invalidar(usuario_id)
+
+def metricas_resumen(series):
+    """Columnas de ResumenRegistro para una lista no vacía de series"""
+    series = sorted(series, key=lambda x: x.numero_serie)
+    pesos = [serie.peso for serie in series]
+    return {
+        'series_total': len(series),
+        'repeticiones_total': sum(serie.repeticiones for serie in series),
+        'volumen_total': sum(serie.peso * serie.repeticiones for serie in series),
+        'peso_max': max(pesos),
+        'peso_promedio': sum(pesos) / len(pesos),
+        'peso_primera_serie': series[0].peso,
+        'reps_primera_serie': series[0].repeticiones
+    }
+
+def rellenar_resumenes():
+    """Crear los resúmenes que falten a partir de las series (INSERT ... SELECT)"""
+    por_registro = db.session.query(
+        SerieEjercicio.registro_id.label('registro_id'),
+        db.func.count(SerieEjercicio.id).label('series_total'),
+        db.func.sum(SerieEjercicio.repeticiones).label('repeticiones_total'),
+        db.func.sum(SerieEjercicio.peso * SerieEjercicio.repeticiones).label('volumen_total'),
+        db.func.max(SerieEjercicio.peso).label('peso_max'),
+        db.func.avg(SerieEjercicio.peso).label('peso_promedio'),
+        db.func.min(SerieEjercicio.numero_serie).label('primera_serie')
+    ).filter(
+        ~db.exists().where(ResumenRegistro.registro_id == SerieEjercicio.registro_id)
+    ).group_by(SerieEjercicio.registro_id).subquery()
+
+    primera = db.aliased(SerieEjercicio)
+    origen = db.select(
+        por_registro.c.registro_id,
+        por_registro.c.series_total,
+        por_registro.c.repeticiones_total,
+        por_registro.c.volumen_total,
+        por_registro.c.peso_max,
+        por_registro.c.peso_promedio,
+        primera.peso,
+        primera.repeticiones
+    ).join(
+        primera, db.and_(primera.registro_id == por_registro.c.registro_id,
+                         primera.numero_serie == por_registro.c.primera_serie)
+    )
+    columnas = ['registro_id', 'series_total', 'repeticiones_total', 'volumen_total',
+                'peso_max', 'peso_promedio', 'peso_primera_serie', 'reps_primera_serie']
+    resultado = db.session.execute(db.insert(ResumenRegistro).from_select(columnas, origen))
+    db.session.commit()
+    return resultado.rowcount
+
+@app.cli.command('rellenar-resumenes')
+def rellenar_resumenes_command():
+    """Generar ResumenRegistro para los registros existentes que no lo tengan"""
+    creados = rellenar_resumenes()
+    print(f'Resúmenes creados: {creados}')
+
+# Granularidades de los resúmenes por periodo
+PERIODOS_RESUMEN = ('semana', 'mes')
+
+def _inicio_periodo(fecha, periodo):
+    """Lunes de la semana o día 1 del mes de una fecha"""
+    if periodo == 'semana':
+        return fecha - timedelta(days=fecha.weekday())
+    return fecha.replace(day=1)
+
+def _siguiente_periodo(inicio, periodo):
+    if periodo == 'semana':
+        return inicio + timedelta(days=7)
+    return (inicio + timedelta(days=32)).replace(day=1)
+
+def _origen_resumen_ejercicio(periodo, *filtros):
+    """SELECT con las filas de ResumenEjercicioPeriodo calculadas desde los resúmenes de sesión"""
+    cubo = _cubo_fecha(RegistroEjercicio.fecha, periodo)
+    por_periodo = (RegistroEjercicio.usuario_id, RegistroEjercicio.ejercicio_id, cubo)
+    orden = (RegistroEjercicio.fecha.asc(), RegistroEjercicio.id.asc())
+    todo_el_periodo = (None, None)
+    sesiones = db.select(
+        RegistroEjercicio.usuario_id,
+        RegistroEjercicio.ejercicio_id,
+        cubo.label('inicio'),
+        ResumenRegistro.series_total,
+        ResumenRegistro.repeticiones_total,
+        ResumenRegistro.volumen_total,
+        ResumenRegistro.peso_max,
+        ResumenRegistro.peso_promedio,
+        ResumenRegistro.peso_primera_serie,
+        ResumenRegistro.reps_primera_serie,
+        db.func.first_value(ResumenRegistro.peso_primera_serie).over(
+            partition_by=por_periodo, order_by=orden, rows=todo_el_periodo).label('primera'),
+        db.func.last_value(ResumenRegistro.peso_primera_serie).over(
+            partition_by=por_periodo, order_by=orden, rows=todo_el_periodo).label('ultima'),
+        # La mejor primera serie del periodo se elige entera (peso y repeticiones de la misma sesión)
+        db.func.row_number().over(
+            partition_by=por_periodo,
+            order_by=(ResumenRegistro.peso_primera_serie.desc(), ResumenRegistro.reps_primera_serie.desc())
+        ).label('orden_primera_serie')
+    ).join(
+        ResumenRegistro, ResumenRegistro.registro_id == RegistroEjercicio.id
+    ).where(*filtros).subquery()
+    # El WHERE evita la ambigüedad de SQLite entre INSERT ... SELECT y ON CONFLICT
+    return db.select(
+        sesiones.c.usuario_id,
+        sesiones.c.ejercicio_id,
+        db.literal(periodo).label('periodo'),
+        sesiones.c.inicio,
+        db.func.count().label('sesiones'),
+        db.func.sum(sesiones.c.series_total).label('series_total'),
+        db.func.sum(sesiones.c.repeticiones_total).label('repeticiones_total'),
+        db.func.sum(sesiones.c.volumen_total).label('volumen_total'),
+        db.func.max(sesiones.c.peso_max).label('peso_max'),
+        db.func.sum(sesiones.c.peso_promedio).label('suma_peso_promedio'),
+        db.func.max(sesiones.c.peso_primera_serie).label('peso_primera_serie'),
+        db.func.max(db.case((sesiones.c.orden_primera_serie == 1, sesiones.c.reps_primera_serie))
+                    ).label('reps_primera_serie'),
+        db.func.max(sesiones.c.primera).label('peso_primera_inicial'),
+        db.func.max(sesiones.c.ultima).label('peso_primera_final')
+    ).where(db.true()).group_by(sesiones.c.usuario_id, sesiones.c.ejercicio_id, sesiones.c.inicio)
+
+def _origen_resumen_peso(periodo, *filtros):
+    """SELECT con las filas de ResumenPesoPeriodo calculadas desde los pesos diarios"""
+    cubo = _cubo_fecha(RegistroPeso.fecha, periodo)
+    por_periodo = (RegistroPeso.usuario_id, cubo)
+    todo_el_periodo = (None, None)
+    pesos = db.select(
+        RegistroPeso.usuario_id,
+        cubo.label('inicio'),
+        RegistroPeso.peso,
+        db.func.first_value(RegistroPeso.peso).over(
+            partition_by=por_periodo, order_by=RegistroPeso.fecha, rows=todo_el_periodo).label('primero'),
+        db.func.last_value(RegistroPeso.peso).over(
+            partition_by=por_periodo, order_by=RegistroPeso.fecha, rows=todo_el_periodo).label('ultimo')
+    ).where(*filtros).subquery()
+    return db.select(
+        pesos.c.usuario_id,
+        db.literal(periodo).label('periodo'),
+        pesos.c.inicio,
+        db.func.count().label('registros'),
+        db.func.sum(pesos.c.peso).label('suma_peso'),
+        db.func.max(pesos.c.primero).label('peso_inicial'),
+        db.func.max(pesos.c.ultimo).label('peso_final')
+    ).where(db.true()).group_by(pesos.c.usuario_id, pesos.c.inicio)
+
+def _origen_volumen_grupo(*filtros):
+    """SELECT con las filas de VolumenGrupoSemana calculadas desde los resúmenes de sesión"""
+    cubo = _cubo_fecha(RegistroEjercicio.fecha, 'semana')
+    return db.select(
+        RegistroEjercicio.usuario_id,
+        Ejercicio.grupo_muscular,
+        cubo.label('inicio'),
+        db.func.count().label('sesiones'),
+        db.func.sum(ResumenRegistro.series_total).label('series_total'),
+        db.func.sum(ResumenRegistro.repeticiones_total).label('repeticiones_total'),
+        db.func.sum(ResumenRegistro.volumen_total).label('volumen_total')
+    ).join(
+        ResumenRegistro, ResumenRegistro.registro_id == RegistroEjercicio.id
+    ).join(
+        Ejercicio, Ejercicio.id == RegistroEjercicio.ejercicio_id
+    ).where(db.true(), *filtros).group_by(RegistroEjercicio.usuario_id, Ejercicio.grupo_muscular, cubo)
+
+def _guardar_resumenes(modelo, origen, borrar):
+    """Escribir las filas de ``origen`` sustituyendo las que ya existan (sin commit)
+
+    En PostgreSQL y SQLite es un único INSERT ... SELECT ... ON CONFLICT, que
+    no choca con otra escritura simultánea sobre el mismo periodo. En otros
+    motores se borran antes las filas de ``borrar`` (una sentencia DELETE).
+    """
+    columnas = [columna.name for columna in origen.selected_columns]
+    claves = [columna.name for columna in modelo.__table__.primary_key]
+    dialecto = db.session.get_bind().dialect.name
+    if dialecto in ('postgresql', 'sqlite'):
+        insertar = (postgresql.insert if dialecto == 'postgresql' else sqlite.insert)(modelo)
+        insertar = insertar.from_select(columnas, origen)
+        db.session.execute(insertar.on_conflict_do_update(
+            index_elements=claves,
+            set_={columna: insertar.excluded[columna] for columna in columnas if columna not in claves}
+        ))
+        return
+    db.session.execute(borrar)
+    db.session.execute(db.insert(modelo).from_select(columnas, origen))
+
+def _tramo_periodos(fechas, periodo):
+    """Periodos completos ``[desde, hasta)`` que contienen todas las fechas"""
+    return _inicio_periodo(min(fechas), periodo), _siguiente_periodo(_inicio_periodo(max(fechas), periodo), periodo)
+
+def actualizar_resumenes_ejercicio(usuario_id, sesiones):
+    """Recalcular los resúmenes por semana, mes y grupo muscular que tocan ``sesiones`` (sin commit)
+
+    Se recalcula cada periodo afectado entero a partir de ResumenRegistro,
+    con una sentencia por tabla y granularidad.
+    """
+    if not sesiones:
+        return
+    fechas = [sesion['fecha'] for sesion in sesiones]
+    ejercicio_ids = {int(sesion['ejercicio_id']) for sesion in sesiones}
+    for periodo in PERIODOS_RESUMEN:
+        desde, hasta = _tramo_periodos(fechas, periodo)
+        _guardar_resumenes(ResumenEjercicioPeriodo, _origen_resumen_ejercicio(
+            periodo,
+            RegistroEjercicio.usuario_id == usuario_id,
+            RegistroEjercicio.ejercicio_id.in_(ejercicio_ids),
+            RegistroEjercicio.fecha >= desde,
+            RegistroEjercicio.fecha < hasta
+        ), db.delete(ResumenEjercicioPeriodo).where(
+            ResumenEjercicioPeriodo.usuario_id == usuario_id,
+            ResumenEjercicioPeriodo.ejercicio_id.in_(ejercicio_ids),
+            ResumenEjercicioPeriodo.periodo == periodo,
+            ResumenEjercicioPeriodo.inicio >= desde,
+            ResumenEjercicioPeriodo.inicio < hasta
+        ))
+    
+    # Volumen por grupo: se recalculan todos los grupos de las semanas afectadas
+    desde, hasta = _tramo_periodos(fechas, 'semana')
+    _guardar_resumenes(VolumenGrupoSemana, _origen_volumen_grupo(
+        RegistroEjercicio.usuario_id == usuario_id,
+        RegistroEjercicio.fecha >= desde,
+        RegistroEjercicio.fecha < hasta
+    ), db.delete(VolumenGrupoSemana).where(
+        VolumenGrupoSemana.usuario_id == usuario_id,
+        VolumenGrupoSemana.inicio >= desde,
+        VolumenGrupoSemana.inicio < hasta
+    ))
+
+def actualizar_resumenes_peso(usuario_id, fechas):
+    """Recalcular los resúmenes de peso de las semanas y meses de ``fechas`` (sin commit)"""
+    if not fechas:
+        return
+    for periodo in PERIODOS_RESUMEN:
+        desde, hasta = _tramo_periodos(fechas, periodo)
+        _guardar_resumenes(ResumenPesoPeriodo, _origen_resumen_peso(
+            periodo,
+            RegistroPeso.usuario_id == usuario_id,
+            RegistroPeso.fecha >= desde,
+            RegistroPeso.fecha < hasta
+        ), db.delete(ResumenPesoPeriodo).where(
+            ResumenPesoPeriodo.usuario_id == usuario_id,
+            ResumenPesoPeriodo.periodo == periodo,
+            ResumenPesoPeriodo.inicio >= desde,
+            ResumenPesoPeriodo.inicio < hasta
+        ))
+
+def reconstruir_resumenes_periodo(usuario_id=None):
+    """Volver a calcular desde cero los resúmenes por periodo de un usuario (o de todos)
+
+    Devuelve el número de filas creadas en cada tabla.
+    """
+    def del_usuario(columna):
+        return [columna == usuario_id] if usuario_id is not None else []
+    
+    origenes = {
+        ResumenEjercicioPeriodo: [_origen_resumen_ejercicio(periodo, *del_usuario(RegistroEjercicio.usuario_id))
+                                  for periodo in PERIODOS_RESUMEN],
+        ResumenPesoPeriodo: [_origen_resumen_peso(periodo, *del_usuario(RegistroPeso.usuario_id))
+                             for periodo in PERIODOS_RESUMEN],
+        VolumenGrupoSemana: [_origen_volumen_grupo(*del_usuario(RegistroEjercicio.usuario_id))]
+    }
+    
+    creados = {}
+    for modelo, selects in origenes.items():
+        borrar = db.delete(modelo)
+        if usuario_id is not None:
+            borrar = borrar.where(modelo.usuario_id == usuario_id)
+        db.session.execute(borrar)
+        creados[modelo.__tablename__] = 0
+        for origen in selects:
+            columnas = [columna.name for columna in origen.selected_columns]
+            resultado = db.session.execute(db.insert(modelo).from_select(columnas, origen))
+            creados[modelo.__tablename__] += resultado.rowcount
+    db.session.commit()
+    return creados
+
+@app.cli.command('reconstruir-resumenes-periodo')
+@click.option('--usuario', type=int, help='Solo los resúmenes de este usuario (id)')
+def reconstruir_resumenes_periodo_command(usuario):
+    """Recalcular los resúmenes semanales/mensuales y el volumen por grupo muscular"""
+    for tabla, creados in reconstruir_resumenes_periodo(usuario).items():
+        print(f'{tabla}: {creados} filas')
+
+def actualizar_records(usuario_id, registro_ids, sesiones):
+    """Actualizar los récords con sesiones recién insertadas (en la transacción en curso)
+
+    Lee los récords actuales de los ejercicios afectados, compara con las
+    mejores marcas de ``sesiones`` y escribe solo las que los superan.
+    Devuelve los récords batidos (no los primeros de cada ejercicio o peso)
+    como dicts con ejercicio_id, tipo, valor, anterior y peso.
+    """
+    marcas = mejores_marcas(sesiones)
+    if not marcas:
+        return []
+    ejercicio_ids = {ejercicio_id for ejercicio_id, _ in marcas}
+    actuales = {
+        (record.ejercicio_id, record.tipo): record.valor for record in db.session.query(
+            RecordPersonal.ejercicio_id, RecordPersonal.tipo, RecordPersonal.valor
+        ).filter(RecordPersonal.usuario_id == usuario_id, RecordPersonal.ejercicio_id.in_(ejercicio_ids))
+    }
+    repeticiones = mejores_repeticiones(sesiones)
+    actuales_repeticiones = {
+        (record.ejercicio_id, record.peso): record.repeticiones for record in db.session.query(
+            RecordRepeticiones.ejercicio_id, RecordRepeticiones.peso, RecordRepeticiones.repeticiones
+        ).filter(
+            RecordRepeticiones.usuario_id == usuario_id,
+            RecordRepeticiones.ejercicio_id.in_(ejercicio_ids),
+            RecordRepeticiones.peso.in_({peso for _, peso in repeticiones})
+        )
+    }
+    
+    # (ejercicio_id, tipo, marca, récord actual) de todas las marcas nuevas
+    nuevas = [(ejercicio_id, tipo, marca, actuales.get((ejercicio_id, tipo)))
+              for (ejercicio_id, tipo), marca in marcas.items()]
+    nuevas += [(ejercicio_id, 'repeticiones', marca, actuales_repeticiones.get((ejercicio_id, peso)))
+               for (ejercicio_id, peso), marca in repeticiones.items()]
+    filas = []
+    filas_repeticiones = []
+    batidos = []
+    for ejercicio_id, tipo, marca, anterior in nuevas:
+        if anterior is not None and marca.valor <= anterior:
+            continue
+        fila = {'usuario_id': usuario_id, 'ejercicio_id': ejercicio_id, 'peso': marca.peso,
+                'repeticiones': marca.repeticiones, 'registro_id': registro_ids[marca.sesion],
+                'fecha': sesiones[marca.sesion]['fecha']}
+        if tipo == 'repeticiones':
+            filas_repeticiones.append(fila)
+        else:
+            filas.append(dict(fila, tipo=tipo, valor=marca.valor))
+        if anterior is not None:
+            batidos.append({'ejercicio_id': ejercicio_id, 'tipo': tipo, 'valor': marca.valor,
+                            'anterior': anterior, 'peso': marca.peso})
+    
+    _guardar_mejoras(RecordPersonal, ['usuario_id', 'ejercicio_id', 'tipo'], 'valor', filas)
+    _guardar_mejoras(RecordRepeticiones, ['usuario_id', 'ejercicio_id', 'peso'], 'repeticiones',
+                     filas_repeticiones)
+    return batidos
+
+def _guardar_mejoras(modelo, claves, columna_valor, filas):
+    """Upsert de récords que solo sustituye a los que tienen menos ``columna_valor``"""
+    if not filas:
+        return
+    dialecto = db.session.get_bind().dialect.name
+    if dialecto in ('postgresql', 'sqlite'):
+        # El WHERE evita pisar un récord mejor escrito por otra petición a la vez
+        insertar = (postgresql.insert if dialecto == 'postgresql' else sqlite.insert)(modelo)
+        sentencia = insertar.values(filas).on_conflict_do_update(
+            index_elements=claves,
+            set_={columna: insertar.excluded[columna] for columna in filas[0] if columna not in claves},
+            where=insertar.excluded[columna_valor] > getattr(modelo, columna_valor)
+        )
+        db.session.execute(sentencia)
+        return
+    
+    # Otros motores: actualizar o crear uno a uno
+    for fila in filas:
+        record = db.session.get(modelo, tuple(fila[columna] for columna in claves))
+        if record is None:
+            db.session.add(modelo(**fila))
+        elif fila[columna_valor] > getattr(record, columna_valor):
+            for columna, valor in fila.items():
+                setattr(record, columna, valor)
+
+def _origen_records(tipo, usuario_id=None):
+    """SELECT con la mejor marca de cada usuario y ejercicio para un tipo de récord"""
+    serie, registro = SerieEjercicio, RegistroEjercicio
+    filtro = [serie.completada.is_(True), serie.repeticiones > 0]
+    if usuario_id is not None:
+        filtro.append(registro.usuario_id == usuario_id)
+    
+    if tipo == 'volumen':
+        # Volumen de las series válidas de cada sesión
+        por_sesion = db.session.query(
+            serie.registro_id.label('registro_id'),
+            db.func.sum(serie.peso * serie.repeticiones).label('valor')
+        ).join(registro, registro.id == serie.registro_id).filter(*filtro).group_by(serie.registro_id).subquery()
+        valor = por_sesion.c.valor
+        columnas = [valor.label('valor'), db.null().label('peso'), db.null().label('repeticiones')]
+        consulta = db.session.query(registro).join(por_sesion, por_sesion.c.registro_id == registro.id)
+        filtro = [valor > 0]
+    else:
+        valor = {
+            'peso': serie.peso,
+            # Epley, igual que records.uno_rm_estimado
+            '1rm': db.case((serie.repeticiones == 1, serie.peso),
+                           else_=serie.peso * (1 + serie.repeticiones / 30.0))
+        }[tipo]
+        columnas = [valor.label('valor'), serie.peso.label('peso'), serie.repeticiones.label('repeticiones')]
+        consulta = db.session.query(registro).join(serie, serie.registro_id == registro.id)
+    
+    # La mejor marca de cada ejercicio y, en empate, la más antigua
+    candidatos = consulta.with_entities(
+        registro.usuario_id,
+        registro.ejercicio_id,
+        db.literal(tipo).label('tipo'),
+        *columnas,
+        registro.id.label('registro_id'),
+        registro.fecha,
+        db.func.row_number().over(
+            partition_by=(registro.usuario_id, registro.ejercicio_id),
+            order_by=(valor.desc(), registro.fecha, registro.id)
+        ).label('puesto')
+    ).filter(*filtro).subquery()
+    return db.select(
+        candidatos.c.usuario_id, candidatos.c.ejercicio_id, candidatos.c.tipo, candidatos.c.valor,
+        candidatos.c.peso, candidatos.c.repeticiones, candidatos.c.registro_id, candidatos.c.fecha
+    ).where(candidatos.c.puesto == 1)
+
+def _origen_records_repeticiones(usuario_id=None):
+    """SELECT con más repeticiones de cada usuario, ejercicio y peso (en empate, la más antigua)"""
+    serie, registro = SerieEjercicio, RegistroEjercicio
+    filtro = [serie.completada.is_(True), serie.repeticiones > 0]
+    if usuario_id is not None:
+        filtro.append(registro.usuario_id == usuario_id)
+    candidatos = db.session.query(
+        registro.usuario_id,
+        registro.ejercicio_id,
+        serie.peso,
+        serie.repeticiones,
+        registro.id.label('registro_id'),
+        registro.fecha,
+        db.func.row_number().over(
+            partition_by=(registro.usuario_id, registro.ejercicio_id, serie.peso),
+            order_by=(serie.repeticiones.desc(), registro.fecha, registro.id)
+        ).label('puesto')
+    ).join(serie, serie.registro_id == registro.id).filter(*filtro).subquery()
+    return db.select(
+        candidatos.c.usuario_id, candidatos.c.ejercicio_id, candidatos.c.peso,
+        candidatos.c.repeticiones, candidatos.c.registro_id, candidatos.c.fecha
+    ).where(candidatos.c.puesto == 1)
+
+def reconstruir_records(usuario_id=None):
+    """Recalcular desde las series los récords de un usuario (o de todos)
+
+    Borra los récords y los vuelve a crear con un INSERT ... SELECT por tipo
+    (y otro para los de repeticiones por peso).
+    Devuelve el número de récords creados.
+    """
+    for modelo in (RecordPersonal, RecordRepeticiones):
+        borrar = db.delete(modelo)
+        if usuario_id is not None:
+            borrar = borrar.where(modelo.usuario_id == usuario_id)
+        db.session.execute(borrar)
+    
+    columnas = ['usuario_id', 'ejercicio_id', 'tipo', 'valor', 'peso', 'repeticiones', 'registro_id', 'fecha']
+    creados = 0
+    for tipo in TIPOS_RECORD:
+        resultado = db.session.execute(
+            db.insert(RecordPersonal).from_select(columnas, _origen_records(tipo, usuario_id))
+        )
+        creados += resultado.rowcount
+    resultado = db.session.execute(db.insert(RecordRepeticiones).from_select(
+        ['usuario_id', 'ejercicio_id', 'peso', 'repeticiones', 'registro_id', 'fecha'],
+        _origen_records_repeticiones(usuario_id)
+    ))
+    creados += resultado.rowcount
+    db.session.commit()
+    return creados
+
+@app.cli.command('reconstruir-records')
+@click.option('--usuario', type=int, help='Solo los récords de este usuario (id)')
+def reconstruir_records_command(usuario):
+    """Recalcular la tabla de récords personales a partir del historial"""
+    creados = reconstruir_records(usuario)
+    print(f'Récords creados: {creados}')
 
 # Rutas
 @app.route('/')
@@ -78,6 +960,13 @@ def index():
         return redirect(url_for('dashboard'))
     return render_template('index.html')
 
+def _hash_ocupado(plantilla):
+    """Respuesta cuando no hay plaza para calcular el hash de la contraseña"""
+    flash('Hay muchos inicios de sesión ahora mismo, inténtalo de nuevo en unos segundos', 'error')
+    respuesta = make_response(render_template(plantilla), 503)
+    respuesta.headers['Retry-After'] = '2'
+    return respuesta
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
@@ -85,10 +974,23 @@ def login():
         password = request.form['password']
         
         usuario = Usuario.query.filter_by(username=username).first()
+        if usuario:
+            usuario_id, nombre, hash_guardado = usuario.id, usuario.username, usuario.password_hash
+        # No retener la conexión a la base de datos mientras se calcula el hash
+        db.session.close()
+        
+        try:
+            correcta = bool(usuario) and contrasenas.verificar(hash_guardado, password)
+            # Hash con otros parámetros (factor de trabajo cambiado): se rehace ahora
+            if correcta and contrasenas.necesita_rehash(hash_guardado):
+                Usuario.query.filter_by(id=usuario_id).update({'password_hash': contrasenas.generar(password)})
+                db.session.commit()
+        except HashOcupado:
+            return _hash_ocupado('login.html')
         
-        if usuario and check_password_hash(usuario.password_hash, password):
-            session['user_id'] = usuario.id
-            session['username'] = usuario.username
+        if correcta:
+            session['user_id'] = usuario_id
+            session['username'] = nombre
             flash('Bienvenido!', 'success')
             return redirect(url_for('dashboard'))
         else:
@@ -111,12 +1013,18 @@ def register():
         if Usuario.query.filter_by(email=email).first():
             flash('El email ya está registrado', 'error')
             return render_template('register.html')
+        db.session.close()
+        
+        try:
+            password_hash = contrasenas.generar(password)
+        except HashOcupado:
+            return _hash_ocupado('register.html')
         
         # Crear nuevo usuario
         nuevo_usuario = Usuario(
             username=username,
             email=email,
-            password_hash=generate_password_hash(password)
+            password_hash=password_hash
         )
         
         db.session.add(nuevo_usuario)
@@ -128,33 +1036,27 @@ def register():
     return render_template('register.html')
 
 @app.route('/dashboard')
+@presupuesto_sql(4)
 def dashboard():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    # Obtener ejercicios del sistema (usuario_id es NULL) + ejercicios personalizados del usuario
-    ejercicios_sistema = Ejercicio.query.filter_by(usuario_id=None, activo=True).all()
-    ejercicios_personalizados = Ejercicio.query.filter_by(usuario_id=session['user_id'], activo=True).all()
-    
-    # Combinar ambos tipos de ejercicios
-    todos_ejercicios = ejercicios_sistema + ejercicios_personalizados
-    
-    # Agrupar ejercicios por grupo muscular
-    ejercicios_agrupados = {}
-    for ejercicio in todos_ejercicios:
-        grupo = ejercicio.grupo_muscular
-        if grupo not in ejercicios_agrupados:
-            ejercicios_agrupados[grupo] = []
-        ejercicios_agrupados[grupo].append(ejercicio)
-    
-    # Ordenar los grupos musculares
-    grupos_ordenados = sorted(ejercicios_agrupados.keys())
+    # Ejercicios del sistema (usuario_id es NULL) + personalizados del usuario, ya agrupados
+    # por grupo muscular y con los grupos ordenados (en caché)
+    todos_ejercicios, ejercicios_agrupados, grupos_ordenados, ejercicios_personalizados = \
+        menu_ejercicios(session['user_id'])
     
-    # Obtener últimos registros del usuario
-    ultimos_registros = RegistroEjercicio.query.filter_by(
+    # Obtener últimos registros del usuario (ejercicio y series en la misma consulta)
+    ultimos_registros = RegistroEjercicio.query.options(
+        joinedload(RegistroEjercicio.ejercicio),
+        joinedload(RegistroEjercicio.series)
+    ).filter_by(
         usuario_id=session['user_id']
     ).order_by(RegistroEjercicio.fecha_registro.desc()).limit(10).all()
     
+    # Ejercicios entrenados últimamente: sus gráficas se piden junto a la primera que se abra
+    ejercicios_recientes = list(dict.fromkeys(registro.ejercicio_id for registro in ultimos_registros))
+    
     # Fecha de hoy para el formulario
     today = date.today().strftime('%Y-%m-%d')
     
@@ -166,6 +1068,7 @@ def dashboard():
                          ejercicios_agrupados=ejercicios_agrupados,
                          grupos_ordenados=grupos_ordenados,
                          ultimos_registros=ultimos_registros,
+                         ejercicios_recientes=ejercicios_recientes,
                          ejercicios_personalizados=ejercicios_personalizados_activos,
                          today=today)
 
@@ -184,40 +1087,441 @@ def registrar_ejercicio():
     else:
         fecha_ejercicio = date.today()
     
-    # Crear el registro principal del ejercicio
-    nuevo_registro = RegistroEjercicio(
-        usuario_id=session['user_id'],
-        ejercicio_id=ejercicio_id,
-        fecha=fecha_ejercicio,
-        notas=notas
-    )
-    
-    db.session.add(nuevo_registro)
-    db.session.flush()  # Para obtener el ID sin hacer commit
-    
     # Procesar las series individuales
     series_data = request.form.getlist('series_data')
+    series_validas = []
     for i, serie_json in enumerate(series_data):
         if serie_json:  # Si hay datos para esta serie
-            import json
             try:
                 serie_data = json.loads(serie_json)
-                nueva_serie = SerieEjercicio(
-                    registro_id=nuevo_registro.id,
+                series_validas.append(SerieValidada(
                     numero_serie=i + 1,
                     peso=float(serie_data['peso']),
                     repeticiones=int(serie_data['repeticiones']),
                     completada=serie_data.get('completada', True)
-                )
-                db.session.add(nueva_serie)
+                ))
             except (json.JSONDecodeError, ValueError, KeyError):
                 continue
     
-    db.session.commit()
+    # Registro, series, resumen y récords en una transacción, con inserciones masivas
+    usuario_id = session['user_id']
+    sesiones = [{
+        'ejercicio_id': ejercicio_id,
+        'fecha': fecha_ejercicio,
+        'notas': notas,
+        'series': series_validas
+    }]
+    
+    def trabajo():
+        marcar_datos_modificados(usuario_id)
+        registro_ids = insertar_sesiones(usuario_id, sesiones)
+        return actualizar_records(usuario_id, registro_ids, sesiones)
+    
+    try:
+        batidos = escribir(trabajo)
+    except ColaEscriturasLlena:
+        return _escrituras_ocupadas()
+    except EscrituraSinConfirmar as e:
+        return _escritura_sin_confirmar(e)
     
     flash('Ejercicio registrado exitosamente!', 'success')
+    if batidos:
+        flash('¡Nuevo récord personal! ' + ', '.join(
+            f'{NOMBRES_RECORD[record["tipo"]]} {record["valor"]} con {record["peso"]:g} kg'
+            if record['tipo'] == 'repeticiones' else
+            f'{NOMBRES_RECORD[record["tipo"]]} {round(record["valor"], 1):g} kg' for record in batidos
+        ), 'success')
     return redirect(url_for('dashboard'))
 
+# Límites de /api/entrenamientos
+MAX_SESIONES_LOTE = 500
+MAX_SERIES_SESION = 50
+MAX_CLAVE_LOTE = 64  # Longitud de LoteEntrenamiento.clave
+
+SerieValidada = namedtuple('SerieValidada', ['numero_serie', 'peso', 'repeticiones', 'completada'])
+
+def _parsear_sesion(sesion_json):
+    """Convertir el JSON de una sesión a dict con SerieValidada (lanza ValueError/KeyError...)"""
+    series_json = sesion_json.get('series') or []
+    if len(series_json) > MAX_SERIES_SESION:
+        raise ValueError(f'máximo {MAX_SERIES_SESION} series')
+    return {
+        'ejercicio_id': int(sesion_json['ejercicio_id']),
+        'fecha': (datetime.strptime(sesion_json['fecha'], '%Y-%m-%d').date()
+                  if sesion_json.get('fecha') else date.today()),
+        'notas': str(sesion_json.get('notas') or ''),
+        'series': [
+            SerieValidada(
+                numero_serie=j + 1,
+                peso=float(serie['peso']),
+                repeticiones=int(serie['repeticiones']),
+                completada=booleano(serie.get('completada', True))
+            ) for j, serie in enumerate(series_json)
+        ]
+    }
+
+def _validar_lote(datos, usuario_id):
+    """Validar todas las sesiones de un lote antes de escribir nada
+
+    Devuelve (sesiones, errores); cada sesión es un dict con ejercicio_id,
+    fecha, notas y la lista de SerieValidada.
+    """
+    sesiones_json = datos.get('sesiones') if isinstance(datos, dict) else None
+    if not isinstance(sesiones_json, list) or not sesiones_json:
+        return [], ['"sesiones" debe ser una lista no vacía']
+    if len(sesiones_json) > MAX_SESIONES_LOTE:
+        return [], [f'Máximo {MAX_SESIONES_LOTE} sesiones por petición']
+    
+    errores = []
+    sesiones = []
+    for i, sesion_json in enumerate(sesiones_json):
+        try:
+            sesiones.append(_parsear_sesion(sesion_json))
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            errores.append(f'Sesión {i + 1}: datos no válidos ({e})')
+    
+    # Los ejercicios deben ser del sistema o del propio usuario (una sola consulta)
+    ids_pedidos = {sesion['ejercicio_id'] for sesion in sesiones}
+    if ids_pedidos:
+        ids_validos = {fila.id for fila in db.session.query(Ejercicio.id).filter(
+            Ejercicio.id.in_(ids_pedidos),
+            db.or_(Ejercicio.usuario_id.is_(None), Ejercicio.usuario_id == usuario_id)
+        )}
+        for ejercicio_id in sorted(ids_pedidos - ids_validos):
+            errores.append(f'Ejercicio {ejercicio_id} no existe')
+    
+    return sesiones, errores
+
+def _filas_series_y_resumenes(registro_ids, sesiones):
+    filas_series = []
+    filas_resumen = []
+    for registro_id, sesion in zip(registro_ids, sesiones):
+        for serie in sesion['series']:
+            filas_series.append(dict(serie._asdict(), registro_id=registro_id))
+        if sesion['series']:
+            filas_resumen.append(dict(metricas_resumen(sesion['series']), registro_id=registro_id))
+    return filas_series, filas_resumen
+
+def insertar_sesiones(usuario_id, sesiones):
+    """Insertar registros, series y resúmenes con sentencias masivas (sin commit)
+
+    Devuelve los ids de los registros creados, en el mismo orden que sesiones.
+    """
+    registro_ids = db.session.execute(
+        db.insert(RegistroEjercicio).returning(RegistroEjercicio.id, sort_by_parameter_order=True),
+        [{
+            'usuario_id': usuario_id,
+            'ejercicio_id': sesion['ejercicio_id'],
+            'fecha': sesion['fecha'],
+            'notas': sesion['notas']
+        } for sesion in sesiones]
+    ).scalars().all()
+    
+    filas_series, filas_resumen = _filas_series_y_resumenes(registro_ids, sesiones)
+    if filas_series:
+        # Con la tabla y no el modelo: el INSERT masivo del ORM cambiaría completada=None
+        # por el default True (COPY, en insertar_sesiones_masivo, también deja NULL)
+        db.session.execute(db.insert(SerieEjercicio.__table__), filas_series)
+    if filas_resumen:
+        db.session.execute(db.insert(ResumenRegistro), filas_resumen)
+    actualizar_resumenes_ejercicio(usuario_id, sesiones)
+    return registro_ids
+
+def insertar_sesiones_masivo(usuario_id, sesiones):
+    """Como insertar_sesiones, pero con COPY en PostgreSQL (psycopg2) para cargas grandes
+
+    Los ids de los registros se reservan de la secuencia en una sola consulta
+    para poder enlazar las series sin RETURNING.
+    """
+    conexion = db.session.connection()
+    if conexion.dialect.name != 'postgresql' or conexion.dialect.driver != 'psycopg2':
+        return insertar_sesiones(usuario_id, sesiones)
+    
+    registro_ids = conexion.execute(
+        db.text("SELECT nextval(pg_get_serial_sequence('registro_ejercicio', 'id')) "
+                "FROM generate_series(1, :n)"),
+        {'n': len(sesiones)}
+    ).scalars().all()
+    ahora = datetime.utcnow()
+    filas_registro = [{
+        'id': registro_id,
+        'usuario_id': usuario_id,
+        'ejercicio_id': sesion['ejercicio_id'],
+        'fecha': sesion['fecha'],
+        'fecha_registro': ahora,
+        'notas': sesion['notas']
+    } for registro_id, sesion in zip(registro_ids, sesiones)]
+    filas_series, filas_resumen = _filas_series_y_resumenes(registro_ids, sesiones)
+    
+    dbapi = conexion.connection.dbapi_connection
+    for modelo, filas in ((RegistroEjercicio, filas_registro),
+                          (SerieEjercicio, filas_series),
+                          (ResumenRegistro, filas_resumen)):
+        if filas:
+            copiar_filas(dbapi, modelo.__tablename__, list(filas[0]), filas)
+    actualizar_resumenes_ejercicio(usuario_id, sesiones)
+    return registro_ids
+
+@app.route('/api/entrenamientos', methods=['POST'])
+def registrar_entrenamientos():
+    """Registrar un entrenamiento completo (o varios días) en una sola petición
+
+    Formato: {"sesiones": [{"ejercicio_id", "fecha", "notas", "series": [{"peso",
+    "repeticiones", "completada"}]}]}. La cabecera Idempotency-Key (o el campo
+    "clave") evita duplicar sesiones si el cliente reintenta el envío.
+    """
+    if 'user_id' not in session:
+        return {'error': 'No autenticado'}, 401
+    
+    usuario_id = session['user_id']
+    datos = request.get_json(silent=True)
+    clave = request.headers.get('Idempotency-Key') or (datos.get('clave') if isinstance(datos, dict) else None)
+    if clave is not None:
+        clave = str(clave)
+        if len(clave) > MAX_CLAVE_LOTE:
+            return {'error': f'La clave de idempotencia admite como máximo {MAX_CLAVE_LOTE} caracteres'}, 400
+    
+    def respuesta_anterior():
+        lote = LoteEntrenamiento.query.filter_by(usuario_id=usuario_id, clave=clave).first()
+        if lote is None or lote.registro_ids is None:
+            return None
+        registro_ids = json.loads(lote.registro_ids)
+        return {'registros': registro_ids, 'sesiones': len(registro_ids), 'repetido': True}, 200
+    
+    if clave:
+        anterior = respuesta_anterior()
+        if anterior:
+            return anterior
+    
+    sesiones, errores = _validar_lote(datos, usuario_id)
+    if errores:
+        return {'error': 'Entrenamiento no válido', 'errores': errores}, 400
+    
+    try:
+        marcar_datos_modificados(usuario_id)
+        lote = None
+        if clave:
+            # Reservar la clave antes de escribir: un reintento concurrente choca aquí
+            lote = LoteEntrenamiento(usuario_id=usuario_id, clave=clave)
+            db.session.add(lote)
+            db.session.flush()
+        
+        registro_ids = insertar_sesiones(usuario_id, sesiones)
+        batidos = actualizar_records(usuario_id, registro_ids, sesiones)
+        if lote:
+            lote.registro_ids = json.dumps(registro_ids)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        anterior = respuesta_anterior()
+        if anterior:
+            return anterior
+        raise
+    
+    return {
+        'registros': registro_ids,
+        'sesiones': len(registro_ids),
+        'series': sum(len(sesion['series']) for sesion in sesiones),
+        'records': batidos
+    }, 201
+
+# Tamaño de lote de la exportación (filas por viaje del cursor) y de la importación
+TAM_LOTE_TRANSFERENCIA = 1000
+MAX_ERRORES_IMPORTACION = 20
+
+def _series_exportacion(usuario_id):
+    """Series del usuario (una fila por serie) leídas con un cursor de servidor"""
+    return db.session.execute(
+        db.select(
+            RegistroEjercicio.id,
+            RegistroEjercicio.fecha,
+            RegistroEjercicio.notas,
+            Ejercicio.nombre,
+            Ejercicio.grupo_muscular,
+            SerieEjercicio.numero_serie,
+            SerieEjercicio.peso,
+            SerieEjercicio.repeticiones,
+            SerieEjercicio.completada
+        ).join(
+            Ejercicio, Ejercicio.id == RegistroEjercicio.ejercicio_id
+        ).outerjoin(
+            SerieEjercicio, SerieEjercicio.registro_id == RegistroEjercicio.id
+        ).where(
+            RegistroEjercicio.usuario_id == usuario_id
+        ).order_by(
+            RegistroEjercicio.fecha, RegistroEjercicio.id, SerieEjercicio.numero_serie
+        ).execution_options(stream_results=True, yield_per=TAM_LOTE_TRANSFERENCIA)
+    )
+
+def _pesos_exportacion(usuario_id):
+    return db.session.execute(
+        db.select(RegistroPeso.fecha, RegistroPeso.peso, RegistroPeso.notas).where(
+            RegistroPeso.usuario_id == usuario_id
+        ).order_by(RegistroPeso.fecha).execution_options(
+            stream_results=True, yield_per=TAM_LOTE_TRANSFERENCIA
+        )
+    )
+
+def _exportacion_csv(usuario_id):
+    for fila in _series_exportacion(usuario_id):
+        yield {
+            'tipo': 'serie',
+            'sesion': fila.id,
+            'fecha': fila.fecha.strftime('%Y-%m-%d'),
+            'ejercicio': fila.nombre,
+            'grupo_muscular': fila.grupo_muscular,
+            'numero_serie': fila.numero_serie,
+            'peso': fila.peso,
+            'repeticiones': fila.repeticiones,
+            'completada': '' if fila.completada is None else int(fila.completada),
+            'notas': fila.notas or ''
+        }
+    for fila in _pesos_exportacion(usuario_id):
+        yield {'tipo': 'peso', 'fecha': fila.fecha.strftime('%Y-%m-%d'),
+               'peso': fila.peso, 'notas': fila.notas or ''}
+
+def _exportacion_jsonl(usuario_id):
+    sesion = None
+    for fila in _series_exportacion(usuario_id):
+        if sesion is None or sesion['sesion'] != fila.id:
+            if sesion:
+                yield sesion
+            sesion = {
+                'tipo': 'sesion',
+                'sesion': fila.id,
+                'fecha': fila.fecha.strftime('%Y-%m-%d'),
+                'ejercicio': fila.nombre,
+                'grupo_muscular': fila.grupo_muscular,
+                'notas': fila.notas or '',
+                'series': []
+            }
+        if fila.numero_serie is not None:
+            sesion['series'].append({
+                'numero': fila.numero_serie,
+                'peso': fila.peso,
+                'repeticiones': fila.repeticiones,
+                'completada': fila.completada
+            })
+    if sesion:
+        yield sesion
+    for fila in _pesos_exportacion(usuario_id):
+        yield {'tipo': 'peso', 'fecha': fila.fecha.strftime('%Y-%m-%d'),
+               'peso': fila.peso, 'notas': fila.notas or ''}
+
+@app.route('/exportar_historial')
+def exportar_historial():
+    """Descargar todo el historial (sesiones, series y pesos) en CSV o JSONL, en streaming"""
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    
+    formato = request.args.get('formato', 'csv')
+    if formato not in ('csv', 'jsonl'):
+        return {'error': 'Formato no soportado (csv o jsonl)'}, 400
+    
+    usuario_id = session['user_id']
+    if formato == 'csv':
+        contenido = generar_csv(_exportacion_csv(usuario_id))
+        tipo = 'text/csv'
+    else:
+        contenido = generar_jsonl(_exportacion_jsonl(usuario_id))
+        tipo = 'application/x-ndjson'
+    
+    return Response(stream_with_context(contenido), mimetype=tipo, headers={
+        'Content-Disposition': f'attachment; filename=historial_{date.today():%Y%m%d}.{formato}'
+    })
+
+@app.route('/importar_historial', methods=['POST'])
+def importar_historial():
+    """Cargar un historial en CSV o JSONL (mismo formato que la exportación)
+
+    El fichero llega en el campo "archivo" o como cuerpo de la petición. Los
+    ejercicios se buscan por nombre; si no existen y la fila trae
+    grupo_muscular se crean como personalizados. Todo o nada: con cualquier
+    error no se guarda nada.
+    """
+    if 'user_id' not in session:
+        return {'error': 'No autenticado'}, 401
+    
+    usuario_id = session['user_id']
+    archivo = request.files.get('archivo')
+    nombre_archivo = (archivo.filename or '') if archivo else ''
+    formato = request.args.get('formato') or ('csv' if nombre_archivo.lower().endswith('.csv') else 'jsonl')
+    if formato not in ('csv', 'jsonl'):
+        return {'error': 'Formato no soportado (csv o jsonl)'}, 400
+    
+    flujo = archivo.stream if archivo else io.BufferedReader(request.stream)
+    texto = io.TextIOWrapper(flujo, encoding='utf-8-sig', newline='')
+    
+    ejercicios = {
+        nombre.lower(): ejercicio_id for ejercicio_id, nombre in db.session.query(
+            Ejercicio.id, Ejercicio.nombre
+        ).filter(db.or_(Ejercicio.usuario_id.is_(None), Ejercicio.usuario_id == usuario_id))
+    }
+    
+    # Bloquear al usuario antes de escribir nada (ver marcar_datos_modificados)
+    marcar_datos_modificados(usuario_id)
+    sesiones = []
+    pesos = {}  # Por fecha: el último peso de un mismo día gana
+    errores = []
+    totales = {'sesiones': 0, 'series': 0, 'pesos': 0, 'ejercicios_creados': 0}
+    
+    def volcar():
+        if sesiones:
+            registro_ids = insertar_sesiones_masivo(usuario_id, sesiones)
+            actualizar_records(usuario_id, registro_ids, sesiones)
+            totales['sesiones'] += len(sesiones)
+            totales['series'] += sum(len(sesion['series']) for sesion in sesiones)
+        if pesos:
+            guardar_pesos(usuario_id, list(pesos.values()))
+            totales['pesos'] += len(pesos)
+        sesiones.clear()
+        pesos.clear()
+    
+    try:
+        for registro in leer_registros(texto, formato):
+            try:
+                if registro['tipo'] == 'peso':
+                    fecha = datetime.strptime(registro['fecha'], '%Y-%m-%d').date()
+                    pesos[fecha] = {'fecha': fecha, 'peso': float(registro['peso']),
+                                    'notas': str(registro.get('notas') or '')}
+                elif registro['tipo'] == 'sesion':
+                    nombre = str(registro.get('ejercicio') or '').strip()
+                    ejercicio_id = ejercicios.get(nombre.lower())
+                    if ejercicio_id is None:
+                        grupo = str(registro.get('grupo_muscular') or '').strip()
+                        if not nombre or not grupo:
+                            raise ValueError(f'ejercicio desconocido "{nombre}"')
+                        nuevo = Ejercicio(nombre=nombre, grupo_muscular=grupo, usuario_id=usuario_id)
+                        db.session.add(nuevo)
+                        db.session.flush()
+                        ejercicio_id = ejercicios[nombre.lower()] = nuevo.id
+                        totales['ejercicios_creados'] += 1
+                    sesiones.append(_parsear_sesion(dict(registro, ejercicio_id=ejercicio_id)))
+                else:
+                    raise ValueError(f'tipo desconocido "{registro["tipo"]}"')
+            except (KeyError, TypeError, ValueError, AttributeError) as e:
+                errores.append(f'Línea {registro["linea"]}: {e}')
+                if len(errores) >= MAX_ERRORES_IMPORTACION:
+                    break
+                continue
+            
+            # Con errores se sigue leyendo para informar de ellos, pero ya no se escribe
+            if not errores and len(sesiones) + len(pesos) >= TAM_LOTE_TRANSFERENCIA:
+                volcar()
+    except (UnicodeDecodeError, csv.Error) as e:
+        errores.append(f'Fichero no válido: {e}')
+    
+    if errores:
+        db.session.rollback()
+        return {'error': 'Importación cancelada', 'errores': errores}, 400
+    
+    volcar()
+    if totales['ejercicios_creados']:
+        invalidar_ejercicios_usuario(usuario_id)
+    db.session.commit()
+    
+    return totales, 201
+
 @app.route('/registrar_peso', methods=['POST'])
 def registrar_peso():
     if 'user_id' not in session:
@@ -233,141 +1537,628 @@ def registrar_peso():
     else:
         fecha_peso = date.today()
     
-    # Verificar si ya existe un registro para esta fecha
-    registro_existente = RegistroPeso.query.filter_by(
-        usuario_id=session['user_id'],
-        fecha=fecha_peso
-    ).first()
+    # Crear o actualizar el registro del día
+    usuario_id = session['user_id']
     
-    if registro_existente:
-        # Actualizar el registro existente
-        registro_existente.peso = peso
-        registro_existente.notas = notas
-        registro_existente.fecha_registro = datetime.utcnow()
-        flash('Peso actualizado correctamente!', 'success')
-    else:
-        # Crear nuevo registro
-        nuevo_registro = RegistroPeso(
-            usuario_id=session['user_id'],
-            peso=peso,
-            fecha=fecha_peso,
-            notas=notas
-        )
-        db.session.add(nuevo_registro)
-        flash('Peso registrado exitosamente!', 'success')
+    def trabajo():
+        marcar_datos_modificados(usuario_id)
+        guardar_peso(usuario_id, fecha_peso, peso, notas)
     
-    db.session.commit()
+    try:
+        escribir(trabajo)
+    except ColaEscriturasLlena:
+        return _escrituras_ocupadas()
+    except EscrituraSinConfirmar as e:
+        return _escritura_sin_confirmar(e)
+    flash('Peso guardado correctamente!', 'success')
     return redirect(url_for('dashboard'))
 
-@app.route('/peso_data')
-def peso_data():
-    if 'user_id' not in session:
-        return {'error': 'No autenticado'}, 401
-    
-    # Obtener parámetros de filtro
-    dias = request.args.get('dias', 30, type=int)
+# Agrupaciones temporales admitidas por las gráficas (?resolucion=)
+# 'sesion' es un punto por sesión o pesaje, sin agrupar
+RESOLUCIONES = ('sesion', 'dia', 'semana', 'mes')
+
+# Resolución por defecto según la longitud del rango (días mínimos, resolución):
+# los rangos largos se leen de los resúmenes por periodo y no de cada sesión
+RESOLUCION_AUTOMATICA = ((730, 'mes'), (365, 'semana'))
+
+def _parametros_grafica(dias):
+    """Leer ?resolucion= y ?max_puntos= para un rango de ``dias`` días; ValueError si no son válidos
+
+    Sin ?resolucion= los rangos largos se agrupan según RESOLUCION_AUTOMATICA,
+    salvo que se pida ?detalle=1 (las series solo existen por sesión). La
+    resolución devuelta es None para un punto por sesión.
+    """
+    resolucion = request.args.get('resolucion') or None
+    if resolucion is None:
+        if not request.args.get('detalle', 0, type=int):
+            resolucion = next((agrupada for minimo, agrupada in RESOLUCION_AUTOMATICA if dias >= minimo), None)
+    elif resolucion not in RESOLUCIONES:
+        raise ValueError(f'resolucion debe ser una de: {", ".join(RESOLUCIONES)}')
+    elif resolucion == 'sesion':
+        resolucion = None
+    max_puntos = request.args.get('max_puntos', type=int)
+    if max_puntos is not None and max_puntos < 3:
+        raise ValueError('max_puntos debe ser al menos 3')
+    return resolucion, max_puntos
+
+def _cubo_fecha(columna, resolucion):
+    """Expresión SQL con el inicio del día, semana (lunes) o mes de una fecha"""
+    if resolucion == 'dia':
+        return columna
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return db.cast(db.func.date_trunc('week' if resolucion == 'semana' else 'month', columna), db.Date)
+    if resolucion == 'semana':
+        return db.func.date(columna, 'weekday 0', '-6 days')
+    return db.func.date(columna, 'start of month')
+
+def _fecha_texto(valor):
+    # SQLite devuelve las fechas calculadas como texto
+    return valor if isinstance(valor, str) else valor.strftime('%Y-%m-%d')
+
+def _tramos_rango(fecha_limite, periodo):
+    """Periodos completos ``[desde, hasta)`` de un rango que se leen de los resúmenes
+
+    El resto (el periodo a medias del principio y el periodo en curso) se
+    calcula con las filas originales.
+    """
+    desde = _inicio_periodo(fecha_limite, periodo)
+    if desde < fecha_limite:
+        desde = _siguiente_periodo(desde, periodo)
+    return desde, _inicio_periodo(date.today(), periodo)
+
+def _pesos_por_periodo(usuario_id, fecha_limite, periodo):
+    """Peso medio por semana o mes desde ``fecha_limite`` con el resumen del rango
+
+    Los periodos completos salen de ResumenPesoPeriodo y solo los bordes del
+    rango se leen de RegistroPeso.
+    """
+    desde, hasta = _tramos_rango(fecha_limite, periodo)
+    bordes = _origen_resumen_peso(
+        periodo,
+        RegistroPeso.usuario_id == usuario_id,
+        RegistroPeso.fecha >= fecha_limite,
+        db.or_(RegistroPeso.fecha < desde, RegistroPeso.fecha >= hasta)
+    )
+    completos = db.select(*[
+        getattr(ResumenPesoPeriodo, columna.name) for columna in bordes.selected_columns
+    ]).where(
+        ResumenPesoPeriodo.usuario_id == usuario_id,
+        ResumenPesoPeriodo.periodo == periodo,
+        ResumenPesoPeriodo.inicio >= desde,
+        ResumenPesoPeriodo.inicio < hasta
+    )
+    periodos = db.union_all(bordes, completos).subquery()
+    todo_el_rango = (None, None)
+    return db.session.query(
+        periodos.c.inicio.label('fecha'),
+        (periodos.c.suma_peso / periodos.c.registros).label('peso'),
+        db.literal('').label('notas'),
+        db.func.first_value(periodos.c.peso_inicial).over(
+            order_by=periodos.c.inicio, rows=todo_el_rango).label('peso_inicial'),
+        db.func.last_value(periodos.c.peso_final).over(
+            order_by=periodos.c.inicio, rows=todo_el_rango).label('peso_actual'),
+        db.func.sum(periodos.c.registros).over().label('total')
+    ).order_by(periodos.c.inicio).all()
+
+def _grafica_peso(usuario_id, dias, resolucion=None, max_puntos=None):
+    """Serie de peso corporal de los últimos ``dias`` días y su resumen"""
     fecha_limite = date.today() - timedelta(days=dias)
     
-    # Obtener registros de peso
-    registros = RegistroPeso.query.filter_by(
-        usuario_id=session['user_id']
+    # Registros de peso con el primer y último peso del periodo (funciones de ventana)
+    todo_el_periodo = (None, None)
+    consulta = db.session.query(
+        RegistroPeso.fecha,
+        RegistroPeso.peso,
+        RegistroPeso.notas,
+        db.func.first_value(RegistroPeso.peso).over(
+            order_by=RegistroPeso.fecha, rows=todo_el_periodo).label('peso_inicial'),
+        db.func.last_value(RegistroPeso.peso).over(
+            order_by=RegistroPeso.fecha, rows=todo_el_periodo).label('peso_actual'),
+        db.func.count().over().label('total')
     ).filter(
+        RegistroPeso.usuario_id == usuario_id,
         RegistroPeso.fecha >= fecha_limite
-    ).order_by(RegistroPeso.fecha.asc()).all()
+    )
+    
+    if resolucion in PERIODOS_RESUMEN:
+        filas = _pesos_por_periodo(usuario_id, fecha_limite, resolucion)
+    elif resolucion:
+        # Un punto por día con el peso medio
+        registros = consulta.subquery()
+        cubo = _cubo_fecha(registros.c.fecha, resolucion)
+        filas = db.session.query(
+            cubo.label('fecha'),
+            db.func.avg(registros.c.peso).label('peso'),
+            db.literal('').label('notas'),
+            db.func.max(registros.c.peso_inicial).label('peso_inicial'),
+            db.func.max(registros.c.peso_actual).label('peso_actual'),
+            db.func.max(registros.c.total).label('total')
+        ).group_by(cubo).order_by(cubo).all()
+    else:
+        filas = consulta.order_by(RegistroPeso.fecha.asc()).all()
     
     # Preparar datos para la gráfica
     datos = []
-    for registro in registros:
+    for fila in filas:
         datos.append({
-            'fecha': registro.fecha.strftime('%Y-%m-%d'),
-            'peso': float(registro.peso),
-            'notas': registro.notas or ''
+            'fecha': _fecha_texto(fila.fecha),
+            'peso': float(fila.peso),
+            'notas': fila.notas or ''
         })
+    if max_puntos:
+        datos = lttb(datos, max_puntos, lambda d: d['peso'])
     
+    resumen = filas[0] if filas else None
     return {
         'datos': datos,
         'periodo': f'Últimos {dias} días',
-        'peso_actual': datos[-1]['peso'] if datos else None,
-        'peso_inicial': datos[0]['peso'] if datos else None,
-        'diferencia': (datos[-1]['peso'] - datos[0]['peso']) if len(datos) > 1 else 0
+        'peso_actual': float(resumen.peso_actual) if resumen else None,
+        'peso_inicial': float(resumen.peso_inicial) if resumen else None,
+        'diferencia': float(resumen.peso_actual - resumen.peso_inicial) if resumen and resumen.total > 1 else 0
     }
 
+@app.route('/peso_data')
+@respuesta_condicional
+@cachear_resultado
+def peso_data():
+    if 'user_id' not in session:
+        return {'error': 'No autenticado'}, 401
+    
+    # Obtener parámetros de filtro
+    dias = request.args.get('dias', 30, type=int)
+    try:
+        resolucion, max_puntos = _parametros_grafica(dias)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    
+    return _grafica_peso(session['user_id'], dias, resolucion, max_puntos)
+
+def _sesiones_agregadas(usuario_id, ejercicio_ids, fecha_limite, resolucion=None):
+    """Métricas por sesión y estadísticas del periodo de varios ejercicios en una sola consulta.
+
+    Lee una fila de ``ResumenRegistro`` por sesión (sin tocar las series) y
+    usa funciones de ventana, particionadas por ejercicio, para las
+    estadísticas globales del periodo. Con ``resolucion`` las sesiones se
+    agrupan por ejercicio y día, semana o mes en SQL. Las filas salen
+    ordenadas por ejercicio y fecha.
+    """
+    por_ejercicio = RegistroEjercicio.ejercicio_id
+    orden = (RegistroEjercicio.fecha.asc(), RegistroEjercicio.id.asc())
+    todo_el_periodo = (None, None)
+
+    consulta = db.session.query(
+        RegistroEjercicio.id,
+        RegistroEjercicio.ejercicio_id,
+        RegistroEjercicio.fecha,
+        RegistroEjercicio.notas,
+        ResumenRegistro.series_total,
+        ResumenRegistro.peso_max,
+        ResumenRegistro.peso_promedio,
+        ResumenRegistro.repeticiones_total,
+        ResumenRegistro.volumen_total,
+        ResumenRegistro.peso_primera_serie,
+        ResumenRegistro.reps_primera_serie,
+        # Estadísticas del periodo (iguales en todas las filas de cada ejercicio)
+        db.func.first_value(ResumenRegistro.peso_primera_serie).over(
+            partition_by=por_ejercicio, order_by=orden, rows=todo_el_periodo).label('peso_inicial'),
+        db.func.last_value(ResumenRegistro.peso_primera_serie).over(
+            partition_by=por_ejercicio, order_by=orden, rows=todo_el_periodo).label('peso_actual'),
+        db.func.max(ResumenRegistro.peso_primera_serie).over(partition_by=por_ejercicio).label('peso_maximo'),
+        db.func.count().over(partition_by=por_ejercicio).label('total_sesiones'),
+        db.func.avg(ResumenRegistro.volumen_total).over(partition_by=por_ejercicio).label('volumen_promedio')
+    ).join(
+        ResumenRegistro, ResumenRegistro.registro_id == RegistroEjercicio.id
+    ).filter(
+        RegistroEjercicio.usuario_id == usuario_id,
+        RegistroEjercicio.ejercicio_id.in_(ejercicio_ids),
+        RegistroEjercicio.fecha >= fecha_limite
+    )
+    if not resolucion:
+        return consulta.order_by(por_ejercicio, *orden).all()
+    if resolucion in PERIODOS_RESUMEN:
+        return _sesiones_por_periodo(usuario_id, ejercicio_ids, fecha_limite, resolucion)
+
+    # Un punto por día: mejores marcas del día y totales de volumen. La mejor
+    # primera serie del día se elige entera (peso y repeticiones de la misma sesión)
+    sesiones = consulta.add_columns(
+        db.func.row_number().over(
+            partition_by=(por_ejercicio, _cubo_fecha(RegistroEjercicio.fecha, resolucion)),
+            order_by=(ResumenRegistro.peso_primera_serie.desc(), ResumenRegistro.reps_primera_serie.desc())
+        ).label('orden_primera_serie')
+    ).subquery()
+    cubo = _cubo_fecha(sesiones.c.fecha, resolucion)
+    return db.session.query(
+        sesiones.c.ejercicio_id,
+        cubo.label('fecha'),
+        db.literal('').label('notas'),
+        db.func.count().label('sesiones'),
+        db.func.sum(sesiones.c.series_total).label('series_total'),
+        db.func.max(sesiones.c.peso_max).label('peso_max'),
+        db.func.avg(sesiones.c.peso_promedio).label('peso_promedio'),
+        db.func.sum(sesiones.c.repeticiones_total).label('repeticiones_total'),
+        db.func.sum(sesiones.c.volumen_total).label('volumen_total'),
+        db.func.max(sesiones.c.peso_primera_serie).label('peso_primera_serie'),
+        db.func.max(db.case((sesiones.c.orden_primera_serie == 1, sesiones.c.reps_primera_serie))
+                    ).label('reps_primera_serie'),
+        db.func.max(sesiones.c.peso_inicial).label('peso_inicial'),
+        db.func.max(sesiones.c.peso_actual).label('peso_actual'),
+        db.func.max(sesiones.c.peso_maximo).label('peso_maximo'),
+        db.func.max(sesiones.c.total_sesiones).label('total_sesiones'),
+        db.func.max(sesiones.c.volumen_promedio).label('volumen_promedio')
+    ).group_by(sesiones.c.ejercicio_id, cubo).order_by(sesiones.c.ejercicio_id, cubo).all()
+
+def _sesiones_por_periodo(usuario_id, ejercicio_ids, fecha_limite, periodo):
+    """Como _sesiones_agregadas agrupando por semana o mes, a partir de los resúmenes
+
+    Los periodos completos salen de ResumenEjercicioPeriodo y solo los bordes
+    del rango se calculan desde las sesiones, así que el coste no crece con
+    la antigüedad del historial.
+    """
+    desde, hasta = _tramos_rango(fecha_limite, periodo)
+    bordes = _origen_resumen_ejercicio(
+        periodo,
+        RegistroEjercicio.usuario_id == usuario_id,
+        RegistroEjercicio.ejercicio_id.in_(ejercicio_ids),
+        RegistroEjercicio.fecha >= fecha_limite,
+        db.or_(RegistroEjercicio.fecha < desde, RegistroEjercicio.fecha >= hasta)
+    )
+    completos = db.select(*[
+        getattr(ResumenEjercicioPeriodo, columna.name) for columna in bordes.selected_columns
+    ]).where(
+        ResumenEjercicioPeriodo.usuario_id == usuario_id,
+        ResumenEjercicioPeriodo.ejercicio_id.in_(ejercicio_ids),
+        ResumenEjercicioPeriodo.periodo == periodo,
+        ResumenEjercicioPeriodo.inicio >= desde,
+        ResumenEjercicioPeriodo.inicio < hasta
+    )
+    periodos = db.union_all(bordes, completos).subquery()
+    
+    # Estadísticas del rango (iguales en todas las filas de cada ejercicio)
+    por_ejercicio = periodos.c.ejercicio_id
+    todo_el_rango = (None, None)
+    total_sesiones = db.func.sum(periodos.c.sesiones).over(partition_by=por_ejercicio)
+    return db.session.query(
+        periodos.c.ejercicio_id,
+        periodos.c.inicio.label('fecha'),
+        db.literal('').label('notas'),
+        periodos.c.sesiones,
+        periodos.c.series_total,
+        periodos.c.peso_max,
+        (periodos.c.suma_peso_promedio / periodos.c.sesiones).label('peso_promedio'),
+        periodos.c.repeticiones_total,
+        periodos.c.volumen_total,
+        periodos.c.peso_primera_serie,
+        periodos.c.reps_primera_serie,
+        db.func.first_value(periodos.c.peso_primera_inicial).over(
+            partition_by=por_ejercicio, order_by=periodos.c.inicio, rows=todo_el_rango).label('peso_inicial'),
+        db.func.last_value(periodos.c.peso_primera_final).over(
+            partition_by=por_ejercicio, order_by=periodos.c.inicio, rows=todo_el_rango).label('peso_actual'),
+        db.func.max(periodos.c.peso_primera_serie).over(partition_by=por_ejercicio).label('peso_maximo'),
+        total_sesiones.label('total_sesiones'),
+        (db.func.sum(periodos.c.volumen_total).over(partition_by=por_ejercicio) / total_sesiones
+         ).label('volumen_promedio')
+    ).order_by(periodos.c.ejercicio_id, periodos.c.inicio).all()
+
+def _graficas_ejercicios(usuario_id, ejercicio_ids, dias, detalle=True, resolucion=None, max_puntos=None):
+    """Datos de progreso de varios ejercicios: ``{ejercicio_id: datos}``
+
+    Se calculan todos a la vez (ejercicios, sesiones y series en una consulta
+    cada uno). Solo se incluyen los ejercicios del sistema o del usuario.
+    """
+    ejercicios = Ejercicio.query.filter(
+        Ejercicio.id.in_(ejercicio_ids),
+        db.or_(Ejercicio.usuario_id.is_(None), Ejercicio.usuario_id == usuario_id)
+    ).all()
+    if not ejercicios:
+        return {}
+    fecha_limite = date.today() - timedelta(days=dias)
+    
+    # Métricas por sesión (o por periodo) calculadas en la base de datos
+    filas_por_ejercicio = {ejercicio.id: [] for ejercicio in ejercicios}
+    for fila in _sesiones_agregadas(usuario_id, list(filas_por_ejercicio), fecha_limite, resolucion):
+        filas_por_ejercicio[fila.ejercicio_id].append(fila)
+    estadisticas_periodo = {id_: filas[0] for id_, filas in filas_por_ejercicio.items() if filas}
+    if max_puntos:
+        filas_por_ejercicio = {
+            id_: lttb(filas, max_puntos, lambda fila: fila.peso_primera_serie)
+            for id_, filas in filas_por_ejercicio.items()
+        }
+    
+    # Detalle de series solo si se pide, en una única consulta para todos los ejercicios
+    detalle = detalle and not resolucion
+    series_por_registro = {}
+    registro_ids = [fila.id for filas in filas_por_ejercicio.values() for fila in filas] if detalle else []
+    if registro_ids:
+        series = SerieEjercicio.query.filter(
+            SerieEjercicio.registro_id.in_(registro_ids)
+        ).order_by(SerieEjercicio.registro_id, SerieEjercicio.numero_serie).all()
+        for serie in series:
+            series_por_registro.setdefault(serie.registro_id, []).append({
+                'numero': serie.numero_serie,
+                'peso': float(serie.peso),
+                'repeticiones': serie.repeticiones,
+                'completada': serie.completada
+            })
+    
+    resultado = {}
+    for ejercicio in ejercicios:
+        # Preparar datos para gráficas
+        datos = []
+        for fila in filas_por_ejercicio[ejercicio.id]:
+            punto = {
+                'fecha': _fecha_texto(fila.fecha),
+                'peso_primera_serie': float(fila.peso_primera_serie),
+                'reps_primera_serie': fila.reps_primera_serie,
+                'peso_max': float(fila.peso_max),
+                'peso_promedio': float(fila.peso_promedio),
+                'repeticiones_total': int(fila.repeticiones_total),
+                'series_total': int(fila.series_total),
+                'volumen_total': float(fila.volumen_total),
+                'notas': fila.notas or ''
+            }
+            if resolucion:
+                punto['sesiones'] = fila.sesiones
+            if detalle:
+                punto['series_detalle'] = series_por_registro.get(fila.id, [])
+            datos.append(punto)
+        
+        # Estadísticas ya calculadas por la consulta (funciones de ventana)
+        estadisticas = {}
+        fila = estadisticas_periodo.get(ejercicio.id)
+        if fila:
+            estadisticas = {
+                'peso_actual': float(fila.peso_actual),
+                'peso_inicial': float(fila.peso_inicial),
+                'peso_maximo': float(fila.peso_maximo),
+                'diferencia': float(fila.peso_actual - fila.peso_inicial) if fila.total_sesiones > 1 else 0,
+                'total_sesiones': fila.total_sesiones,
+                'volumen_promedio': float(fila.volumen_promedio)
+            }
+        
+        resultado[ejercicio.id] = {
+            'ejercicio': ejercicio.nombre,
+            'grupo_muscular': ejercicio.grupo_muscular,
+            'datos': datos,
+            'estadisticas': estadisticas,
+            'periodo': f'Últimos {dias} días'
+        }
+    return resultado
+
 @app.route('/progreso_ejercicio/<int:ejercicio_id>')
+@presupuesto_sql(4)
+@respuesta_condicional
+@cachear_resultado
 def progreso_ejercicio(ejercicio_id):
-    """Obtener datos de progreso para un ejercicio específico (para gráficas)"""
+    """Obtener datos de progreso para un ejercicio específico (para gráficas)
+
+    ?resolucion=dia|semana|mes agrupa las sesiones por periodo (sin series_detalle)
+    y ?max_puntos=N reduce la serie con LTTB. Sin resolución, desde 365 días se
+    agrupa por semana y desde 730 por mes, salvo con ?detalle=1 explícito;
+    ?resolucion=sesion da un punto por sesión.
+    """
     if 'user_id' not in session:
         return {'error': 'No autenticado'}, 401
     
     # Obtener parámetros de filtro
     dias = request.args.get('dias', 90, type=int)  # Por defecto 3 meses para ejercicios
+    detalle = request.args.get('detalle', 1, type=int)  # 0 = sin series_detalle
+    try:
+        resolucion, max_puntos = _parametros_grafica(dias)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    
+    graficas = _graficas_ejercicios(session['user_id'], [ejercicio_id], dias, detalle, resolucion, max_puntos)
+    if ejercicio_id not in graficas:
+        abort(404)
+    return graficas[ejercicio_id]
+
+# Ejercicios que se pueden pedir de una vez en /api/graficas
+MAX_EJERCICIOS_GRAFICAS = 20
+
+@app.route('/api/graficas')
+@presupuesto_sql(5)
+@respuesta_condicional
+@cachear_resultado
+def graficas():
+    """Datos de varias gráficas en una sola petición
+
+    ?ejercicios=1,2,3 con los ejercicios a incluir y ?peso=1 para añadir la
+    serie de peso corporal. El periodo (?dias=, 90 por defecto), ?detalle=,
+    ?resolucion= y ?max_puntos= son comunes a todas las series y funcionan
+    igual que en /peso_data y /progreso_ejercicio. Los ejercicios que no
+    existen o no son del usuario no aparecen en la respuesta.
+    """
+    if 'user_id' not in session:
+        return {'error': 'No autenticado'}, 401
+    
+    try:
+        ejercicio_ids = sorted({int(valor) for valor in request.args.get('ejercicios', '').split(',') if valor})
+    except ValueError:
+        return {'error': 'ejercicios debe ser una lista de ids separados por comas'}, 400
+    if len(ejercicio_ids) > MAX_EJERCICIOS_GRAFICAS:
+        return {'error': f'Como máximo {MAX_EJERCICIOS_GRAFICAS} ejercicios por petición'}, 400
+    incluir_peso = request.args.get('peso', 0, type=int)
+    if not ejercicio_ids and not incluir_peso:
+        return {'error': 'Indica ejercicios o peso=1'}, 400
+    
+    dias = request.args.get('dias', 90, type=int)
+    detalle = request.args.get('detalle', 1, type=int)
+    try:
+        resolucion, max_puntos = _parametros_grafica(dias)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    
+    resultado = {'periodo': f'Últimos {dias} días'}
+    if incluir_peso:
+        resultado['peso'] = _grafica_peso(session['user_id'], dias, resolucion, max_puntos)
+    if ejercicio_ids:
+        ejercicios = _graficas_ejercicios(session['user_id'], ejercicio_ids, dias, detalle, resolucion, max_puntos)
+        # Claves de texto: es lo que queda tras serializar a JSON (y en la caché Redis)
+        resultado['ejercicios'] = {str(id_): datos for id_, datos in ejercicios.items()}
+    return resultado
+
+@app.route('/api/volumen_grupos')
+@presupuesto_sql(2)
+@respuesta_condicional
+@cachear_resultado
+def volumen_grupos():
+    """Volumen semanal por grupo muscular de los últimos ?dias= días (90 por defecto)
+
+    Las semanas completas salen de VolumenGrupoSemana; solo la semana a medias
+    del principio y la semana en curso se calculan desde las sesiones.
+    """
+    if 'user_id' not in session:
+        return {'error': 'No autenticado'}, 401
+    
+    usuario_id = session['user_id']
+    dias = request.args.get('dias', 90, type=int)
     fecha_limite = date.today() - timedelta(days=dias)
+    desde, hasta = _tramos_rango(fecha_limite, 'semana')
     
-    # Obtener registros del ejercicio ordenados por fecha
-    registros = RegistroEjercicio.query.filter_by(
-        usuario_id=session['user_id'],
-        ejercicio_id=ejercicio_id
-    ).filter(
-        RegistroEjercicio.fecha >= fecha_limite
-    ).order_by(RegistroEjercicio.fecha.asc()).all()
+    bordes = _origen_volumen_grupo(
+        RegistroEjercicio.usuario_id == usuario_id,
+        RegistroEjercicio.fecha >= fecha_limite,
+        db.or_(RegistroEjercicio.fecha < desde, RegistroEjercicio.fecha >= hasta)
+    )
+    completos = db.select(*[
+        getattr(VolumenGrupoSemana, columna.name) for columna in bordes.selected_columns
+    ]).where(
+        VolumenGrupoSemana.usuario_id == usuario_id,
+        VolumenGrupoSemana.inicio >= desde,
+        VolumenGrupoSemana.inicio < hasta
+    )
+    semanas = db.union_all(bordes, completos).subquery()
+    filas = db.session.query(semanas).order_by(semanas.c.grupo_muscular, semanas.c.inicio)
     
-    # Preparar datos para gráficas
-    datos = []
-    for registro in registros:
-        if registro.series:  # Si tiene series registradas
-            # Ordenar series por número
-            series_ordenadas = sorted(registro.series, key=lambda x: x.numero_serie)
-            
-            # Obtener peso de la primera serie (indicador principal)
-            primera_serie = series_ordenadas[0] if series_ordenadas else None
-            
-            if primera_serie:
-                # Calcular métricas del registro completo
-                peso_max = max(serie.peso for serie in registro.series)
-                peso_promedio = sum(serie.peso for serie in registro.series) / len(registro.series)
-                repeticiones_total = sum(serie.repeticiones for serie in registro.series)
-                volumen_total = sum(serie.peso * serie.repeticiones for serie in registro.series)
-                
-                datos.append({
-                    'fecha': registro.fecha.strftime('%Y-%m-%d'),
-                    'peso_primera_serie': float(primera_serie.peso),
-                    'reps_primera_serie': primera_serie.repeticiones,
-                    'peso_max': float(peso_max),
-                    'peso_promedio': float(peso_promedio),
-                    'repeticiones_total': repeticiones_total,
-                    'series_total': len(registro.series),
-                    'volumen_total': float(volumen_total),
-                    'notas': registro.notas or '',
-                    'series_detalle': [
-                        {
-                            'numero': serie.numero_serie,
-                            'peso': float(serie.peso),
-                            'repeticiones': serie.repeticiones,
-                            'completada': serie.completada
-                        } for serie in series_ordenadas
-                    ]
-                })
+    grupos = {}
+    for fila in filas:
+        grupos.setdefault(fila.grupo_muscular, []).append({
+            'fecha': _fecha_texto(fila.inicio),
+            'sesiones': fila.sesiones,
+            'series_total': int(fila.series_total),
+            'repeticiones_total': int(fila.repeticiones_total),
+            'volumen_total': float(fila.volumen_total)
+        })
+    return {'grupos': grupos, 'periodo': f'Últimos {dias} días'}
+
+@app.route('/api/records')
+@presupuesto_sql(2)
+def records_personales():
+    """Récords personales del usuario (?ejercicio_id= para uno solo)
+
+    Las repeticiones van aparte, una marca por peso de menor a mayor.
+    """
+    if 'user_id' not in session:
+        return {'error': 'No autenticado'}, 401
     
-    ejercicio = Ejercicio.query.get_or_404(ejercicio_id)
+    ejercicio_id = request.args.get('ejercicio_id', type=int)
     
-    # Calcular estadísticas
-    estadisticas = {}
-    if datos:
-        pesos_primera = [d['peso_primera_serie'] for d in datos]
-        estadisticas = {
-            'peso_actual': pesos_primera[-1] if pesos_primera else 0,
-            'peso_inicial': pesos_primera[0] if pesos_primera else 0,
-            'peso_maximo': max(pesos_primera) if pesos_primera else 0,
-            'diferencia': (pesos_primera[-1] - pesos_primera[0]) if len(pesos_primera) > 1 else 0,
-            'total_sesiones': len(datos),
-            'volumen_promedio': sum(d['volumen_total'] for d in datos) / len(datos) if datos else 0
+    def consulta(modelo, *orden):
+        consulta = db.session.query(modelo, Ejercicio.nombre).join(
+            Ejercicio, Ejercicio.id == modelo.ejercicio_id
+        ).filter(modelo.usuario_id == session['user_id'])
+        if ejercicio_id is not None:
+            consulta = consulta.filter(modelo.ejercicio_id == ejercicio_id)
+        return consulta.order_by(modelo.ejercicio_id, *orden)
+    
+    # Agrupados por ejercicio: {ejercicio_id: {ejercicio, records: {tipo: marca}, repeticiones: [marca]}}
+    resultado = {}
+    def del_ejercicio(record, nombre):
+        return resultado.setdefault(str(record.ejercicio_id),
+                                    {'ejercicio': nombre, 'records': {}, 'repeticiones': []})
+    
+    for record, nombre in consulta(RecordPersonal):
+        del_ejercicio(record, nombre)['records'][record.tipo] = {
+            'valor': record.valor,
+            'peso': record.peso,
+            'repeticiones': record.repeticiones,
+            'fecha': record.fecha.strftime('%Y-%m-%d'),
+            'registro_id': record.registro_id
         }
+    for record, nombre in consulta(RecordRepeticiones, RecordRepeticiones.peso):
+        del_ejercicio(record, nombre)['repeticiones'].append({
+            'peso': record.peso,
+            'repeticiones': record.repeticiones,
+            'fecha': record.fecha.strftime('%Y-%m-%d'),
+            'registro_id': record.registro_id
+        })
+    return {'ejercicios': resultado}
+
+# Tamaño de página de /api/historial
+LIMITE_HISTORIAL = 20
+MAX_LIMITE_HISTORIAL = 100
+
+def _codificar_cursor(registro):
+    return base64.urlsafe_b64encode(f'{registro.fecha.isoformat()}|{registro.id}'.encode()).decode()
+
+def _decodificar_cursor(cursor):
+    fecha, registro_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return date.fromisoformat(fecha), int(registro_id)
+
+@app.route('/api/historial')
+@presupuesto_sql(2)
+def historial():
+    """Historial de sesiones, de la más reciente a la más antigua, paginado por cursor
+
+    La paginación es por clave (fecha, id): cada página cuesta lo mismo sin
+    importar lo atrás que se esté. Filtros opcionales: ejercicio_id,
+    grupo_muscular, desde y hasta (YYYY-MM-DD). La respuesta incluye
+    "siguiente", el cursor de la página siguiente (null al llegar al final).
+    """
+    if 'user_id' not in session:
+        return {'error': 'No autenticado'}, 401
+    
+    limite = min(max(request.args.get('limite', LIMITE_HISTORIAL, type=int), 1), MAX_LIMITE_HISTORIAL)
+    consulta = RegistroEjercicio.query.options(
+        joinedload(RegistroEjercicio.ejercicio),
+        selectinload(RegistroEjercicio.series)
+    ).filter(RegistroEjercicio.usuario_id == session['user_id'])
+    
+    try:
+        if request.args.get('cursor'):
+            fecha, registro_id = _decodificar_cursor(request.args['cursor'])
+            consulta = consulta.filter(
+                db.tuple_(RegistroEjercicio.fecha, RegistroEjercicio.id) < db.tuple_(fecha, registro_id)
+            )
+        if request.args.get('desde'):
+            consulta = consulta.filter(RegistroEjercicio.fecha >= date.fromisoformat(request.args['desde']))
+        if request.args.get('hasta'):
+            consulta = consulta.filter(RegistroEjercicio.fecha <= date.fromisoformat(request.args['hasta']))
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        return {'error': 'Cursor o fechas no válidos'}, 400
+    
+    if request.args.get('ejercicio_id', type=int):
+        consulta = consulta.filter(RegistroEjercicio.ejercicio_id == request.args.get('ejercicio_id', type=int))
+    if request.args.get('grupo_muscular'):
+        consulta = consulta.join(RegistroEjercicio.ejercicio).filter(
+            Ejercicio.grupo_muscular == request.args['grupo_muscular']
+        )
+    
+    # Se pide uno de más para saber si hay otra página
+    registros = consulta.order_by(
+        RegistroEjercicio.fecha.desc(), RegistroEjercicio.id.desc()
+    ).limit(limite + 1).all()
+    hay_mas = len(registros) > limite
+    registros = registros[:limite]
     
     return {
-        'ejercicio': ejercicio.nombre,
-        'grupo_muscular': ejercicio.grupo_muscular,
-        'datos': datos,
-        'estadisticas': estadisticas,
-        'periodo': f'Últimos {dias} días'
+        'sesiones': [{
+            'id': registro.id,
+            'fecha': registro.fecha.strftime('%Y-%m-%d'),
+            'ejercicio': {
+                'id': registro.ejercicio.id,
+                'nombre': registro.ejercicio.nombre,
+                'grupo_muscular': registro.ejercicio.grupo_muscular
+            },
+            'notas': registro.notas or '',
+            'series': [{
+                'numero': serie.numero_serie,
+                'peso': float(serie.peso),
+                'repeticiones': serie.repeticiones,
+                'completada': serie.completada
+            } for serie in registro.series]
+        } for registro in registros],
+        'siguiente': _codificar_cursor(registros[-1]) if hay_mas else None
     }
 
 @app.route('/agregar_ejercicio', methods=['POST'])
@@ -400,6 +2191,8 @@ def agregar_ejercicio():
     )
     
     db.session.add(nuevo_ejercicio)
+    marcar_datos_modificados(session['user_id'])
+    invalidar_ejercicios_usuario(session['user_id'])
     db.session.commit()
     
     flash(f'Ejercicio "{nombre}" creado exitosamente!', 'success')
@@ -421,45 +2214,116 @@ def eliminar_ejercicio(ejercicio_id):
     if ejercicio.registros:
         # No eliminar, solo desactivar para preservar historial
         ejercicio.activo = False
+        marcar_datos_modificados(session['user_id'])
+        invalidar_ejercicios_usuario(session['user_id'])
         db.session.commit()
         flash(f'Ejercicio "{ejercicio.nombre}" archivado (tiene historial de entrenamientos)', 'info')
     else:
         # Eliminar completamente si no tiene registros
         db.session.delete(ejercicio)
+        marcar_datos_modificados(session['user_id'])
+        invalidar_ejercicios_usuario(session['user_id'])
         db.session.commit()
         flash(f'Ejercicio "{ejercicio.nombre}" eliminado', 'success')
     
     return redirect(url_for('dashboard'))
 
+@app.route('/estado/cache')
+@requiere_token_metricas
+def estado_cache():
+    """Contadores de las cachés de este worker (aciertos, fallos, evicciones)"""
+    return {
+        'resultados': cache_resultados.estadisticas(),
+        'catalogo_sistema': cache_catalogo_sistema.estadisticas(),
+        'ejercicios_usuario': cache_ejercicios_usuario.estadisticas()
+    }
+
+@app.route('/estado/replica')
+@requiere_token_metricas
+def estado_replica():
+    """Si este worker está leyendo de la réplica y su último retraso medido"""
+    if replica is None:
+        return {'configurada': False}
+    return dict(replica.estadisticas(), configurada=True)
+
 @app.route('/logout')
 def logout():
     session.clear()
     flash('Has cerrado sesión', 'info')
     return redirect(url_for('index'))
 
+# Migraciones del esquema (migraciones.py): se aplican con `flask migrar`, no al importar
+migraciones = Migraciones(db)
+
+@migraciones.migracion(1, 'Completar bases creadas antes de las migraciones')
+def _migracion_esquema_previo():
+    # Sin borrar nada: tablas, columnas e índices que falten en la versión 1
+    tablas = ['usuario', 'ejercicio', 'registro_ejercicio', 'serie_ejercicio', 'resumen_registro',
+              'registro_peso', 'lote_entrenamiento', 'record_personal', 'resumen_ejercicio_periodo',
+              'resumen_peso_periodo', 'volumen_grupo_semana']
+    tablas = [db.metadata.tables[nombre] for nombre in tablas]
+    db.metadata.create_all(db.engine, tables=tablas)
+    columnas_faltan = {
+        'usuario': {'version_datos': 'INTEGER NOT NULL DEFAULT 0'},
+        'ejercicio': {'usuario_id': 'INTEGER REFERENCES usuario (id)',
+                      'fecha_creacion': 'TIMESTAMP',
+                      'activo': 'BOOLEAN DEFAULT TRUE'},
+    }
+    inspector = db.inspect(db.engine)
+    for tabla, columnas in columnas_faltan.items():
+        existentes = {columna['name'] for columna in inspector.get_columns(tabla)}
+        for columna, definicion in columnas.items():
+            if columna not in existentes:
+                db.session.execute(db.text(f'ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}'))
+    # El índice único de registro_peso no se puede crear con duplicados
+    borrados = eliminar_pesos_duplicados()
+    if borrados:
+        print(f"Pesos duplicados eliminados: {borrados}")
+    db.session.commit()
+    for tabla in tablas:
+        for indice in tabla.indexes:
+            indice.create(db.engine, checkfirst=True)
+
+@migraciones.migracion(2, 'Calcular resúmenes y récords de los datos existentes')
+def _migracion_derivados():
+    if ResumenRegistro.query.first() is None and SerieEjercicio.query.first() is not None:
+        print(f"Resúmenes de sesión creados: {rellenar_resumenes()}")
+    if (ResumenEjercicioPeriodo.query.first() is None and ResumenPesoPeriodo.query.first() is None
+            and (ResumenRegistro.query.first() is not None or RegistroPeso.query.first() is not None)):
+        print(f"Resúmenes por periodo creados: {reconstruir_resumenes_periodo()}")
+    # Los récords los calcula la migración 3, que ya crea todas sus tablas
+
+@migraciones.migracion(3, 'Récords de repeticiones por peso')
+def _migracion_records_repeticiones():
+    db.metadata.create_all(db.engine, tables=[RecordRepeticiones.__table__])
+    # Quita también los de repeticiones que había en RecordPersonal
+    print(f"Récords personales recalculados: {reconstruir_records()}")
+
+@migraciones.migracion(4, 'Repeticiones de la mejor primera serie en los resúmenes por periodo')
+def _migracion_resumenes_primera_serie():
+    # Antes se guardaba el máximo de repeticiones de cualquier sesión del periodo
+    if ResumenEjercicioPeriodo.query.first() is not None or ResumenPesoPeriodo.query.first() is not None:
+        print(f"Resúmenes por periodo recalculados: {reconstruir_resumenes_periodo()}")
+
+@migraciones.migracion(5, 'Catálogo de ejercicios del sistema', en_base_nueva=True)
+def _migracion_catalogo():
+    # Dentro del cerrojo de migrar(): dos arranques a la vez no siembran dos veces
+    sembrar_catalogo()
+
+@migraciones.migracion(6, 'Versión de los ejercicios personalizados de cada usuario')
+def _migracion_version_ejercicios():
+    existentes = {columna['name'] for columna in db.inspect(db.engine).get_columns('usuario')}
+    if 'version_ejercicios' not in existentes:
+        db.session.execute(db.text('ALTER TABLE usuario ADD COLUMN version_ejercicios INTEGER NOT NULL DEFAULT 0'))
+
 def init_db():
-    """Inicializar la base de datos con datos de ejemplo"""
-    # Crear todas las tablas
-    db.create_all()
-    
-    # Si hay una actualización de esquema, eliminar y recrear las tablas
-    try:
-        # Probar si la nueva estructura funciona
-        SerieEjercicio.query.first()
-        RegistroPeso.query.first()
-        # Verificar que el modelo Ejercicio tiene el nuevo campo usuario_id
-        ejercicio_test = Ejercicio.query.first()
-        if ejercicio_test:
-            _ = ejercicio_test.usuario_id  # Esto fallará si el campo no existe
-    except Exception:
-        # Si hay error, recrear las tablas
-        print("Actualizando estructura de base de datos...")
-        db.drop_all()
-        db.create_all()
-        print("Base de datos actualizada correctamente.")
-    
-    # Agregar ejercicios de ejemplo si no existen
-    if Ejercicio.query.count() == 0:
+    """Aplicar las migraciones pendientes (la última siembra el catálogo si está vacío)"""
+    for migracion in migraciones.migrar():
+        print(f"Versión {migracion.version}: {migracion.descripcion}")
+
+def sembrar_catalogo():
+    """Crear los ejercicios del sistema si todavía no hay ninguno"""
+    if Ejercicio.query.filter_by(usuario_id=None).first() is None:
         ejercicios_ejemplo = [
             #Ejercicios de Pecho
             Ejercicio(nombre='Press de Banca', grupo_muscular='Pecho', descripcion='Ejercicio para pecho'),
@@ -522,10 +2386,23 @@ def init_db():
             db.session.add(ejercicio)
         
         db.session.commit()
+        cache_catalogo_sistema.invalidar()
+        print(f"Catálogo creado: {len(ejercicios_ejemplo)} ejercicios")
 
-# Inicializar la base de datos automáticamente en producción
-with app.app_context():
+@app.cli.command('migrar')
+@click.option('--estado', is_flag=True, help='Solo mostrar las migraciones pendientes')
+def migrar_command(estado):
+    """Aplicar las migraciones pendientes del esquema y sembrar el catálogo"""
+    if estado:
+        pendientes = migraciones.pendientes()
+        for migracion in pendientes:
+            print(f"Pendiente {migracion.version}: {migracion.descripcion}")
+        print(f"Migraciones pendientes: {len(pendientes)}")
+        return
     init_db()
 
 if __name__ == '__main__':
+    # En desarrollo se migra al arrancar; en producción, `flask migrar` antes de gunicorn
+    with app.app_context():
+        init_db()
     app.run(debug=True, host='0.0.0.0', port=5000)
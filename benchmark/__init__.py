@@ -0,0 +1,20 @@
+"""Generador de datos sintéticos y pruebas de carga para Gym Tracker.
+
+Uso (contra la base de datos de DATABASE_URL, SQLite o PostgreSQL local)::
+
+    python -m benchmark generar --usuarios 20 --anios 3
+    python -m benchmark carga --duracion 30 --concurrencia 8
+    python -m benchmark carga --url http://127.0.0.1:5000 --comparar
+
+``carga`` sin ``--url`` lanza las peticiones dentro del proceso con el
+cliente de pruebas de Flask; con ``--url`` va contra un servidor real (por
+ejemplo gunicorn en local). ``--comparar`` falla si algún endpoint empeora
+respecto a ``benchmark/lineas_base.json``. La línea base ``local-sqlite``
+incluida se midió con::
+
+    python -m benchmark generar --usuarios 10 --anios 3
+    python -m benchmark carga --usuarios 10 --duracion 10 --concurrencia 4 --guardar-base
+
+Las líneas base dependen de la máquina: conviene regenerarlas con
+``--guardar-base`` en la máquina donde se vaya a comparar.
+"""
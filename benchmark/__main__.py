@@ -0,0 +1,89 @@
+import argparse
+import json
+import os
+import sys
+
+from benchmark import carga, generador
+
+FICHERO_BASE = os.path.join(os.path.dirname(__file__), 'lineas_base.json')
+
+
+def _generar(args):
+    from app import app
+    with app.app_context():
+        resumen = generador.generar(args.usuarios, args.anios, args.semilla)
+    print(f'Usuarios: {resumen["usuarios"]}, sesiones: {resumen["sesiones"]}, '
+          f'series: {resumen["series"]}, pesos: {resumen["pesos"]}')
+
+
+def _carga(args):
+    from app import app, Ejercicio
+    with app.app_context():
+        ejercicios = [e.id for e in Ejercicio.query.filter_by(usuario_id=None, activo=True)]
+
+    if args.url:
+        crear_cliente = lambda: carga.ClienteHTTP(args.url)
+        perfil = args.perfil or 'http'
+    else:
+        crear_cliente = lambda: carga.ClienteLocal(app)
+        perfil = args.perfil or f'local-{app.config["SQLALCHEMY_DATABASE_URI"].split(":")[0]}'
+
+    resultado = carga.ejecutar(crear_cliente, args.usuarios, ejercicios, args.duracion, args.concurrencia)
+    carga.imprimir(resultado)
+
+    bases = {}
+    if os.path.exists(args.base):
+        with open(args.base) as f:
+            bases = json.load(f)
+
+    parametros = {'usuarios': args.usuarios, 'duracion': args.duracion, 'concurrencia': args.concurrencia}
+    if args.guardar_base:
+        bases[perfil] = {'parametros': parametros, 'endpoints': resultado}
+        with open(args.base, 'w') as f:
+            json.dump(bases, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Línea base "{perfil}" guardada en {args.base}')
+
+    if args.comparar:
+        if perfil not in bases:
+            print(f'No hay línea base para "{perfil}"')
+            return 1
+        if bases[perfil]['parametros'] != parametros:
+            print(f'Aviso: la línea base se midió con {bases[perfil]["parametros"]}')
+        regresiones = carga.comparar(resultado, bases[perfil]['endpoints'], args.tolerancia)
+        for regresion in regresiones:
+            print(f'REGRESIÓN {regresion}')
+        if regresiones:
+            return 1
+        print(f'Sin regresiones respecto a "{perfil}"')
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmark')
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    p_generar = subparsers.add_parser('generar', help='Crear usuarios sintéticos con historial')
+    p_generar.add_argument('--usuarios', type=int, default=20)
+    p_generar.add_argument('--anios', type=float, default=3)
+    p_generar.add_argument('--semilla', type=int, default=42)
+
+    p_carga = subparsers.add_parser('carga', help='Prueba de carga concurrente')
+    p_carga.add_argument('--url', help='Servidor contra el que lanzar la carga (por defecto, en proceso)')
+    p_carga.add_argument('--usuarios', type=int, default=20, help='Usuarios sintéticos disponibles')
+    p_carga.add_argument('--duracion', type=float, default=30, help='Segundos de carga')
+    p_carga.add_argument('--concurrencia', type=int, default=8, help='Usuarios virtuales simultáneos')
+    p_carga.add_argument('--perfil', help='Nombre de la línea base (por defecto según el destino)')
+    p_carga.add_argument('--base', default=FICHERO_BASE)
+    p_carga.add_argument('--guardar-base', action='store_true', help='Guardar el resultado como línea base')
+    p_carga.add_argument('--comparar', action='store_true', help='Fallar si empeora respecto a la línea base')
+    p_carga.add_argument('--tolerancia', type=float, default=carga.TOLERANCIA)
+
+    args = parser.parse_args(argv)
+    if args.comando == 'generar':
+        return _generar(args)
+    return _carga(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""Prueba de carga: usuarios virtuales concurrentes contra los endpoints principales.
+
+Cada usuario virtual inicia sesión con un usuario sintético del generador y
+repite una mezcla de peticiones parecida al uso real del dashboard. Se mide
+la latencia de cada petición y se informa de p50/p95/p99 y del rendimiento
+por endpoint.
+"""
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+
+from benchmark.generador import CONTRASENA, nombre_usuario
+
+# Peso de cada acción en la mezcla
+MEZCLA = [
+    ('dashboard', 30),
+    ('peso_data', 20),
+    ('progreso_ejercicio', 35),
+    ('registrar_ejercicio', 10),
+    ('login', 5),
+]
+
+# Empeoramiento admitido respecto a la línea base antes de dar la ejecución por fallida
+TOLERANCIA = 0.5
+
+
+class _SinRedirecciones(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class ClienteHTTP:
+    """Cliente con cookies contra un servidor real"""
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(CookieJar()), _SinRedirecciones()
+        )
+
+    def peticion(self, metodo, ruta, datos=None):
+        cuerpo = urllib.parse.urlencode(datos, doseq=True).encode() if datos is not None else None
+        try:
+            with self.opener.open(urllib.request.Request(self.url + ruta, data=cuerpo, method=metodo)) as r:
+                r.read()
+                return r.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+class ClienteLocal:
+    """Cliente de pruebas de Flask (sin servidor, en el mismo proceso)"""
+
+    def __init__(self, app):
+        self.cliente = app.test_client()
+
+    def peticion(self, metodo, ruta, datos=None):
+        return self.cliente.open(ruta, method=metodo, data=datos).status_code
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0.0
+    indice = max(0, min(len(valores) - 1, int(round(p / 100 * len(valores) + 0.5)) - 1))
+    return valores[indice]
+
+
+def _usuario_virtual(cliente, usuario, ejercicios, fin, rng, resultados):
+    acciones = [accion for accion, _ in MEZCLA]
+    pesos = [peso for _, peso in MEZCLA]
+
+    def medir(accion, metodo, ruta, datos=None):
+        inicio = time.perf_counter()
+        estado = cliente.peticion(metodo, ruta, datos)
+        resultados.append((accion, time.perf_counter() - inicio, estado < 400))
+
+    credenciales = {'username': usuario, 'password': CONTRASENA}
+    medir('login', 'POST', '/login', credenciales)
+
+    while time.monotonic() < fin:
+        accion = rng.choices(acciones, pesos)[0]
+        if accion == 'dashboard':
+            medir(accion, 'GET', '/dashboard')
+        elif accion == 'peso_data':
+            medir(accion, 'GET', f'/peso_data?dias={rng.choice([30, 90, 365, 1095])}')
+        elif accion == 'progreso_ejercicio':
+            dias = rng.choice([30, 90, 365, 1095])
+            medir(accion, 'GET', f'/progreso_ejercicio/{rng.choice(ejercicios)}?dias={dias}&detalle=0')
+        elif accion == 'registrar_ejercicio':
+            series = [json.dumps({'peso': rng.randint(20, 100), 'repeticiones': rng.randint(5, 12)})
+                      for _ in range(rng.randint(3, 5))]
+            medir(accion, 'POST', '/registrar_ejercicio',
+                  {'ejercicio_id': rng.choice(ejercicios), 'series_data': series})
+        else:
+            medir(accion, 'POST', '/login', credenciales)
+
+
+def ejecutar(crear_cliente, usuarios, ejercicios, duracion, concurrencia, semilla=42):
+    """Lanzar ``concurrencia`` usuarios virtuales durante ``duracion`` segundos
+
+    ``crear_cliente()`` devuelve un cliente nuevo (con su propia sesión) por
+    usuario virtual. Devuelve el informe por endpoint y total.
+    """
+    resultados = []
+    fin = time.monotonic() + duracion
+    hilos = [
+        threading.Thread(target=_usuario_virtual, args=(
+            crear_cliente(), nombre_usuario(i % usuarios), ejercicios, fin,
+            random.Random(f'{semilla}-{i}'), resultados
+        ))
+        for i in range(concurrencia)
+    ]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return informe(resultados, time.perf_counter() - inicio)
+
+
+def informe(resultados, segundos):
+    por_endpoint = {}
+    for accion, latencia, correcta in resultados:
+        por_endpoint.setdefault(accion, []).append((latencia, correcta))
+    por_endpoint['total'] = [(latencia, correcta) for _, latencia, correcta in resultados]
+
+    salida = {}
+    for accion, medidas in por_endpoint.items():
+        latencias = sorted(latencia for latencia, _ in medidas)
+        salida[accion] = {
+            'peticiones': len(medidas),
+            'errores': sum(1 for _, correcta in medidas if not correcta),
+            'rps': round(len(medidas) / segundos, 2) if segundos else 0,
+            'p50_ms': round(_percentil(latencias, 50) * 1000, 2),
+            'p95_ms': round(_percentil(latencias, 95) * 1000, 2),
+            'p99_ms': round(_percentil(latencias, 99) * 1000, 2),
+        }
+    return salida
+
+
+def imprimir(resultado):
+    print(f'{"endpoint":<22}{"peticiones":>11}{"errores":>9}{"rps":>9}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}')
+    for accion, datos in sorted(resultado.items(), key=lambda x: (x[0] == 'total', x[0])):
+        print(f'{accion:<22}{datos["peticiones"]:>11}{datos["errores"]:>9}{datos["rps"]:>9}'
+              f'{datos["p50_ms"]:>10}{datos["p95_ms"]:>10}{datos["p99_ms"]:>10}')
+
+
+def comparar(resultado, base, tolerancia=TOLERANCIA):
+    """Lista de regresiones respecto a una línea base (vacía si todo está bien)"""
+    regresiones = []
+    for accion, referencia in base.items():
+        actual = resultado.get(accion)
+        if actual is None:
+            continue
+        limite = referencia['p95_ms'] * (1 + tolerancia)
+        if actual['p95_ms'] > limite:
+            regresiones.append(f'{accion}: p95 {actual["p95_ms"]} ms > {limite:.2f} ms')
+        if actual['errores'] > referencia.get('errores', 0):
+            regresiones.append(f'{accion}: {actual["errores"]} errores (base {referencia.get("errores", 0)})')
+    total, referencia = resultado.get('total'), base.get('total')
+    if total and referencia and total['rps'] < referencia['rps'] / (1 + tolerancia):
+        regresiones.append(f'total: {total["rps"]} rps < {referencia["rps"] / (1 + tolerancia):.2f} rps')
+    return regresiones
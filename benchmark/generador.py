@@ -0,0 +1,115 @@
+"""Generador de historiales realistas sobre el catálogo que crea `flask migrar`.
+
+Cada usuario sintético entrena 3-5 días por semana con una rutina dividida
+por grupos musculares, sube de peso poco a poco (con días malos y descargas)
+y se pesa la mayoría de los días. Con la misma semilla se obtienen siempre
+los mismos datos.
+"""
+import random
+from datetime import date, timedelta
+
+from werkzeug.security import generate_password_hash
+
+PREFIJO_USUARIO = 'bench_'
+CONTRASENA = 'bench'
+
+# Días de la rutina (se repiten en orden)
+RUTINA = [('Pecho', 'Triceps'), ('Espalda', 'Biceps'), ('Piernas', 'Abdomen'), ('Hombros',)]
+
+# Sesiones que se insertan de una vez
+TAM_LOTE = 2000
+
+
+def nombre_usuario(i):
+    return f'{PREFIJO_USUARIO}{i:04d}'
+
+
+def _historial_usuario(rng, catalogo, anios, hoy):
+    """Generar (sesiones, pesos) de un usuario, con el formato de insertar_sesiones/guardar_pesos"""
+    from app import SerieValidada
+
+    # Ejercicios habituales del usuario y su peso de partida
+    favoritos = {
+        grupo: rng.sample(ejercicios, min(len(ejercicios), rng.randint(2, 4)))
+        for grupo, ejercicios in catalogo.items()
+    }
+    carga = {ejercicio_id: rng.uniform(15, 90) for lista in favoritos.values() for ejercicio_id in lista}
+    dias_por_semana = rng.randint(3, 5)
+    peso_corporal = rng.uniform(60, 100)
+
+    sesiones = []
+    pesos = []
+    dia_rutina = 0
+    inicio = hoy - timedelta(days=int(anios * 365))
+    fecha = inicio
+    while fecha <= hoy:
+        # Peso corporal: paseo aleatorio, registrado el 60 % de los días
+        peso_corporal += rng.gauss(0, 0.15)
+        if rng.random() < 0.6:
+            pesos.append({'fecha': fecha, 'peso': round(peso_corporal, 1), 'notas': ''})
+
+        if rng.random() < dias_por_semana / 7:
+            descarga = fecha.isocalendar()[1] % 8 == 0  # Una semana suave cada 8
+            for grupo in RUTINA[dia_rutina % len(RUTINA)]:
+                for ejercicio_id in favoritos.get(grupo, ()):
+                    carga[ejercicio_id] *= 1 + rng.uniform(-0.01, 0.02)
+                    peso = carga[ejercicio_id] * (0.8 if descarga else 1)
+                    series = []
+                    for numero in range(1, rng.randint(3, 5) + 1):
+                        series.append(SerieValidada(
+                            numero_serie=numero,
+                            peso=round(peso * (1 + 0.05 * (numero - 1)) / 1.25) * 1.25,
+                            repeticiones=max(3, 12 - 2 * (numero - 1) + rng.randint(-1, 1)),
+                            completada=rng.random() > 0.05
+                        ))
+                    sesiones.append({
+                        'ejercicio_id': ejercicio_id,
+                        'fecha': fecha,
+                        'notas': 'Descarga' if descarga else '',
+                        'series': series
+                    })
+            dia_rutina += 1
+        fecha += timedelta(days=1)
+    return sesiones, pesos
+
+
+def generar(usuarios, anios, semilla=42):
+    """Crear ``usuarios`` usuarios con ``anios`` años de historial (los existentes se saltan)
+
+    Debe llamarse dentro de un contexto de aplicación. Devuelve un resumen.
+    """
+    from app import (Ejercicio, Usuario, actualizar_records, app, db, guardar_pesos,
+                     insertar_sesiones_masivo)
+
+    catalogo = {}
+    for ejercicio in Ejercicio.query.filter_by(usuario_id=None, activo=True).order_by(Ejercicio.id):
+        catalogo.setdefault(ejercicio.grupo_muscular, []).append(ejercicio.id)
+    if not catalogo:
+        raise RuntimeError('El catálogo de ejercicios está vacío: ejecuta `flask migrar` primero')
+
+    hoy = date.today()
+    hash_contrasena = generate_password_hash(CONTRASENA, method=app.config['HASH_METODO'])
+    resumen = {'usuarios': 0, 'sesiones': 0, 'series': 0, 'pesos': 0}
+
+    for i in range(usuarios):
+        username = nombre_usuario(i)
+        if Usuario.query.filter_by(username=username).first():
+            continue
+        usuario = Usuario(username=username, email=f'{username}@bench.local', password_hash=hash_contrasena)
+        db.session.add(usuario)
+        db.session.flush()
+
+        # Semilla por usuario: añadir usuarios no cambia los ya generados
+        sesiones, pesos = _historial_usuario(random.Random(f'{semilla}-{i}'), catalogo, anios, hoy)
+        for inicio in range(0, len(sesiones), TAM_LOTE):
+            lote = sesiones[inicio:inicio + TAM_LOTE]
+            actualizar_records(usuario.id, insertar_sesiones_masivo(usuario.id, lote), lote)
+        for inicio in range(0, len(pesos), TAM_LOTE):
+            guardar_pesos(usuario.id, pesos[inicio:inicio + TAM_LOTE])
+        db.session.commit()
+
+        resumen['usuarios'] += 1
+        resumen['sesiones'] += len(sesiones)
+        resumen['series'] += sum(len(sesion['series']) for sesion in sesiones)
+        resumen['pesos'] += len(pesos)
+    return resumen
@@ -0,0 +1,143 @@
+"""Cachés de resultados: en memoria del proceso o compartida en Redis.
+
+``CacheLocal`` es la opción por defecto (por worker, con TTL y límite LRU).
+``CacheRedis`` comparte las entradas entre todos los workers de gunicorn
+usando cualquier servidor compatible con Redis; necesita el paquete opcional
+``redis``. Ambas exponen la misma interfaz: ``obtener(clave, cargar)``,
+``invalidar()`` y ``estadisticas()``.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class CacheLocal:
+    """Caché por proceso con caducidad (TTL), versión y límite de entradas (LRU).
+
+    Una entrada es válida mientras no haya caducado y su versión coincida con
+    la pedida. ``invalidar()`` sin clave descarta todo subiendo la versión
+    global.
+    """
+
+    def __init__(self, ttl, max_entradas=1024):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.version = 0
+        self.contadores = {'aciertos': 0, 'fallos': 0, 'evicciones': 0, 'caducadas': 0}
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave, cargar, version=None):
+        ahora = time.monotonic()
+        with self._lock:
+            version_actual = self.version
+            entrada = self._entradas.get(clave)
+            if entrada:
+                expira, version_global, version_entrada, valor = entrada
+                if expira > ahora and version_global == version_actual and version_entrada == version:
+                    self._entradas.move_to_end(clave)
+                    self.contadores['aciertos'] += 1
+                    return valor
+                if expira <= ahora:
+                    self.contadores['caducadas'] += 1
+            self.contadores['fallos'] += 1
+
+        # Cargar fuera del lock: dos cargas simultáneas solo repiten trabajo. Se
+        # guarda con la versión previa a la carga para que una invalidación
+        # concurrente no deje datos viejos como válidos
+        valor = cargar()
+        with self._lock:
+            self._entradas[clave] = (ahora + self.ttl, version_actual, version, valor)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self.contadores['evicciones'] += 1
+        return valor
+
+    def invalidar(self, clave=None):
+        with self._lock:
+            if clave is None:
+                self.version += 1
+                self._entradas.clear()
+            else:
+                self._entradas.pop(clave, None)
+
+    def estadisticas(self):
+        with self._lock:
+            return dict(self.contadores, entradas=len(self._entradas), backend='memoria')
+
+
+
+class CacheRedis:
+    """Caché compartida en un servidor compatible con Redis (valores serializados en JSON).
+
+    Si el servidor no responde se calcula el valor sin caché, de modo que una
+    caída de Redis no tira las gráficas. Los contadores son de este proceso;
+    las evicciones las decide el servidor según su ``maxmemory-policy``.
+    """
+
+    def __init__(self, cliente, ttl, prefijo='gym:resultado:'):
+        self.cliente = cliente
+        self.ttl = ttl
+        self.prefijo = prefijo
+        self.contadores = {'aciertos': 0, 'fallos': 0, 'errores': 0}
+        self._lock = threading.Lock()
+
+    def _contar(self, nombre):
+        with self._lock:
+            self.contadores[nombre] += 1
+
+    def _clave(self, clave):
+        return self.prefijo + hashlib.sha1(repr(clave).encode()).hexdigest()
+
+    def obtener(self, clave, cargar, version=None):
+        clave_redis = self._clave((clave, version))
+        try:
+            guardado = self.cliente.get(clave_redis)
+        except Exception:
+            logger.warning('Caché Redis no disponible', exc_info=True)
+            self._contar('errores')
+            return cargar()
+
+        if guardado is not None:
+            self._contar('aciertos')
+            return json.loads(guardado)
+
+        self._contar('fallos')
+        valor = cargar()
+        try:
+            self.cliente.setex(clave_redis, self.ttl, json.dumps(valor))
+        except Exception:
+            logger.warning('No se pudo guardar en la caché Redis', exc_info=True)
+            self._contar('errores')
+        return valor
+
+    def invalidar(self, clave=None):
+        # Las claves llevan la versión de datos del usuario: las antiguas caducan solas
+        if clave is not None:
+            try:
+                self.cliente.delete(self._clave((clave, None)))
+            except Exception:
+                self._contar('errores')
+
+    def estadisticas(self):
+        with self._lock:
+            return dict(self.contadores, backend='redis')
+
+
+def crear_cache_resultados(url, ttl, max_entradas):
+    """CacheRedis si hay URL y el paquete redis está instalado; si no, CacheLocal"""
+    if url:
+        try:
+            import redis
+        except ImportError:
+            logger.warning('CACHE_RESULTADOS_URL definido pero falta el paquete redis; '
+                           'se usa la caché en memoria')
+        else:
+            return CacheRedis(redis.Redis.from_url(url, socket_timeout=0.5), ttl)
+    return CacheLocal(ttl, max_entradas)
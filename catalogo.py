@@ -0,0 +1,41 @@
+"""Caché en memoria del catálogo de ejercicios para el menú del dashboard.
+
+El catálogo del sistema casi nunca cambia, así que se guarda por proceso ya
+agrupado por grupo muscular. Los ejercicios personalizados de cada usuario van
+en una caché aparte, pequeña y con límite de entradas (ver ``cache.CacheLocal``).
+"""
+from collections import namedtuple
+
+
+# Copia inmutable de un Ejercicio: se puede compartir entre peticiones sin
+# depender de una sesión de SQLAlchemy
+EjercicioMenu = namedtuple('EjercicioMenu', ['id', 'nombre', 'grupo_muscular', 'descripcion', 'usuario_id'])
+
+
+def copiar_ejercicio(ejercicio):
+    return EjercicioMenu(ejercicio.id, ejercicio.nombre, ejercicio.grupo_muscular,
+                         ejercicio.descripcion, ejercicio.usuario_id)
+
+
+def agrupar_ejercicios(ejercicios):
+    """Agrupar por grupo muscular manteniendo el orden de entrada"""
+    agrupados = {}
+    for ejercicio in ejercicios:
+        agrupados.setdefault(ejercicio.grupo_muscular, []).append(ejercicio)
+    return {grupo: tuple(lista) for grupo, lista in agrupados.items()}
+
+
+def combinar_menu(sistema, personalizados):
+    """Unir el menú del sistema (ya agrupado) con los ejercicios del usuario.
+
+    ``sistema`` es ``(ejercicios, agrupados)``. Devuelve
+    ``(todos, agrupados, grupos_ordenados)`` como los espera el dashboard.
+    """
+    ejercicios_sistema, agrupados_sistema = sistema
+    if not personalizados:
+        return list(ejercicios_sistema), agrupados_sistema, sorted(agrupados_sistema)
+
+    agrupados = dict(agrupados_sistema)
+    for grupo, lista in agrupar_ejercicios(personalizados).items():
+        agrupados[grupo] = agrupados.get(grupo, ()) + lista
+    return list(ejercicios_sistema) + list(personalizados), agrupados, sorted(agrupados)
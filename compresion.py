@@ -0,0 +1,58 @@
+"""Compresión gzip/brotli de las respuestas HTML, JSON, CSS y JS.
+
+Las respuestas de esos tipos que superan ``COMPRESION_MIN_BYTES`` se
+comprimen con brotli (si el paquete ``brotli`` está instalado y el cliente
+lo acepta) o con gzip. Las respuestas en streaming (exportaciones) y las que
+ya llevan ``Content-Encoding`` se dejan como están.
+"""
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # Opcional: sin él solo se usa gzip
+    brotli = None
+
+TIPOS_COMPRIMIBLES = ('text/html', 'application/json', 'text/css', 'text/javascript', 'application/javascript')
+
+
+def codificaciones_disponibles():
+    return ('br', 'gzip') if brotli else ('gzip',)
+
+
+def comprimir(datos, codificacion, maximo=False):
+    """Comprimir con 'br' o 'gzip'; ``maximo`` para ficheros que se comprimen una sola vez"""
+    if codificacion == 'br':
+        return brotli.compress(datos, quality=11 if maximo else 5)
+    return gzip.compress(datos, compresslevel=9 if maximo else 6, mtime=0)
+
+
+def elegir_codificacion(aceptadas):
+    """Mejor codificación aceptada por el cliente (cabecera Accept-Encoding ya parseada) o None"""
+    for codificacion in codificaciones_disponibles():
+        if aceptadas[codificacion]:
+            return codificacion
+    return None
+
+
+def init_compresion(app):
+    app.config.setdefault('COMPRESION_MIN_BYTES', 1024)
+
+    @app.after_request
+    def _comprimir(response):
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or response.mimetype not in TIPOS_COMPRIMIBLES or 'Content-Encoding' in response.headers):
+            return response
+        datos = response.get_data()
+        if len(datos) < app.config['COMPRESION_MIN_BYTES']:
+            return response
+
+        # La respuesta depende de Accept-Encoding aunque esta vez no se comprima
+        response.vary.add('Accept-Encoding')
+        codificacion = elegir_codificacion(request.accept_encodings)
+        if codificacion is None:
+            return response
+        response.set_data(comprimir(datos, codificacion))
+        response.headers['Content-Encoding'] = codificacion
+        return response
@@ -0,0 +1,88 @@
+"""Hash de contraseñas fuera de los hilos que atienden peticiones.
+
+El hash es trabajo de CPU puro: hecho en línea, una ráfaga de inicios de
+sesión acapara todos los workers. Aquí se envía a un pool de procesos
+acotado y, antes de encolar, se pide plaza en un semáforo: si no hay plaza
+en ``espera`` segundos se rechaza (``HashOcupado``) en lugar de dejar que los
+inicios de sesión se coman todos los hilos del worker.
+
+El factor de trabajo es el ``metodo`` de Werkzeug (p. ej.
+``pbkdf2:sha256:600000`` o ``scrypt:32768:8:1``); los hashes guardados con
+otros parámetros se marcan para rehacerse al iniciar sesión.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashOcupado(RuntimeError):
+    """No hay plaza para calcular más hashes ahora mismo"""
+
+
+# Funciones de nivel de módulo para que el pool de procesos pueda ejecutarlas
+def _generar(contrasena, metodo):
+    return generate_password_hash(contrasena, method=metodo)
+
+
+def _verificar(hash_guardado, contrasena):
+    return check_password_hash(hash_guardado, contrasena)
+
+
+def _prefijo(metodo):
+    # Werkzeug completa los métodos abreviados ('scrypt' -> 'scrypt:32768:8:1'):
+    # el prefijo real solo se conoce generando un hash
+    return generate_password_hash('', method=metodo).split('$', 1)[0]
+
+
+class ServicioContrasenas:
+    def __init__(self, metodo, procesos=2, max_pendientes=3, espera=0.2):
+        self.metodo = metodo
+        self.procesos = procesos
+        self.espera = espera
+        self._plazas = threading.BoundedSemaphore(max_pendientes)
+        self._pool = None
+        self._prefijo = None
+        self._lock = threading.Lock()
+
+    def _ejecutor(self):
+        # Al primer uso, como los hilos de hilos.py. 'spawn' evita hacer fork de
+        # un proceso con varios hilos
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.procesos, mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._pool
+
+    def _ejecutar(self, funcion, *args):
+        if not self._plazas.acquire(timeout=self.espera):
+            raise HashOcupado()
+        try:
+            if not self.procesos:
+                return funcion(*args)
+            pool = self._ejecutor()
+            try:
+                return pool.submit(funcion, *args).result()
+            except BrokenProcessPool:
+                # Un proceso del pool murió: se descarta y el siguiente hash crea otro
+                with self._lock:
+                    if self._pool is pool:
+                        self._pool = None
+                raise
+        finally:
+            self._plazas.release()
+
+    def generar(self, contrasena):
+        return self._ejecutar(_generar, contrasena, self.metodo)
+
+    def verificar(self, hash_guardado, contrasena):
+        return self._ejecutar(_verificar, hash_guardado, contrasena)
+
+    def necesita_rehash(self, hash_guardado):
+        # El prefijo se calcula la primera vez que hace falta, no al importar la aplicación
+        if self._prefijo is None:
+            self._prefijo = self._ejecutar(_prefijo, self.metodo)
+        return hash_guardado.split('$', 1)[0] != self._prefijo
@@ -0,0 +1,127 @@
+"""Escrituras agrupadas (group commit).
+
+Con ``ESCRITURAS_AGRUPADAS`` activo, las peticiones no hacen su propio
+commit: dejan la escritura ya validada (una función sin argumentos que usa
+``db.session`` sin hacer commit) en una cola acotada y esperan. Un hilo por
+worker las recoge y ejecuta hasta ``max_lote`` de una vez en una sola
+transacción, esperando como mucho ``espera_ms`` a que se llene el lote. Cada
+petición recibe su resultado solo después del commit de su lote, así que
+cuando responde sus datos ya son duraderos.
+
+Si una escritura del lote falla, el lote entero se deshace y se repite cada
+escritura en su propia transacción: solo falla la que tenía el error.
+Con la cola llena se rechaza la escritura (``ColaEscriturasLlena``) y si su
+lote no se confirma en ``timeout`` segundos la petición deja de esperar
+(``EscrituraSinConfirmar``): si la escritura aún no había empezado se
+descarta, y si no puede que acabe confirmándose.
+"""
+import logging
+import queue
+import time
+from concurrent.futures import Future
+
+from hilos import HiloPerezoso
+from metricas import ESCRITURAS_COMMIT, ESCRITURAS_ESPERA, ESCRITURAS_LOTE, ESCRITURAS_RECHAZADAS
+
+logger = logging.getLogger(__name__)
+
+
+class ColaEscriturasLlena(RuntimeError):
+    """La cola de escrituras agrupadas está llena"""
+
+
+class EscrituraSinConfirmar(RuntimeError):
+    """El lote de la escritura no se confirmó a tiempo
+
+    ``descartada`` es True si la escritura ya no se va a aplicar.
+    """
+
+    def __init__(self, descartada):
+        super().__init__('Escritura descartada' if descartada else 'Escritura sin confirmar')
+        self.descartada = descartada
+
+
+class ComprometedorAgrupado:
+    def __init__(self, app, db, max_lote=50, espera_ms=5, max_cola=1000, timeout=10):
+        self.app = app
+        self.db = db
+        self.max_lote = max_lote
+        self.espera = espera_ms / 1000
+        self.timeout = timeout
+        self._cola = queue.Queue(max_cola)
+        self._hilo = HiloPerezoso(self._bucle, 'comprometedor-escrituras')
+
+    def enviar(self, trabajo):
+        """Encolar ``trabajo`` y esperar a que su lote esté confirmado; devuelve su resultado"""
+        self._hilo.arrancar()
+        futuro = Future()
+        try:
+            self._cola.put_nowait((trabajo, futuro, time.perf_counter()))
+        except queue.Full:
+            ESCRITURAS_RECHAZADAS.inc()
+            raise ColaEscriturasLlena()
+        try:
+            return futuro.result(timeout=self.timeout)
+        except TimeoutError:
+            # Sin empezar se puede cancelar: el committer la salta al sacarla de la cola
+            if futuro.cancel():
+                logger.warning('Escritura descartada tras %s s en cola', self.timeout)
+                raise EscrituraSinConfirmar(descartada=True)
+            if futuro.done():
+                return futuro.result()
+            logger.warning('Escritura sin confirmar tras %s s', self.timeout)
+            raise EscrituraSinConfirmar(descartada=False)
+
+    def _siguiente_lote(self):
+        lote = [self._cola.get()]
+        limite = time.perf_counter() + self.espera
+        while len(lote) < self.max_lote:
+            restante = limite - time.perf_counter()
+            try:
+                lote.append(self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait())
+            except queue.Empty:
+                break
+        return lote
+
+    def _bucle(self):
+        while True:
+            lote = [elemento for elemento in self._siguiente_lote()
+                    if elemento[1].set_running_or_notify_cancel()]
+            if not lote:
+                continue
+            inicio = time.perf_counter()
+            for _, _, encolado in lote:
+                ESCRITURAS_ESPERA.observe(inicio - encolado)
+            try:
+                with self.app.app_context():
+                    self._confirmar(lote)
+            except Exception as e:  # No dejar ninguna petición esperando para siempre
+                logger.exception('Error en el committer de escrituras')
+                for _, futuro, _ in lote:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+            ESCRITURAS_LOTE.observe(len(lote))
+            ESCRITURAS_COMMIT.observe(time.perf_counter() - inicio)
+
+    def _confirmar(self, lote):
+        sesion = self.db.session
+        try:
+            resultados = [trabajo() for trabajo, _, _ in lote]
+            sesion.commit()
+        except Exception:
+            sesion.rollback()
+            if len(lote) == 1:
+                raise
+            # Repetir una a una para que solo falle la escritura con el error
+            for trabajo, futuro, _ in lote:
+                try:
+                    resultado = trabajo()
+                    sesion.commit()
+                except Exception as e:
+                    sesion.rollback()
+                    futuro.set_exception(e)
+                else:
+                    futuro.set_result(resultado)
+            return
+        for (_, futuro, _), resultado in zip(lote, resultados):
+            futuro.set_result(resultado)
@@ -0,0 +1,72 @@
+"""Ficheros estáticos con huella de contenido en el nombre.
+
+Al arrancar se leen los ficheros de ``static/`` y a cada uno se le asigna
+un nombre con un hash de su contenido (``js/dashboard.3f2a9c1b7e4d.js``).
+Las plantillas obtienen esa URL con ``url_estatico('js/dashboard.js')``: como
+cambia en cuanto cambia el fichero, se puede servir con
+``Cache-Control: immutable`` y un año de caducidad. Los ficheros se
+guardan en memoria ya comprimidos (gzip y, si está disponible, brotli).
+"""
+import hashlib
+import mimetypes
+import os
+from collections import namedtuple
+
+from flask import abort, make_response, request, url_for
+
+from compresion import TIPOS_COMPRIMIBLES, codificaciones_disponibles, comprimir, elegir_codificacion
+
+CACHE_INMUTABLE = 'public, max-age=31536000, immutable'
+
+Estatico = namedtuple('Estatico', ['mimetype', 'contenido', 'comprimidos'])
+
+
+def nombre_con_huella(nombre, contenido):
+    base, extension = os.path.splitext(nombre)
+    return f'{base}.{hashlib.sha256(contenido).hexdigest()[:12]}{extension}'
+
+
+def cargar_estaticos(directorio):
+    """``({nombre: nombre_con_huella}, {nombre_con_huella: Estatico})`` de todo el directorio"""
+    huellas = {}
+    ficheros = {}
+    for raiz, _, nombres in os.walk(directorio):
+        for nombre in nombres:
+            ruta = os.path.join(raiz, nombre)
+            relativo = os.path.relpath(ruta, directorio).replace(os.sep, '/')
+            with open(ruta, 'rb') as f:
+                contenido = f.read()
+            mimetype = mimetypes.guess_type(nombre)[0] or 'application/octet-stream'
+            comprimidos = {}
+            if mimetype in TIPOS_COMPRIMIBLES:
+                comprimidos = {codificacion: comprimir(contenido, codificacion, maximo=True)
+                               for codificacion in codificaciones_disponibles()}
+            huellas[relativo] = nombre_con_huella(relativo, contenido)
+            ficheros[huellas[relativo]] = Estatico(mimetype, contenido, comprimidos)
+    return huellas, ficheros
+
+
+def init_estaticos(app):
+    huellas, ficheros = cargar_estaticos(app.static_folder)
+
+    @app.route('/estaticos/<path:nombre>')
+    def estatico(nombre):
+        fichero = ficheros.get(nombre)
+        if fichero is None:
+            abort(404)
+        codificacion = elegir_codificacion(request.accept_encodings) if fichero.comprimidos else None
+        response = make_response(fichero.comprimidos[codificacion] if codificacion else fichero.contenido)
+        response.mimetype = fichero.mimetype
+        if codificacion:
+            response.headers['Content-Encoding'] = codificacion
+        if fichero.comprimidos:
+            response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = CACHE_INMUTABLE
+        return response
+
+    @app.template_global()
+    def url_estatico(nombre):
+        """URL con huella de un fichero de static/ (la ruta normal si no existe)"""
+        if nombre in huellas:
+            return url_for('estatico', nombre=huellas[nombre])
+        return url_for('static', filename=nombre)
@@ -0,0 +1,24 @@
+# Configuración de gunicorn (se carga automáticamente desde el directorio de trabajo)
+import os
+import shutil
+
+# Directorio compartido para las métricas de Prometheus de todos los workers.
+# Tiene que estar definido antes de que los workers importen la aplicación
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/gym_tracker_metricas')
+
+# Workers con hilos: mientras un hilo espera al pool de hash de contraseñas
+# (contrasenas.py) los demás siguen atendiendo el resto de endpoints
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+
+def on_starting(server):
+    # Empezar sin ficheros de una ejecución anterior
+    directorio = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directorio, ignore_errors=True)
+    os.makedirs(directorio, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
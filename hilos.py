@@ -0,0 +1,29 @@
+"""Hilos de fondo de cada worker.
+
+Gunicorn importa la aplicación antes de hacer fork de los workers y un hilo
+creado antes del fork no existe en el proceso hijo. Por eso los hilos de
+fondo (committer de escrituras, vigilante de la réplica) se crean al primer
+uso, ya dentro del worker, y se vuelven a crear si han muerto.
+"""
+import threading
+
+
+class HiloPerezoso:
+    """Hilo daemon que ejecuta ``objetivo`` y se arranca con ``arrancar()``"""
+
+    def __init__(self, objetivo, nombre):
+        self.objetivo = objetivo
+        self.nombre = nombre
+        self._hilo = None
+        self._lock = threading.Lock()
+
+    @property
+    def arrancado(self):
+        return self._hilo is not None
+
+    def arrancar(self):
+        """Crear el hilo si no existe o ha muerto"""
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self.objetivo, name=self.nombre, daemon=True)
+                self._hilo.start()
@@ -0,0 +1,92 @@
+"""Contador de sentencias SQL por petición.
+
+Cuenta las sentencias que se ejecutan durante cada petición y el tiempo que
+pasan en la base de datos. Los totales se exponen en las cabeceras
+``X-SQL-Queries`` / ``X-SQL-Time-ms`` (en modo debug o si se activa
+``SQL_CONTADOR_CABECERAS``) y cada vista puede declarar un presupuesto máximo
+de consultas con ``@presupuesto_sql(n)``.
+"""
+import time
+from functools import wraps
+
+from flask import g, has_request_context, request, current_app
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class PresupuestoSQLExcedido(RuntimeError):
+    """Una vista ejecutó más consultas de las que permite su presupuesto."""
+
+
+def _antes_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        conn.info.setdefault('sql_inicio', []).append(time.perf_counter())
+
+
+def _despues_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context():
+        return
+    inicios = conn.info.get('sql_inicio')
+    if not inicios:
+        return
+    duracion = time.perf_counter() - inicios.pop()
+    g.sql_consultas = g.get('sql_consultas', 0) + 1
+    g.sql_tiempo = g.get('sql_tiempo', 0.0) + duracion
+
+
+def consultas_peticion():
+    """Devuelve ``(numero_de_consultas, segundos_en_bd)`` de la petición actual."""
+    return g.get('sql_consultas', 0), g.get('sql_tiempo', 0.0)
+
+
+def presupuesto_sql(maximo):
+    """Limita el número de consultas SQL que puede ejecutar una vista.
+
+    Si se supera, en modo ``TESTING`` (o con ``SQL_PRESUPUESTO_ESTRICTO``) se
+    lanza ``PresupuestoSQLExcedido``; en producción solo se deja un aviso en
+    el log.
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(*args, **kwargs):
+            g.sql_presupuesto = maximo
+            return vista(*args, **kwargs)
+        envoltura.presupuesto_sql = maximo
+        return envoltura
+    return decorador
+
+
+def init_instrumentacion(app):
+    """Engancha los contadores SQL y las cabeceras de respuesta a la app."""
+    app.config.setdefault('SQL_CONTADOR_CABECERAS', False)
+    app.config.setdefault('SQL_PRESUPUESTO_ESTRICTO', False)
+
+    # Se escucha a nivel de clase para cubrir cualquier engine (incluidas réplicas)
+    if not event.contains(Engine, 'before_cursor_execute', _antes_de_ejecutar):
+        event.listen(Engine, 'before_cursor_execute', _antes_de_ejecutar)
+        event.listen(Engine, 'after_cursor_execute', _despues_de_ejecutar)
+
+    @app.before_request
+    def _reiniciar_contadores():
+        # g vive en el contexto de aplicación, que puede abarcar varias peticiones
+        g.sql_consultas = 0
+        g.sql_tiempo = 0.0
+        g.pop('sql_presupuesto', None)
+
+    @app.after_request
+    def _informar_consultas(response):
+        consultas, tiempo = consultas_peticion()
+
+        if app.debug or app.config['SQL_CONTADOR_CABECERAS']:
+            response.headers['X-SQL-Queries'] = str(consultas)
+            response.headers['X-SQL-Time-ms'] = f'{tiempo * 1000:.2f}'
+
+        maximo = g.get('sql_presupuesto')
+        if maximo is not None and consultas > maximo:
+            mensaje = (f'{request.endpoint} ejecutó {consultas} consultas SQL '
+                       f'(presupuesto: {maximo})')
+            if current_app.testing or app.config['SQL_PRESUPUESTO_ESTRICTO']:
+                raise PresupuestoSQLExcedido(mensaje)
+            current_app.logger.warning(mensaje)
+
+        return response
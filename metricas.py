@@ -0,0 +1,154 @@
+"""Métricas de la aplicación en formato Prometheus (endpoint /metrics).
+
+Recoge la latencia por endpoint, las sentencias SQL y el tiempo en base de
+datos por endpoint, el estado del pool de conexiones, los contadores de las
+cachés y los lotes del committer de escrituras agrupadas. Con varios
+workers de gunicorn se usa el modo multiproceso de ``prometheus_client``:
+cada worker escribe en ``PROMETHEUS_MULTIPROC_DIR`` (lo prepara
+``gunicorn.conf.py``) y /metrics agrega todos los ficheros.
+Si se define ``METRICAS_TOKEN``, /metrics y las vistas de diagnóstico marcadas
+con ``@requiere_token_metricas`` (/estado/...) exigen ese token como Bearer.
+"""
+import hmac
+import os
+import time
+from functools import wraps
+
+from flask import Response, current_app, g, request
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess, REGISTRY)
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+from instrumentacion import consultas_peticion
+
+LATENCIA = Histogram(
+    'gym_http_request_duration_seconds', 'Latencia de las peticiones por endpoint',
+    ['endpoint', 'method', 'status']
+)
+SQL_SENTENCIAS = Counter(
+    'gym_sql_statements_total', 'Sentencias SQL ejecutadas por endpoint', ['endpoint']
+)
+SQL_TIEMPO = Histogram(
+    'gym_sql_duration_seconds', 'Tiempo total en base de datos por petición', ['endpoint'],
+    buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, float('inf'))
+)
+POOL_OCUPADAS = Gauge(
+    'gym_db_pool_checked_out', 'Conexiones del pool en uso', ['bind'], multiprocess_mode='livesum'
+)
+POOL_DESBORDE = Gauge(
+    'gym_db_pool_overflow', 'Conexiones por encima del tamaño del pool', ['bind'], multiprocess_mode='livesum'
+)
+POOL_ESPERA = Histogram(
+    'gym_db_pool_wait_seconds', 'Espera hasta obtener una conexión del pool',
+    buckets=(.0005, .001, .005, .01, .05, .1, .5, 1, 5, float('inf'))
+)
+CACHE_EVENTOS = Gauge(
+    'gym_cache_events', 'Contadores de las cachés (aciertos, fallos, evicciones...) por worker vivo',
+    ['cache', 'event'], multiprocess_mode='livesum'
+)
+ESCRITURAS_LOTE = Histogram(
+    'gym_write_batch_size', 'Escrituras confirmadas en cada transacción del committer agrupado',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, float('inf'))
+)
+ESCRITURAS_ESPERA = Histogram(
+    'gym_write_queue_wait_seconds', 'Espera de cada escritura en la cola hasta entrar en un lote',
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .5, 1, float('inf'))
+)
+ESCRITURAS_COMMIT = Histogram(
+    'gym_write_batch_duration_seconds', 'Duración de cada lote del committer (ejecución y commit)',
+    buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, float('inf'))
+)
+ESCRITURAS_RECHAZADAS = Counter(
+    'gym_write_rejected_total', 'Escrituras rechazadas por tener la cola del committer llena'
+)
+
+# Cada cuánto se copian los contadores de las cachés a las métricas (segundos)
+INTERVALO_CACHES = 5
+
+
+class QueuePoolMedido(QueuePool):
+    """QueuePool que mide cuánto se espera por cada conexión"""
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_ESPERA.observe(time.perf_counter() - inicio)
+
+
+def vigilar_pool(engine, bind='principal'):
+    """Actualizar los gauges del pool en cada checkout/checkin del engine"""
+    pool = engine.pool
+    tamano = pool.size() if hasattr(pool, 'size') else 0
+    # El evento checkin llega antes de que el pool descuente la conexión, así
+    # que se lleva la cuenta aquí en lugar de leer pool.checkedout()
+    ocupadas = [0]
+
+    def actualizar(cambio):
+        ocupadas[0] += cambio
+        POOL_OCUPADAS.labels(bind).set(ocupadas[0])
+        POOL_DESBORDE.labels(bind).set(max(ocupadas[0] - tamano, 0))
+
+    event.listen(pool, 'checkout', lambda *args: actualizar(1))
+    event.listen(pool, 'checkin', lambda *args: actualizar(-1))
+
+
+def _registro():
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+        return registro
+    return REGISTRY
+
+
+def requiere_token_metricas(vista):
+    """Con METRICAS_TOKEN definido, exigir "Authorization: Bearer <token>" para la vista"""
+    @wraps(vista)
+    def envoltura(*args, **kwargs):
+        token = current_app.config.get('METRICAS_TOKEN')
+        recibida = request.headers.get('Authorization', '')
+        if token and not hmac.compare_digest(recibida.encode(), f'Bearer {token}'.encode()):
+            return Response('No autorizado\n', status=401, mimetype='text/plain')
+        return vista(*args, **kwargs)
+    return envoltura
+
+
+def init_metricas(app, caches):
+    """Registrar la toma de métricas por petición y la ruta /metrics
+
+    ``caches`` es un dict nombre -> caché con ``estadisticas()``.
+    """
+    ultima_copia = [0.0]
+
+    @app.before_request
+    def _inicio_peticion():
+        g.metricas_inicio = time.perf_counter()
+
+    @app.after_request
+    def _registrar_peticion(response):
+        inicio = g.get('metricas_inicio')
+        if inicio is None:
+            return response
+        endpoint = request.endpoint or 'sin_ruta'
+        LATENCIA.labels(endpoint, request.method, response.status_code).observe(time.perf_counter() - inicio)
+
+        consultas, tiempo = consultas_peticion()
+        if consultas:
+            SQL_SENTENCIAS.labels(endpoint).inc(consultas)
+            SQL_TIEMPO.labels(endpoint).observe(tiempo)
+
+        ahora = time.monotonic()
+        if ahora - ultima_copia[0] > INTERVALO_CACHES:
+            ultima_copia[0] = ahora
+            for nombre, cache in caches.items():
+                for evento, valor in cache.estadisticas().items():
+                    if isinstance(valor, (int, float)):
+                        CACHE_EVENTOS.labels(nombre, evento).set(valor)
+        return response
+
+    @app.route('/metrics')
+    @requiere_token_metricas
+    def metrics():
+        return Response(generate_latest(_registro()), mimetype=CONTENT_TYPE_LATEST)
@@ -0,0 +1,116 @@
+"""Migraciones versionadas del esquema.
+
+Cada migración es una función registrada con ``@migraciones.migracion(n,
+'descripción')``. La tabla ``version_esquema`` guarda las versiones ya
+aplicadas y ``migrar()`` aplica las pendientes en orden. La fila que marca
+una migración como aplicada se confirma con lo último que escribe, pero una
+migración puede confirmar por el camino (DDL, recálculos con su propio
+commit): si falla a medias se vuelve a aplicar entera en el siguiente
+``migrar()``, así que cada migración tiene que poder repetirse sin
+duplicar nada. Se lanza con ``flask migrar`` antes de arrancar los
+workers, nunca al importar la aplicación.
+
+- En una base de datos sin ninguna tabla se crean las de los modelos
+  actuales y se marcan todas las migraciones como aplicadas, así que cada
+  migración solo tiene que saber pasar de la versión anterior a la suya.
+  Las registradas con ``en_base_nueva=True`` (datos iniciales, no esquema)
+  se ejecutan también en ese caso.
+- En PostgreSQL un cerrojo consultivo serializa los ``migrar()``
+  simultáneos (varios contenedores arrancando a la vez): el primero migra y
+  los demás esperan y ya no encuentran nada pendiente.
+"""
+import logging
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+
+logger = logging.getLogger(__name__)
+
+Migracion = namedtuple('Migracion', ['version', 'descripcion', 'funcion', 'en_base_nueva'])
+
+# Clave del pg_advisory_lock, la misma en todos los procesos
+CERROJO = 7415001
+
+version_esquema = Table(
+    'version_esquema', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('descripcion', String(200), nullable=False),
+    Column('aplicada', DateTime, nullable=False),
+)
+
+
+class Migraciones:
+    def __init__(self, db):
+        self.db = db
+        self.lista = []
+
+    def migracion(self, version, descripcion, en_base_nueva=False):
+        """Registrar una migración; las versiones tienen que ir en orden creciente"""
+        def decorador(funcion):
+            if self.lista and version <= self.lista[-1].version:
+                raise ValueError(f'Migración {version} fuera de orden')
+            self.lista.append(Migracion(version, descripcion, funcion, en_base_nueva))
+            return funcion
+        return decorador
+
+    def aplicadas(self):
+        """Versiones ya aplicadas (vacío si la tabla de versiones aún no existe)"""
+        if not inspect(self.db.engine).has_table(version_esquema.name):
+            return set()
+        with self.db.engine.connect() as conexion:
+            return set(conexion.execute(select(version_esquema.c.version)).scalars())
+
+    def pendientes(self):
+        aplicadas = self.aplicadas()
+        return [m for m in self.lista if m.version not in aplicadas]
+
+    def migrar(self):
+        """Aplicar las migraciones pendientes. Devuelve las que se han aplicado (o marcado)"""
+        engine = self.db.engine
+        if engine.dialect.name != 'postgresql':
+            return self._migrar()
+        with engine.connect() as conexion:
+            conexion.execute(text('SELECT pg_advisory_lock(:clave)'), {'clave': CERROJO})
+            conexion.commit()
+            try:
+                return self._migrar()
+            finally:
+                # El cerrojo es de la conexión y esta vuelve al pool: soltarlo a mano
+                conexion.execute(text('SELECT pg_advisory_unlock(:clave)'), {'clave': CERROJO})
+                conexion.commit()
+
+    def _migrar(self):
+        base_vacia = not set(inspect(self.db.engine).get_table_names()) & set(self.db.metadata.tables)
+        version_esquema.create(self.db.engine, checkfirst=True)
+        aplicadas = self.aplicadas()
+
+        if base_vacia and not aplicadas:
+            self.db.create_all(bind_key=None)
+            for migracion in self.lista:
+                if migracion.en_base_nueva:
+                    migracion.funcion()
+                self._marcar(migracion)
+            self.db.session.commit()
+            logger.info('Esquema creado en la versión %s', self.lista[-1].version if self.lista else 0)
+            return self.lista
+
+        hechas = []
+        for migracion in self.lista:
+            if migracion.version in aplicadas:
+                continue
+            logger.info('Aplicando migración %s: %s', migracion.version, migracion.descripcion)
+            try:
+                migracion.funcion()
+                self._marcar(migracion)
+                self.db.session.commit()
+            except Exception:
+                self.db.session.rollback()
+                raise
+            hechas.append(migracion)
+        return hechas
+
+    def _marcar(self, migracion):
+        self.db.session.execute(version_esquema.insert().values(
+            version=migracion.version, descripcion=migracion.descripcion, aplicada=datetime.utcnow()
+        ))
@@ -0,0 +1,44 @@
+"""Reducción de puntos para las gráficas de periodos largos."""
+
+
+def lttb(puntos, max_puntos, valor):
+    """Largest-Triangle-Three-Buckets: reduce ``puntos`` a ``max_puntos`` conservando la forma.
+
+    ``puntos`` es una lista ordenada en el tiempo y ``valor(punto)`` devuelve la
+    magnitud que se dibuja. El eje x es la posición en la lista (las fechas ya
+    vienen ordenadas). Se conservan siempre el primer y el último punto.
+    """
+    total = len(puntos)
+    if max_puntos >= total or max_puntos < 3:
+        return list(puntos)
+
+    muestreados = [puntos[0]]
+    # Tamaño de cada cubo, sin contar los extremos
+    tamano = (total - 2) / (max_puntos - 2)
+    anterior = 0
+
+    for i in range(max_puntos - 2):
+        inicio = int(i * tamano) + 1
+        fin = int((i + 1) * tamano) + 1
+
+        # Media del cubo siguiente (o el último punto)
+        siguiente_inicio = fin
+        siguiente_fin = min(int((i + 2) * tamano) + 1, total)
+        if siguiente_inicio >= siguiente_fin:
+            siguiente_inicio, siguiente_fin = total - 1, total
+        media_x = (siguiente_inicio + siguiente_fin - 1) / 2
+        media_y = sum(valor(p) for p in puntos[siguiente_inicio:siguiente_fin]) / (siguiente_fin - siguiente_inicio)
+
+        # Punto del cubo actual que forma el triángulo más grande
+        ax, ay = anterior, valor(puntos[anterior])
+        mejor, mejor_area = inicio, -1.0
+        for j in range(inicio, fin):
+            area = abs((ax - media_x) * (valor(puntos[j]) - ay) - (ax - j) * (media_y - ay))
+            if area > mejor_area:
+                mejor, mejor_area = j, area
+
+        muestreados.append(puntos[mejor])
+        anterior = mejor
+
+    muestreados.append(puntos[-1])
+    return muestreados
@@ -0,0 +1,77 @@
+"""Récords personales por ejercicio.
+
+Solo cuentan las series completadas con alguna repetición:
+
+- ``peso``: mayor peso de una serie
+- ``1rm``: mayor 1RM estimado de una serie (fórmula de Epley)
+- ``volumen``: mayor volumen (peso × repeticiones) de una sesión
+- ``repeticiones``: más repeticiones en una serie con cada peso. Hay uno por
+  peso, así que se guarda aparte de los demás (``mejores_repeticiones``)
+"""
+from collections import namedtuple
+
+# Tipos con un único récord por ejercicio
+TIPOS = ('peso', '1rm', 'volumen')
+
+NOMBRES = {
+    'peso': 'peso máximo',
+    'repeticiones': 'repeticiones',
+    '1rm': '1RM estimado',
+    'volumen': 'volumen de sesión',
+}
+
+# ``sesion`` es la posición de la sesión en la lista recibida
+Marca = namedtuple('Marca', ['valor', 'peso', 'repeticiones', 'sesion'])
+
+
+def uno_rm_estimado(peso, repeticiones):
+    """1RM estimado con la fórmula de Epley (una repetición es el propio peso)"""
+    return peso if repeticiones == 1 else peso * (1 + repeticiones / 30)
+
+
+def series_validas(series):
+    return [serie for serie in series if serie.completada and serie.repeticiones > 0]
+
+
+def mejores_marcas(sesiones):
+    """``{(ejercicio_id, tipo): Marca}`` con la mejor marca de cada ejercicio en ``sesiones``
+
+    Las sesiones son dicts con ejercicio_id, fecha y series. En caso de
+    empate se queda la marca más antigua.
+    """
+    mejores = {}
+    proponer = _proponedor(mejores)
+    for indice, ejercicio_id, series in _por_fecha(sesiones):
+        for serie in series:
+            proponer((ejercicio_id, 'peso'), Marca(serie.peso, serie.peso, serie.repeticiones, indice))
+            proponer((ejercicio_id, '1rm'),
+                     Marca(uno_rm_estimado(serie.peso, serie.repeticiones), serie.peso, serie.repeticiones, indice))
+        volumen = sum(serie.peso * serie.repeticiones for serie in series)
+        if volumen > 0:
+            proponer((ejercicio_id, 'volumen'), Marca(volumen, None, None, indice))
+    return mejores
+
+
+def mejores_repeticiones(sesiones):
+    """``{(ejercicio_id, peso): Marca}`` con más repeticiones en una serie con cada peso"""
+    mejores = {}
+    proponer = _proponedor(mejores)
+    for indice, ejercicio_id, series in _por_fecha(sesiones):
+        for serie in series:
+            proponer((ejercicio_id, serie.peso), Marca(serie.repeticiones, serie.peso, serie.repeticiones, indice))
+    return mejores
+
+
+def _proponedor(mejores):
+    # Solo se sustituye una marca por otra mejor: en empate se queda la primera
+    def proponer(clave, marca):
+        if clave not in mejores or marca.valor > mejores[clave].valor:
+            mejores[clave] = marca
+    return proponer
+
+
+def _por_fecha(sesiones):
+    """``(indice, ejercicio_id, series válidas)`` de cada sesión, de la más antigua a la más reciente"""
+    for indice in sorted(range(len(sesiones)), key=lambda i: sesiones[i]['fecha']):
+        sesion = sesiones[indice]
+        yield indice, int(sesion['ejercicio_id']), series_validas(sesion['series'])
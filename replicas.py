@@ -0,0 +1,142 @@
+"""Lecturas en una réplica de la base de datos (opcional).
+
+Si se define el bind ``replica`` (``DATABASE_REPLICA_URL``), las consultas
+SELECT de las peticiones GET/HEAD van a la réplica y todo lo demás sigue en
+la base de datos principal:
+
+- Tras cualquier escritura (petición POST/PUT/PATCH/DELETE) el usuario lee de
+  la principal durante ``REPLICA_VENTANA_ESCRITURA`` segundos, para que vea
+  siempre sus propios cambios aunque la réplica vaya con retraso.
+- Cada ``REPLICA_INTERVALO`` segundos un hilo en segundo plano comprueba
+  que la réplica responde y, en PostgreSQL, que su retraso no pasa de
+  ``REPLICA_MAX_RETRASO`` segundos. Si no, y también si falla una conexión
+  con ella, las lecturas vuelven a la principal hasta la siguiente
+  comprobación. Las peticiones solo leen el último resultado: la
+  comprobación no cuenta en sus consultas ni las hace esperar.
+"""
+import logging
+import time
+
+from flask import g, has_app_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.sql import Select
+
+from hilos import HiloPerezoso
+
+logger = logging.getLogger(__name__)
+
+BIND = 'replica'
+
+# Métodos que no escriben: los únicos que pueden leer de la réplica
+METODOS_LECTURA = ('GET', 'HEAD', 'OPTIONS')
+
+
+class SesionEnrutada(Session):
+    """Sesión que manda los SELECT a la réplica cuando la petición lo permite"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and isinstance(clause, Select)
+                and clause._for_update_arg is None
+                and has_app_context() and g.get('leer_de_replica')):
+            return self._db.engines[BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+# Segundos desde la última transacción aplicada: 0 si no es una réplica o si ya
+# ha aplicado todo lo recibido (con la principal sin escrituras el tiempo crece solo)
+RETRASO_POSTGRESQL = text(
+    'SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 '
+    'WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+    'ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+)
+
+
+class EstadoReplica:
+    """Si la réplica está disponible, comprobado cada ``intervalo`` segundos en segundo plano"""
+
+    def __init__(self, engine, max_retraso, intervalo):
+        self.engine = engine
+        self.max_retraso = max_retraso
+        self.intervalo = intervalo
+        self.disponible = False
+        self.retraso = None
+        self.motivo = 'sin comprobar'
+        self._hilo = HiloPerezoso(self._vigilar, 'vigilante-replica')
+        event.listen(engine, 'handle_error', self._error)
+
+    def _error(self, contexto):
+        if contexto.is_disconnect or contexto.connection is None:
+            self.marcar_caida(contexto.original_exception)
+
+    def marcar_caida(self, motivo):
+        """``motivo`` es un texto o la excepción; de esta solo se publica el tipo"""
+        if self.disponible:
+            logger.warning('Réplica no disponible, se lee de la principal: %s', motivo)
+        self.disponible = False
+        self.motivo = type(motivo).__name__ if isinstance(motivo, BaseException) else motivo
+
+    def comprobar(self):
+        try:
+            with self.engine.connect() as conexion:
+                if self.engine.dialect.name == 'postgresql':
+                    self.retraso = float(conexion.execute(RETRASO_POSTGRESQL).scalar())
+                else:
+                    conexion.execute(text('SELECT 1'))
+                    self.retraso = 0.0
+        except Exception as e:
+            self.marcar_caida(e)
+            return
+        if self.retraso > self.max_retraso:
+            self.marcar_caida(f'retraso de {self.retraso:.1f} s')
+            return
+        if not self.disponible:
+            logger.info('Réplica disponible (retraso %.1f s)', self.retraso)
+        self.disponible = True
+        self.motivo = None
+
+    def _vigilar(self):
+        while True:
+            self.comprobar()
+            time.sleep(self.intervalo)
+
+    def arrancar(self):
+        self._hilo.arrancar()
+
+    def usable(self):
+        if not self._hilo.arrancado:
+            self.arrancar()
+        return self.disponible
+
+    def estadisticas(self):
+        return {'disponible': self.disponible, 'retraso': self.retraso, 'motivo': self.motivo}
+
+
+def init_replica(app, db):
+    """Enrutar las lecturas a la réplica si está configurada. Devuelve su EstadoReplica o None"""
+    app.config.setdefault('REPLICA_VENTANA_ESCRITURA', 10)
+    app.config.setdefault('REPLICA_MAX_RETRASO', 5)
+    app.config.setdefault('REPLICA_INTERVALO', 5)
+    if BIND not in app.config.get('SQLALCHEMY_BINDS', {}):
+        return None
+
+    with app.app_context():
+        estado = EstadoReplica(db.engines[BIND], app.config['REPLICA_MAX_RETRASO'],
+                               app.config['REPLICA_INTERVALO'])
+
+    @app.before_request
+    def _elegir_base_de_datos():
+        g.leer_de_replica = (
+            request.method in METODOS_LECTURA
+            and session.get('escritura_hasta', 0) < time.time()
+            and estado.usable()
+        )
+
+    @app.after_request
+    def _recordar_escritura(response):
+        # Leer tus propias escrituras: durante un rato, todo a la principal
+        if request.method not in METODOS_LECTURA and 'user_id' in session:
+            session['escritura_hasta'] = time.time() + app.config['REPLICA_VENTANA_ESCRITURA']
+        return response
+
+    return estado
@@ -0,0 +1,544 @@
+let numeroSeries = 3;
+let graficaPeso = null;
+let graficaProgresoEjercicio = null;
+let graficaVolumenEjercicio = null;
+let ejercicioActualId = null;
+const MAX_PUNTOS_GRAFICA = 150; // El servidor reduce los periodos largos a este número de puntos
+const EJERCICIOS_RECIENTES = CONFIG_DASHBOARD.ejerciciosRecientes;
+// Gráficas ya descargadas en esta página, por periodo: {dias: {peso, ejercicios: {id: datos}}}
+const graficasCargadas = {};
+
+// Pedir en una sola petición todo lo que falte para ese periodo: la gráfica
+// solicitada, el peso corporal y los ejercicios entrenados últimamente
+function obtenerGraficas(dias, ejercicioId) {
+    const cargadas = graficasCargadas[dias] = graficasCargadas[dias] || {peso: null, ejercicios: {}};
+    const ids = [...new Set([ejercicioId, ...EJERCICIOS_RECIENTES])]
+        .filter(id => id !== undefined && !(id in cargadas.ejercicios));
+    const faltaPeso = cargadas.peso === null;
+    if (!faltaPeso && (ejercicioId === undefined || ejercicioId in cargadas.ejercicios)) {
+        return Promise.resolve(cargadas);
+    }
+    
+    const parametros = new URLSearchParams({dias: dias, detalle: 0, max_puntos: MAX_PUNTOS_GRAFICA});
+    if (faltaPeso) parametros.set('peso', 1);
+    if (ids.length) parametros.set('ejercicios', ids.join(','));
+    return fetch(`${CONFIG_DASHBOARD.urlGraficas}?${parametros}`)
+        .then(response => response.json())
+        .then(data => {
+            if (data.peso) cargadas.peso = data.peso;
+            Object.assign(cargadas.ejercicios, data.ejercicios || {});
+            return cargadas;
+        });
+}
+
+// Inicializar las series al cargar la página
+document.addEventListener('DOMContentLoaded', function() {
+    generarSeries();
+});
+
+function cambiarNumeroSeries(cambio) {
+    numeroSeries = Math.max(1, Math.min(10, numeroSeries + cambio)); // Límite entre 1 y 10 series
+    document.getElementById('numero-series-display').textContent = numeroSeries;
+    generarSeries();
+}
+
+function generarSeries() {
+    const container = document.getElementById('series-container');
+    const titulo = container.querySelector('h6');
+    
+    // Limpiar contenido anterior (excepto el título)
+    container.innerHTML = '';
+    container.appendChild(titulo);
+    
+    // Crear el contenedor de series
+    const seriesDiv = document.createElement('div');
+    seriesDiv.className = 'row';
+    
+    for (let i = 1; i <= numeroSeries; i++) {
+        seriesDiv.innerHTML += `
+            <div class="col-md-6 col-lg-4 mb-3">
+                <div class="card border-primary">
+                    <div class="card-header bg-primary text-white py-2">
+                        <h6 class="mb-0">
+                            <i class="fas fa-play me-1"></i>Serie ${i}
+                        </h6>
+                    </div>
+                    <div class="card-body p-3">
+                        <div class="row">
+                            <div class="col-6 mb-2">
+                                <label class="form-label small">Peso (kg)</label>
+                                <input type="number" class="form-control form-control-sm" 
+                                       id="peso_${i}" step="0.5" min="0" required>
+                            </div>
+                            <div class="col-6 mb-2">
+                                <label class="form-label small">Reps</label>
+                                <input type="number" class="form-control form-control-sm" 
+                                       id="reps_${i}" min="1" required>
+                            </div>
+                        </div>
+                        <div class="form-check">
+                            <input class="form-check-input" type="checkbox" 
+                                   id="completada_${i}" checked>
+                            <label class="form-check-label small" for="completada_${i}">
+                                Completada
+                            </label>
+                        </div>
+                    </div>
+                </div>
+            </div>
+        `;
+    }
+    
+    container.appendChild(seriesDiv);
+}
+
+function seleccionarEjercicio(ejercicioId, nombreEjercicio) {
+    // Seleccionar el ejercicio en el formulario
+    document.getElementById('ejercicio_id').value = ejercicioId;
+    
+    // Scroll suave hacia el formulario
+    document.querySelector('.card').scrollIntoView({ 
+        behavior: 'smooth',
+        block: 'start'
+    });
+    
+    // Destacar temporalmente la selección
+    const select = document.getElementById('ejercicio_id');
+    select.style.borderColor = '#667eea';
+    select.style.boxShadow = '0 0 0 0.2rem rgba(102, 126, 234, 0.25)';
+    
+    // Remover el destacado después de 2 segundos
+    setTimeout(() => {
+        select.style.borderColor = '';
+        select.style.boxShadow = '';
+    }, 2000);
+    
+    // Mostrar notificación
+    const toast = document.createElement('div');
+    toast.className = 'alert alert-info alert-dismissible fade show position-fixed';
+    toast.style.top = '20px';
+    toast.style.right = '20px';
+    toast.style.zIndex = '9999';
+    toast.style.maxWidth = '300px';
+    toast.innerHTML = `
+        <i class="fas fa-check-circle me-2"></i>
+        <strong>${nombreEjercicio}</strong> seleccionado
+        <button type="button" class="btn-close" data-bs-dismiss="alert"></button>
+    `;
+    
+    document.body.appendChild(toast);
+    
+    // Auto-remover la notificación después de 3 segundos
+    setTimeout(() => {
+        if (toast.parentNode) {
+            toast.remove();
+        }
+    }, 3000);
+}
+
+// Interceptar el envío del formulario para recopilar datos de series
+document.querySelector('form').addEventListener('submit', function(e) {
+    e.preventDefault();
+    
+    // Recopilar datos de todas las series
+    const seriesData = [];
+    for (let i = 1; i <= numeroSeries; i++) {
+        const peso = document.getElementById(`peso_${i}`).value;
+        const reps = document.getElementById(`reps_${i}`).value;
+        const completada = document.getElementById(`completada_${i}`).checked;
+        
+        if (peso && reps) {
+            seriesData.push(JSON.stringify({
+                peso: peso,
+                repeticiones: reps,
+                completada: completada
+            }));
+        }
+    }
+    
+    // Agregar los datos de series como campos ocultos
+    seriesData.forEach((data, index) => {
+        const input = document.createElement('input');
+        input.type = 'hidden';
+        input.name = 'series_data';
+        input.value = data;
+        this.appendChild(input);
+    });
+    
+    // Enviar el formulario
+    this.submit();
+});
+
+// Funciones para gráfica de peso
+function abrirGraficaPeso() {
+    const modal = new bootstrap.Modal(document.getElementById('modalGraficaPeso'));
+    modal.show();
+    
+    // Cargar datos cuando se abra el modal
+    cargarDatosPeso(30); // Por defecto 30 días
+}
+
+function cargarDatosPeso(dias) {
+    // Mostrar loading
+    document.getElementById('loading-peso').style.display = 'block';
+    document.querySelector('.chart-container').style.display = 'none';
+    document.getElementById('estadisticas-peso').style.display = 'none';
+    
+    obtenerGraficas(dias)
+        .then(graficas => {
+            const data = graficas.peso;
+            // Ocultar loading
+            document.getElementById('loading-peso').style.display = 'none';
+            document.querySelector('.chart-container').style.display = 'block';
+            document.getElementById('estadisticas-peso').style.display = 'flex';
+            
+            // Actualizar estadísticas
+            document.getElementById('peso-actual').textContent = 
+                data.peso_actual ? `${data.peso_actual} kg` : '--';
+            document.getElementById('peso-inicial').textContent = 
+                data.peso_inicial ? `${data.peso_inicial} kg` : '--';
+            
+            const diferencia = data.diferencia;
+            const diferenciaElement = document.getElementById('diferencia-peso');
+            if (diferencia !== 0) {
+                const signo = diferencia > 0 ? '+' : '';
+                diferenciaElement.textContent = `${signo}${diferencia.toFixed(1)} kg`;
+                diferenciaElement.className = `fw-bold ${diferencia > 0 ? 'text-success' : 'text-danger'}`;
+            } else {
+                diferenciaElement.textContent = '--';
+                diferenciaElement.className = 'fw-bold';
+            }
+            
+            // Crear o actualizar la gráfica
+            crearGraficaPeso(data.datos);
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            document.getElementById('loading-peso').innerHTML = 
+                '<p class="text-danger">Error al cargar los datos</p>';
+        });
+}
+
+function crearGraficaPeso(datos) {
+    const ctx = document.getElementById('graficaPeso').getContext('2d');
+    
+    // Destruir gráfica anterior si existe
+    if (graficaPeso) {
+        graficaPeso.destroy();
+    }
+    
+    const labels = datos.map(d => {
+        const fecha = new Date(d.fecha);
+        return fecha.toLocaleDateString('es-ES', { day: '2-digit', month: '2-digit' });
+    });
+    
+    const pesos = datos.map(d => d.peso);
+    
+    graficaPeso = new Chart(ctx, {
+        type: 'line',
+        data: {
+            labels: labels,
+            datasets: [{
+                label: 'Peso (kg)',
+                data: pesos,
+                borderColor: '#667eea',
+                backgroundColor: 'rgba(102, 126, 234, 0.1)',
+                borderWidth: 3,
+                fill: true,
+                tension: 0.4,
+                pointBackgroundColor: '#667eea',
+                pointBorderColor: '#ffffff',
+                pointBorderWidth: 2,
+                pointRadius: 6,
+                pointHoverRadius: 8
+            }]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            plugins: {
+                legend: {
+                    display: false
+                },
+                tooltip: {
+                    callbacks: {
+                        label: function(context) {
+                            const dataIndex = context.dataIndex;
+                            const registro = datos[dataIndex];
+                            let tooltip = `Peso: ${context.parsed.y} kg`;
+                            if (registro.notas) {
+                                tooltip += `\nNotas: ${registro.notas}`;
+                            }
+                            return tooltip;
+                        }
+                    }
+                }
+            },
+            scales: {
+                y: {
+                    beginAtZero: false,
+                    grid: {
+                        color: 'rgba(0,0,0,0.1)'
+                    },
+                    ticks: {
+                        callback: function(value) {
+                            return value + ' kg';
+                        }
+                    }
+                },
+                x: {
+                    grid: {
+                        color: 'rgba(0,0,0,0.1)'
+                    }
+                }
+            },
+            interaction: {
+                intersect: false,
+                mode: 'index'
+            }
+        }
+    });
+}
+
+// Funciones para gráficas de ejercicios
+function verProgresoEjercicio(ejercicioId, nombreEjercicio) {
+    ejercicioActualId = ejercicioId;
+    document.getElementById('nombre-ejercicio-modal').textContent = nombreEjercicio;
+    
+    const modal = new bootstrap.Modal(document.getElementById('modalProgresoEjercicio'));
+    modal.show();
+    
+    // Cargar datos cuando se abra el modal (por defecto 3 meses)
+    cargarDatosEjercicio(ejercicioId, 90);
+}
+
+function cargarDatosEjercicio(ejercicioId, dias) {
+    // Mostrar loading
+    document.getElementById('loading-ejercicio').style.display = 'block';
+    document.querySelector('#modalProgresoEjercicio .row:has(.card)').style.display = 'none';
+    document.getElementById('estadisticas-ejercicio').style.display = 'none';
+    
+    obtenerGraficas(dias, ejercicioId)
+        .then(graficas => {
+            const data = graficas.ejercicios[ejercicioId];
+            // Ocultar loading
+            document.getElementById('loading-ejercicio').style.display = 'none';
+            document.querySelector('#modalProgresoEjercicio .row:has(.card)').style.display = 'flex';
+            document.getElementById('estadisticas-ejercicio').style.display = 'flex';
+            
+            // Actualizar estadísticas
+            const stats = data.estadisticas;
+            document.getElementById('ejercicio-peso-actual').textContent = 
+                stats.peso_actual ? `${stats.peso_actual} kg` : '--';
+            document.getElementById('ejercicio-peso-inicial').textContent = 
+                stats.peso_inicial ? `${stats.peso_inicial} kg` : '--';
+            document.getElementById('ejercicio-peso-maximo').textContent = 
+                stats.peso_maximo ? `${stats.peso_maximo} kg` : '--';
+            document.getElementById('ejercicio-sesiones').textContent = 
+                stats.total_sesiones || '--';
+            document.getElementById('ejercicio-volumen').textContent = 
+                stats.volumen_promedio ? `${Math.round(stats.volumen_promedio)} kg` : '--';
+            
+            // Actualizar diferencia con color
+            const diferencia = stats.diferencia;
+            const diferenciaElement = document.getElementById('ejercicio-diferencia');
+            if (diferencia !== undefined && diferencia !== 0) {
+                const signo = diferencia > 0 ? '+' : '';
+                diferenciaElement.textContent = `${signo}${diferencia.toFixed(1)} kg`;
+                diferenciaElement.className = `fw-bold ${diferencia > 0 ? 'text-success' : 'text-danger'}`;
+            } else {
+                diferenciaElement.textContent = '--';
+                diferenciaElement.className = 'fw-bold';
+            }
+            
+            // Crear gráficas
+            crearGraficasEjercicio(data.datos);
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            document.getElementById('loading-ejercicio').innerHTML = 
+                '<p class="text-danger">Error al cargar los datos del ejercicio</p>';
+        });
+}
+
+function crearGraficasEjercicio(datos) {
+    // Preparar datos para las gráficas
+    const labels = datos.map(d => {
+        const fecha = new Date(d.fecha);
+        return fecha.toLocaleDateString('es-ES', { day: '2-digit', month: '2-digit' });
+    });
+    
+    const pesosPrimera = datos.map(d => d.peso_primera_serie);
+    const volumenTotal = datos.map(d => d.volumen_total);
+    
+    // Gráfica de evolución de peso (primera serie)
+    const ctxPeso = document.getElementById('graficaProgresoEjercicio').getContext('2d');
+    
+    if (graficaProgresoEjercicio) {
+        graficaProgresoEjercicio.destroy();
+    }
+    
+    graficaProgresoEjercicio = new Chart(ctxPeso, {
+        type: 'line',
+        data: {
+            labels: labels,
+            datasets: [{
+                label: 'Peso Primera Serie (kg)',
+                data: pesosPrimera,
+                borderColor: '#28a745',
+                backgroundColor: 'rgba(40, 167, 69, 0.1)',
+                borderWidth: 3,
+                fill: true,
+                tension: 0.4,
+                pointBackgroundColor: '#28a745',
+                pointBorderColor: '#ffffff',
+                pointBorderWidth: 2,
+                pointRadius: 6,
+                pointHoverRadius: 8
+            }]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            plugins: {
+                legend: {
+                    display: false
+                },
+                tooltip: {
+                    callbacks: {
+                        label: function(context) {
+                            const dataIndex = context.dataIndex;
+                            const registro = datos[dataIndex];
+                            let tooltip = `Peso: ${context.parsed.y} kg`;
+                            tooltip += `\nReps: ${registro.reps_primera_serie}`;
+                            tooltip += `\nSeries: ${registro.series_total}`;
+                            tooltip += `\nVolumen: ${Math.round(registro.volumen_total)} kg`;
+                            if (registro.notas) {
+                                tooltip += `\nNotas: ${registro.notas}`;
+                            }
+                            return tooltip;
+                        }
+                    }
+                }
+            },
+            scales: {
+                y: {
+                    beginAtZero: false,
+                    grid: {
+                        color: 'rgba(0,0,0,0.1)'
+                    },
+                    ticks: {
+                        callback: function(value) {
+                            return value + ' kg';
+                        }
+                    }
+                },
+                x: {
+                    grid: {
+                        color: 'rgba(0,0,0,0.1)'
+                    }
+                }
+            }
+        }
+    });
+    
+    // Gráfica de volumen total
+    const ctxVolumen = document.getElementById('graficaVolumenEjercicio').getContext('2d');
+    
+    if (graficaVolumenEjercicio) {
+        graficaVolumenEjercicio.destroy();
+    }
+    
+    graficaVolumenEjercicio = new Chart(ctxVolumen, {
+        type: 'bar',
+        data: {
+            labels: labels,
+            datasets: [{
+                label: 'Volumen Total (kg)',
+                data: volumenTotal,
+                backgroundColor: 'rgba(255, 193, 7, 0.7)',
+                borderColor: '#ffc107',
+                borderWidth: 1
+            }]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            plugins: {
+                legend: {
+                    display: false
+                },
+                tooltip: {
+                    callbacks: {
+                        label: function(context) {
+                            return `Volumen: ${Math.round(context.parsed.y)} kg`;
+                        }
+                    }
+                }
+            },
+            scales: {
+                y: {
+                    beginAtZero: true,
+                    grid: {
+                        color: 'rgba(0,0,0,0.1)'
+                    },
+                    ticks: {
+                        callback: function(value) {
+                            return Math.round(value) + ' kg';
+                        }
+                    }
+                },
+                x: {
+                    grid: {
+                        display: false
+                    }
+                }
+            }
+        }
+    });
+}
+
+// Manejar cambios en los filtros de período (peso corporal)
+document.addEventListener('DOMContentLoaded', function() {
+    const periodos = document.querySelectorAll('input[name="periodo"]');
+    periodos.forEach(radio => {
+        radio.addEventListener('change', function() {
+            if (this.checked) {
+                cargarDatosPeso(parseInt(this.value));
+            }
+        });
+    });
+    
+    // Manejar cambios en los filtros de período (ejercicios)
+    const periodosEjercicio = document.querySelectorAll('input[name="periodo-ejercicio"]');
+    periodosEjercicio.forEach(radio => {
+        radio.addEventListener('change', function() {
+            if (this.checked && ejercicioActualId) {
+                cargarDatosEjercicio(ejercicioActualId, parseInt(this.value));
+            }
+        });
+    });
+});
+
+// Funciones para gestión de ejercicios personalizados
+function abrirModalNuevoEjercicio() {
+    const modal = new bootstrap.Modal(document.getElementById('modalNuevoEjercicio'));
+    modal.show();
+    
+    // Limpiar formulario
+    document.getElementById('nombre_ejercicio').value = '';
+    document.getElementById('grupo_muscular_ejercicio').value = '';
+    document.getElementById('descripcion_ejercicio').value = '';
+}
+
+function eliminarEjercicio(ejercicioId, nombreEjercicio) {
+    if (confirm(`¿Estás seguro de que quieres eliminar el ejercicio "${nombreEjercicio}"?\n\nSi tiene historial de entrenamientos, será archivado en lugar de eliminado.`)) {
+        // Crear formulario temporal para enviar DELETE
+        const form = document.createElement('form');
+        form.method = 'POST';
+        form.action = CONFIG_DASHBOARD.urlEliminarEjercicio.replace('0', ejercicioId);
+        
+        document.body.appendChild(form);
+        form.submit();
+    }
+}
@@ -0,0 +1,80 @@
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+# La configuración de app.py se lee del entorno al importarlo: base de datos
+# SQLite temporal, sin réplica, sin Redis y con el hash de contraseñas en el
+# propio proceso
+_DIRECTORIO = tempfile.mkdtemp(prefix='gym_tests_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_DIRECTORIO, 'test.sqlite')
+os.environ['HASH_PROCESOS'] = '0'
+os.environ['HASH_METODO'] = 'pbkdf2:sha256:1000'
+for variable in ('DATABASE_REPLICA_URL', 'CACHE_RESULTADOS_URL', 'ESCRITURAS_AGRUPADAS',
+                 'PROMETHEUS_MULTIPROC_DIR', 'METRICAS_TOKEN'):
+    os.environ.pop(variable, None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as modulo_app  # noqa: E402
+from migraciones import version_esquema  # noqa: E402
+
+CONTRASENA = 'secreta'
+
+
+def vaciar_base_de_datos():
+    db = modulo_app.db
+    db.session.remove()
+    db.drop_all(bind_key=None)
+    version_esquema.drop(db.engine, checkfirst=True)
+
+
+@pytest.fixture
+def app():
+    aplicacion = modulo_app.app
+    aplicacion.config.update(TESTING=True, SQL_CONTADOR_CABECERAS=True)
+    with aplicacion.app_context():
+        vaciar_base_de_datos()
+        modulo_app.init_db()
+    modulo_app.cache_catalogo_sistema.invalidar()
+    modulo_app.cache_resultados.invalidar()
+    yield aplicacion
+    with aplicacion.app_context():
+        modulo_app.db.session.remove()
+
+
+@pytest.fixture
+def cliente(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def usuario(cliente):
+    """Usuario registrado y con la sesión iniciada en ``cliente``; devuelve su id"""
+    cliente.post('/register', data={'username': 'ana', 'email': 'ana@example.com', 'password': CONTRASENA})
+    cliente.post('/login', data={'username': 'ana', 'password': CONTRASENA})
+    with cliente.session_transaction() as sesion:
+        return sesion['user_id']
+
+
+@pytest.fixture
+def ejercicios(app):
+    """Ids de los ejercicios del catálogo del sistema"""
+    with app.app_context():
+        return [e.id for e in modulo_app.Ejercicio.query.filter_by(usuario_id=None).order_by(modulo_app.Ejercicio.id)]
+
+
+def registrar_sesion(cliente, ejercicio_id, fecha, series, **datos):
+    """Registrar una sesión por el formulario; ``series`` es una lista de (peso, repeticiones)"""
+    return cliente.post('/registrar_ejercicio', data={
+        'ejercicio_id': str(ejercicio_id),
+        'fecha': fecha.isoformat(),
+        'series_data': [json.dumps({'peso': peso, 'repeticiones': reps}) for peso, reps in series],
+        **datos,
+    })
+
+
+def consultas(respuesta):
+    return int(respuesta.headers['X-SQL-Queries'])
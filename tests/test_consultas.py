@@ -0,0 +1,73 @@
+from datetime import date, timedelta
+
+import pytest
+from flask import Flask
+
+from conftest import CONTRASENA, consultas, modulo_app, registrar_sesion
+from instrumentacion import PresupuestoSQLExcedido, init_instrumentacion, presupuesto_sql
+
+
+def _registrar_sesiones(cliente, ejercicios, cantidad):
+    for i in range(cantidad):
+        registrar_sesion(cliente, ejercicios[i % len(ejercicios)], date.today() - timedelta(days=i),
+                         [(60 + i, 8), (60 + i, 6)])
+
+
+def test_dashboard_dentro_de_presupuesto(cliente, usuario, ejercicios):
+    _registrar_sesiones(cliente, ejercicios[:4], 10)
+    respuesta = cliente.get('/dashboard')
+    assert respuesta.status_code == 200
+    assert consultas(respuesta) <= 4
+
+
+def test_dashboard_sin_consultas_por_registro(cliente, usuario, ejercicios):
+    _registrar_sesiones(cliente, ejercicios[:1], 1)
+    cliente.get('/dashboard')  # Catálogo ya en caché en las dos mediciones
+    con_uno = consultas(cliente.get('/dashboard'))
+    _registrar_sesiones(cliente, ejercicios[:6], 9)
+    assert consultas(cliente.get('/dashboard')) == con_uno
+
+
+def test_progreso_ejercicio_dentro_de_presupuesto(cliente, usuario, ejercicios):
+    _registrar_sesiones(cliente, ejercicios[:1], 1)
+    con_una = consultas(cliente.get(f'/progreso_ejercicio/{ejercicios[0]}'))
+    assert con_una > 0
+    _registrar_sesiones(cliente, ejercicios[:1], 20)
+    respuesta = cliente.get(f'/progreso_ejercicio/{ejercicios[0]}')
+    assert respuesta.status_code == 200
+    assert len(respuesta.get_json()['datos']) == 21
+    assert consultas(respuesta) == con_una <= 4
+
+
+def test_presupuesto_excedido_falla_en_testing():
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    init_instrumentacion(app)
+
+    @app.route('/')
+    @presupuesto_sql(0)
+    def vista():
+        from flask import g
+        g.sql_consultas = 1  # Como si la vista hubiera ejecutado una consulta
+        return 'ok'
+
+    with pytest.raises(PresupuestoSQLExcedido):
+        app.test_client().get('/')
+
+
+def test_menu_se_actualiza_en_otras_sesiones(app, cliente, usuario, ejercicios, monkeypatch):
+    otro_dispositivo = app.test_client()
+    otro_dispositivo.post('/login', data={'username': 'ana', 'password': CONTRASENA})
+    assert 'Curl Araña' not in otro_dispositivo.get('/dashboard').get_data(as_text=True)
+
+    # Como si el ejercicio se creara en otro worker: aquí no se invalida nada en memoria
+    monkeypatch.setattr(modulo_app.cache_ejercicios_usuario, 'invalidar', lambda clave=None: None)
+    cliente.post('/agregar_ejercicio', data={'nombre_ejercicio': 'Curl Araña', 'grupo_muscular_ejercicio': 'Bíceps'})
+    assert 'Curl Araña' in otro_dispositivo.get('/dashboard').get_data(as_text=True)
+
+    # Registrar entrenamientos no cambia la versión de ejercicios ni vacía la caché del menú
+    with app.app_context():
+        version = modulo_app.db.session.get(modulo_app.Usuario, usuario).version_ejercicios
+    _registrar_sesiones(cliente, ejercicios[:1], 1)
+    with app.app_context():
+        assert modulo_app.db.session.get(modulo_app.Usuario, usuario).version_ejercicios == version
@@ -0,0 +1,33 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+import app as modulo_app
+from contrasenas import HashOcupado, ServicioContrasenas
+
+
+@pytest.mark.parametrize('metodo', ['scrypt', 'pbkdf2', 'pbkdf2:sha256:1000'])
+def test_metodo_abreviado_no_fuerza_rehash(metodo):
+    servicio = ServicioContrasenas(metodo, procesos=0)
+    hash_guardado = servicio.generar('secreta')
+    assert servicio.verificar(hash_guardado, 'secreta')
+    assert not servicio.necesita_rehash(hash_guardado)
+
+
+def test_otros_parametros_si_fuerzan_rehash():
+    servicio = ServicioContrasenas('pbkdf2:sha256:1000', procesos=0)
+    assert servicio.necesita_rehash(generate_password_hash('secreta', method='pbkdf2:sha256:2000'))
+
+
+def test_sin_plaza_se_rechaza():
+    servicio = ServicioContrasenas('pbkdf2:sha256:1000', procesos=0, max_pendientes=1, espera=0.01)
+    servicio._plazas.acquire()
+    with pytest.raises(HashOcupado):
+        servicio.generar('secreta')
+
+
+def test_login_no_reescribe_un_hash_vigente(app, cliente, usuario):
+    with app.app_context():
+        antes = modulo_app.db.session.get(modulo_app.Usuario, usuario).password_hash
+    cliente.post('/login', data={'username': 'ana', 'password': 'secreta'})
+    with app.app_context():
+        assert modulo_app.db.session.get(modulo_app.Usuario, usuario).password_hash == antes
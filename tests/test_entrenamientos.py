@@ -0,0 +1,64 @@
+import app as modulo_app
+
+
+def _lote(ejercicio_id, **extra):
+    return {'sesiones': [{'ejercicio_id': ejercicio_id, 'fecha': '2026-03-02',
+                          'series': [{'peso': 80, 'repeticiones': 5}, {'peso': 80, 'repeticiones': 4}]}],
+            **extra}
+
+
+def _registros(app, usuario_id):
+    with app.app_context():
+        return modulo_app.RegistroEjercicio.query.filter_by(usuario_id=usuario_id).count()
+
+
+def test_reintento_con_la_misma_clave_devuelve_el_resultado_anterior(app, cliente, usuario, ejercicios):
+    cabeceras = {'Idempotency-Key': 'entreno-2026-03-02'}
+    primera = cliente.post('/api/entrenamientos', json=_lote(ejercicios[0]), headers=cabeceras)
+    repetida = cliente.post('/api/entrenamientos', json=_lote(ejercicios[0]), headers=cabeceras)
+
+    assert primera.status_code == 201
+    assert repetida.status_code == 200
+    assert repetida.get_json()['repetido'] is True
+    assert repetida.get_json()['registros'] == primera.get_json()['registros']
+    assert _registros(app, usuario) == 1
+
+
+def test_clave_en_el_cuerpo_y_claves_distintas(app, cliente, usuario, ejercicios):
+    cliente.post('/api/entrenamientos', json=_lote(ejercicios[0], clave='a'))
+    cliente.post('/api/entrenamientos', json=_lote(ejercicios[0], clave='a'))
+    cliente.post('/api/entrenamientos', json=_lote(ejercicios[0], clave='b'))
+    assert _registros(app, usuario) == 2
+
+
+def test_clave_demasiado_larga_se_rechaza(app, cliente, usuario, ejercicios):
+    prefijo = 'x' * 64
+    cliente.post('/api/entrenamientos', json=_lote(ejercicios[0]), headers={'Idempotency-Key': prefijo})
+    respuesta = cliente.post('/api/entrenamientos', json=_lote(ejercicios[0]),
+                             headers={'Idempotency-Key': prefijo + 'y'})
+    assert respuesta.status_code == 400
+    assert _registros(app, usuario) == 1
+
+
+def test_lote_invalido_no_escribe_nada(app, cliente, usuario, ejercicios):
+    lote = _lote(ejercicios[0])
+    lote['sesiones'].append({'ejercicio_id': ejercicios[1], 'series': [{'peso': 'mucho', 'repeticiones': 5}]})
+    assert cliente.post('/api/entrenamientos', json=lote).status_code == 400
+    assert _registros(app, usuario) == 0
+
+
+def test_cuerpo_que_no_es_un_objeto(app, cliente, usuario, ejercicios):
+    for cuerpo in ([_lote(ejercicios[0])], 'sesiones', 3):
+        assert cliente.post('/api/entrenamientos', json=cuerpo).status_code == 400
+        assert cliente.post('/api/entrenamientos', json=cuerpo, headers={'Idempotency-Key': 'k'}).status_code == 400
+    assert _registros(app, usuario) == 0
+
+
+def test_completada_en_texto(app, cliente, usuario, ejercicios):
+    lote = _lote(ejercicios[0])
+    lote['sesiones'][0]['series'] = [{'peso': 80, 'repeticiones': 5, 'completada': 'false'},
+                                     {'peso': 80, 'repeticiones': 5, 'completada': 'true'}]
+    cliente.post('/api/entrenamientos', json=lote)
+    with app.app_context():
+        series = modulo_app.SerieEjercicio.query.order_by(modulo_app.SerieEjercicio.numero_serie).all()
+        assert [serie.completada for serie in series] == [False, True]
@@ -0,0 +1,139 @@
+import threading
+import time
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from conftest import modulo_app, registrar_sesion
+from escrituras import ColaEscriturasLlena, ComprometedorAgrupado, EscrituraSinConfirmar
+
+
+def _peso(usuario_id, dias, peso=80.0):
+    return lambda: modulo_app.guardar_peso(usuario_id, date.today() - timedelta(days=dias), peso, '')
+
+
+def _en_hilos(comprometedor, trabajos):
+    """Enviar cada trabajo desde su propio hilo; devuelve resultado o excepción de cada uno"""
+    resultados = [None] * len(trabajos)
+
+    def enviar(i, trabajo):
+        try:
+            resultados[i] = comprometedor.enviar(trabajo)
+        except Exception as e:
+            resultados[i] = e
+
+    hilos = [threading.Thread(target=enviar, args=(i, trabajo)) for i, trabajo in enumerate(trabajos)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join(5)
+    return resultados
+
+
+def _pesos(app, usuario_id):
+    with app.app_context():
+        return modulo_app.RegistroPeso.query.filter_by(usuario_id=usuario_id).count()
+
+
+@pytest.fixture
+def commits(app):
+    """Lista a la que se añade una entrada por cada COMMIT en la base de datos"""
+    lista = []
+    with app.app_context():
+        motor = modulo_app.db.engine
+
+    def contar(conexion):
+        lista.append(conexion)
+
+    event.listen(motor, 'commit', contar)
+    yield lista
+    event.remove(motor, 'commit', contar)
+
+
+def _bloquear(comprometedor):
+    """Ocupar el hilo del committer hasta que se suelte el evento devuelto"""
+    empezado, soltar = threading.Event(), threading.Event()
+
+    def trabajo():
+        empezado.set()
+        soltar.wait(5)
+
+    def enviar():
+        try:
+            comprometedor.enviar(trabajo)
+        except EscrituraSinConfirmar:
+            pass
+
+    hilo = threading.Thread(target=enviar)
+    hilo.start()
+    assert empezado.wait(5)
+    return soltar, hilo
+
+
+def test_varias_escrituras_en_un_commit(app, usuario, commits):
+    # El lote se cierra al llegar a max_lote, mucho antes de agotar la espera
+    comprometedor = ComprometedorAgrupado(app, modulo_app.db, max_lote=4, espera_ms=5000)
+    resultados = _en_hilos(comprometedor, [_peso(usuario, dias) for dias in range(4)])
+    assert resultados == [None] * 4
+    assert len(commits) == 1
+    assert _pesos(app, usuario) == 4
+
+
+def test_un_fallo_solo_afecta_a_su_escritura(app, usuario, commits):
+    def falla():
+        _peso(usuario, 10)()
+        raise ValueError('dato no válido')
+
+    comprometedor = ComprometedorAgrupado(app, modulo_app.db, max_lote=3, espera_ms=5000)
+    resultados = _en_hilos(comprometedor, [_peso(usuario, 0), falla, _peso(usuario, 1)])
+    assert resultados[0] is None and resultados[2] is None
+    assert isinstance(resultados[1], ValueError)
+    # El lote se deshace y se repite cada escritura en su propia transacción
+    assert len(commits) == 2
+    assert _pesos(app, usuario) == 2
+
+
+def test_cola_llena(app, usuario):
+    comprometedor = ComprometedorAgrupado(app, modulo_app.db, max_lote=1, espera_ms=0, max_cola=1)
+    soltar, bloqueo = _bloquear(comprometedor)
+    en_cola = threading.Thread(target=comprometedor.enviar, args=(_peso(usuario, 0),))
+    en_cola.start()
+    while comprometedor._cola.qsize() < 1:
+        time.sleep(0.01)
+
+    with pytest.raises(ColaEscriturasLlena):
+        comprometedor.enviar(_peso(usuario, 1))
+
+    soltar.set()
+    bloqueo.join(5)
+    en_cola.join(5)
+    assert _pesos(app, usuario) == 1
+
+
+def test_sin_confirmar_a_tiempo_se_descarta(app, usuario):
+    comprometedor = ComprometedorAgrupado(app, modulo_app.db, max_lote=1, espera_ms=0, timeout=0.2)
+    soltar, bloqueo = _bloquear(comprometedor)
+
+    with pytest.raises(EscrituraSinConfirmar) as error:
+        comprometedor.enviar(_peso(usuario, 0))
+    assert error.value.descartada
+
+    soltar.set()
+    bloqueo.join(5)
+    # El committer salta la escritura cancelada y sigue con las siguientes
+    assert comprometedor.enviar(_peso(usuario, 1)) is None
+    assert _pesos(app, usuario) == 1
+
+
+def test_registro_sin_confirmar_responde_503(cliente, usuario, ejercicios, monkeypatch):
+    class Atascado:
+        def enviar(self, trabajo):
+            raise EscrituraSinConfirmar(descartada=False)
+
+    monkeypatch.setattr(modulo_app, 'escrituras', Atascado())
+    respuesta = registrar_sesion(cliente, ejercicios[0], date.today(), [(80, 5)])
+    assert respuesta.status_code == 503
+    assert respuesta.headers['Retry-After']
+    respuesta = cliente.post('/registrar_peso', data={'peso': '80'})
+    assert respuesta.status_code == 503
@@ -0,0 +1,14 @@
+import pytest
+
+
+@pytest.mark.parametrize('ruta', ['/metrics', '/estado/cache', '/estado/replica'])
+def test_diagnostico_exige_el_token_de_metricas(app, cliente, monkeypatch, ruta):
+    monkeypatch.setitem(app.config, 'METRICAS_TOKEN', 'secreto')
+    assert cliente.get(ruta).status_code == 401
+    assert cliente.get(ruta, headers={'Authorization': 'Bearer otro'}).status_code == 401
+    assert cliente.get(ruta, headers={'Authorization': 'Bearer secreto'}).status_code == 200
+
+
+def test_diagnostico_sin_token_configurado(cliente):
+    assert cliente.get('/estado/cache').status_code == 200
+    assert cliente.get('/estado/replica').get_json() == {'configurada': False}
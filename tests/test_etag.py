@@ -0,0 +1,38 @@
+from datetime import date
+
+from conftest import CONTRASENA, consultas
+
+
+def test_if_none_match_responde_304(cliente, usuario):
+    primera = cliente.get('/peso_data?dias=30')
+    assert primera.status_code == 200
+    etag = primera.headers['ETag']
+
+    repetida = cliente.get('/peso_data?dias=30', headers={'If-None-Match': etag})
+    assert repetida.status_code == 304
+    assert repetida.get_data() == b''
+    assert repetida.headers['ETag'] == etag
+    # Solo la versión de datos del usuario: la vista no se ejecuta
+    assert consultas(repetida) == 1
+
+
+def test_escribir_cambia_el_etag(cliente, usuario):
+    etag = cliente.get('/peso_data?dias=30').headers['ETag']
+    cliente.post('/registrar_peso', data={'peso': '80', 'fecha_peso': date.today().isoformat()})
+
+    respuesta = cliente.get('/peso_data?dias=30', headers={'If-None-Match': etag})
+    assert respuesta.status_code == 200
+    assert respuesta.headers['ETag'] != etag
+    assert respuesta.get_json()['peso_actual'] == 80
+
+
+def test_etag_de_otro_usuario_no_valida(app, cliente, usuario):
+    etag = cliente.get('/peso_data?dias=30').headers['ETag']
+
+    otro = app.test_client()
+    otro.post('/register', data={'username': 'luis', 'email': 'luis@example.com', 'password': CONTRASENA})
+    otro.post('/login', data={'username': 'luis', 'password': CONTRASENA})
+    # Misma URL y misma versión de datos (ninguno ha escrito nada)
+    respuesta = otro.get('/peso_data?dias=30', headers={'If-None-Match': etag})
+    assert respuesta.status_code == 200
+    assert respuesta.headers['ETag'] != etag
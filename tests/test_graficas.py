@@ -0,0 +1,132 @@
+import random
+from datetime import date, timedelta
+
+from conftest import modulo_app, registrar_sesion
+
+
+def test_mejor_primera_serie_del_dia_es_de_una_misma_sesion(cliente, usuario, ejercicios):
+    hoy = date.today()
+    registrar_sesion(cliente, ejercicios[0], hoy, [(100, 3), (90, 5)])
+    registrar_sesion(cliente, ejercicios[0], hoy, [(60, 12)])
+    registrar_sesion(cliente, ejercicios[0], hoy - timedelta(days=1), [(70, 8)])
+
+    datos = cliente.get(f'/progreso_ejercicio/{ejercicios[0]}?resolucion=dia').get_json()['datos']
+    assert [(punto['fecha'], punto['peso_primera_serie'], punto['reps_primera_serie']) for punto in datos] == [
+        ((hoy - timedelta(days=1)).isoformat(), 70, 8),
+        (hoy.isoformat(), 100, 3),
+    ]
+    assert datos[1]['sesiones'] == 2
+
+
+def _inicio(fecha, periodo):
+    return fecha - timedelta(days=fecha.weekday()) if periodo == 'semana' else fecha.replace(day=1)
+
+
+def _historial(cliente, ejercicio_id):
+    """Sesiones y pesos repartidos por los últimos 300 días, registrados desordenados"""
+    aleatorio = random.Random(7)
+    hoy = date.today()
+    dias = aleatorio.sample(range(300), 60)
+    for dia in dias:
+        series = [(aleatorio.choice((60, 70, 80)), aleatorio.randint(3, 12)) for _ in range(aleatorio.randint(1, 4))]
+        registrar_sesion(cliente, ejercicio_id, hoy - timedelta(days=dia), series)
+    for dia in dias[:30]:
+        cliente.post('/registrar_peso', data={
+            'peso': str(aleatorio.randint(700, 800) / 10), 'fecha_peso': (hoy - timedelta(days=dia)).isoformat()
+        })
+
+
+def test_resumenes_por_periodo_coinciden_con_las_sesiones(cliente, usuario, ejercicios):
+    _historial(cliente, ejercicios[0])
+
+    sesiones = cliente.get(f'/progreso_ejercicio/{ejercicios[0]}?dias=400&resolucion=sesion&detalle=0').get_json()
+    pesos = cliente.get('/peso_data?dias=400&resolucion=sesion').get_json()
+    assert len(sesiones['datos']) == 60
+    for periodo in ('semana', 'mes'):
+        esperado = {}
+        for punto in sesiones['datos']:
+            inicio = _inicio(date.fromisoformat(punto['fecha']), periodo).isoformat()
+            grupo = esperado.setdefault(inicio, {'sesiones': 0, 'series_total': 0, 'volumen_total': 0,
+                                                 'peso_max': 0, 'primera_serie': (0, 0)})
+            grupo['sesiones'] += 1
+            grupo['series_total'] += punto['series_total']
+            grupo['volumen_total'] += punto['volumen_total']
+            grupo['peso_max'] = max(grupo['peso_max'], punto['peso_max'])
+            grupo['primera_serie'] = max(grupo['primera_serie'],
+                                         (punto['peso_primera_serie'], punto['reps_primera_serie']))
+
+        agrupados = cliente.get(f'/progreso_ejercicio/{ejercicios[0]}?dias=400&resolucion={periodo}').get_json()
+        assert {punto['fecha']: {
+            'sesiones': punto['sesiones'],
+            'series_total': punto['series_total'],
+            'volumen_total': punto['volumen_total'],
+            'peso_max': punto['peso_max'],
+            'primera_serie': (punto['peso_primera_serie'], punto['reps_primera_serie']),
+        } for punto in agrupados['datos']} == esperado
+        assert agrupados['estadisticas']['total_sesiones'] == 60
+
+        pesos_esperados = {}
+        for punto in pesos['datos']:
+            pesos_esperados.setdefault(_inicio(date.fromisoformat(punto['fecha']), periodo).isoformat(), []).append(punto['peso'])
+        pesos_agrupados = cliente.get(f'/peso_data?dias=400&resolucion={periodo}').get_json()
+        assert {punto['fecha']: round(punto['peso'], 6) for punto in pesos_agrupados['datos']} == {
+            inicio: round(sum(valores) / len(valores), 6) for inicio, valores in pesos_esperados.items()
+        }
+        assert (pesos_agrupados['peso_inicial'], pesos_agrupados['peso_actual']) == (
+            pesos['peso_inicial'], pesos['peso_actual'])
+
+
+def test_mantenimiento_incremental_igual_a_reconstruir(app, cliente, usuario, ejercicios):
+    _historial(cliente, ejercicios[0])
+
+    def filas(modelo):
+        columnas = [columna.name for columna in modelo.__table__.columns]
+        return sorted(tuple(getattr(fila, columna) for columna in columnas) for fila in modelo.query.all())
+
+    modelos = (modulo_app.ResumenEjercicioPeriodo, modulo_app.ResumenPesoPeriodo, modulo_app.VolumenGrupoSemana)
+    with app.app_context():
+        incrementales = [filas(modelo) for modelo in modelos]
+        modulo_app.reconstruir_resumenes_periodo()
+        assert [filas(modelo) for modelo in modelos] == incrementales
+    assert incrementales[0]
+
+
+def test_rangos_largos_se_agrupan_automaticamente(cliente, usuario, ejercicios):
+    hoy = date.today()
+    hace_un_mes = hoy - timedelta(days=30)
+    registrar_sesion(cliente, ejercicios[0], hace_un_mes, [(100, 3)])
+    registrar_sesion(cliente, ejercicios[0], hace_un_mes + timedelta(days=1), [(60, 12)])
+
+    for dias, periodo in ((90, None), (365, 'semana'), (800, 'mes')):
+        datos = cliente.get(f'/progreso_ejercicio/{ejercicios[0]}?dias={dias}&detalle=0').get_json()['datos']
+        if periodo is None:
+            assert len(datos) == 2 and 'sesiones' not in datos[0]
+        else:
+            fechas = {_inicio(hace_un_mes, periodo), _inicio(hace_un_mes + timedelta(days=1), periodo)}
+            assert [punto['fecha'] for punto in datos] == sorted(fecha.isoformat() for fecha in fechas)
+            assert sum(punto['sesiones'] for punto in datos) == 2
+
+
+def test_mejor_primera_serie_de_la_semana_es_de_una_misma_sesion(cliente, usuario, ejercicios):
+    # Semana completa dentro del rango: sale de ResumenEjercicioPeriodo
+    lunes = _inicio(date.today(), 'semana') - timedelta(days=14)
+    registrar_sesion(cliente, ejercicios[0], lunes, [(100, 3)])
+    registrar_sesion(cliente, ejercicios[0], lunes + timedelta(days=2), [(60, 12)])
+
+    datos = cliente.get(f'/progreso_ejercicio/{ejercicios[0]}?dias=60&resolucion=semana').get_json()['datos']
+    assert [(punto['fecha'], punto['peso_primera_serie'], punto['reps_primera_serie']) for punto in datos] == [
+        (lunes.isoformat(), 100, 3)
+    ]
+
+
+def test_detalle_explicito_no_se_agrupa(cliente, usuario, ejercicios):
+    hoy = date.today()
+    registrar_sesion(cliente, ejercicios[0], hoy - timedelta(days=2), [(100, 3), (90, 5)])
+    registrar_sesion(cliente, ejercicios[0], hoy - timedelta(days=1), [(60, 12)])
+
+    for ruta in (f'/progreso_ejercicio/{ejercicios[0]}?dias=800&detalle=1',
+                 f'/api/graficas?ejercicios={ejercicios[0]}&dias=400&detalle=1'):
+        respuesta = cliente.get(ruta).get_json()
+        datos = respuesta['datos'] if 'datos' in respuesta else respuesta['ejercicios'][str(ejercicios[0])]['datos']
+        assert [len(punto['series_detalle']) for punto in datos] == [2, 1]
+        assert 'sesiones' not in datos[0]
@@ -0,0 +1,99 @@
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from conftest import modulo_app, vaciar_base_de_datos
+
+# Esquema de la versión anterior a las migraciones: sin version_datos, sin
+# tablas derivadas y sin índice único en registro_peso
+ESQUEMA_PREVIO = [
+    '''CREATE TABLE usuario (
+        id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE, email VARCHAR(120) NOT NULL UNIQUE,
+        password_hash VARCHAR(255) NOT NULL, fecha_registro DATETIME)''',
+    '''CREATE TABLE ejercicio (
+        id INTEGER PRIMARY KEY, nombre VARCHAR(100) NOT NULL, grupo_muscular VARCHAR(50) NOT NULL,
+        descripcion TEXT, usuario_id INTEGER REFERENCES usuario (id), fecha_creacion DATETIME, activo BOOLEAN)''',
+    '''CREATE TABLE registro_ejercicio (
+        id INTEGER PRIMARY KEY, usuario_id INTEGER NOT NULL REFERENCES usuario (id),
+        ejercicio_id INTEGER NOT NULL REFERENCES ejercicio (id), fecha DATE NOT NULL,
+        fecha_registro DATETIME, notas TEXT)''',
+    '''CREATE TABLE serie_ejercicio (
+        id INTEGER PRIMARY KEY, registro_id INTEGER NOT NULL REFERENCES registro_ejercicio (id),
+        numero_serie INTEGER NOT NULL, peso FLOAT NOT NULL, repeticiones INTEGER NOT NULL, completada BOOLEAN)''',
+    '''CREATE TABLE registro_peso (
+        id INTEGER PRIMARY KEY, usuario_id INTEGER NOT NULL REFERENCES usuario (id), peso FLOAT NOT NULL,
+        fecha DATE NOT NULL, fecha_registro DATETIME, notas TEXT)''',
+]
+
+
+@pytest.fixture
+def base_previa(app):
+    """Base de datos con el esquema previo y datos, incluidos pesos repetidos en un mismo día"""
+    db = modulo_app.db
+    with app.app_context():
+        vaciar_base_de_datos()
+        with db.engine.begin() as conexion:
+            for sentencia in ESQUEMA_PREVIO:
+                conexion.exec_driver_sql(sentencia)
+            conexion.exec_driver_sql(
+                "INSERT INTO usuario VALUES (1, 'ana', 'ana@example.com', 'x', '2024-01-01 00:00:00')")
+            conexion.exec_driver_sql(
+                "INSERT INTO ejercicio VALUES (1, 'Press de Banca', 'Pecho', NULL, NULL, NULL, 1)")
+            conexion.exec_driver_sql("INSERT INTO registro_ejercicio VALUES (1, 1, 1, '2024-03-04', NULL, '')")
+            conexion.exec_driver_sql(
+                "INSERT INTO serie_ejercicio VALUES (1, 1, 1, 80, 5, 1), (2, 1, 2, 70, 8, 1)")
+            conexion.exec_driver_sql('''INSERT INTO registro_peso VALUES
+                (1, 1, 80.0, '2024-03-04', '2024-03-04 20:00:00', 'noche'),
+                (2, 1, 79.0, '2024-03-04', '2024-03-04 08:00:00', 'mañana'),
+                (3, 1, 78.5, '2024-03-05', NULL, ''),
+                (4, 1, 78.0, '2024-03-05', NULL, 'mismo instante, id mayor'),
+                (5, 1, 77.0, '2024-03-06', '2024-03-06 08:00:00', '')''')
+        yield db
+
+
+def test_actualizar_base_previa_con_pesos_duplicados(app, base_previa):
+    db = base_previa
+    with app.app_context():
+        assert [m.version for m in modulo_app.migraciones.pendientes()] == [
+            m.version for m in modulo_app.migraciones.lista]
+        modulo_app.init_db()
+        assert modulo_app.migraciones.pendientes() == []
+
+        # Un peso por día: el registrado más tarde (a igualdad, el de id mayor)
+        pesos = db.session.query(
+            modulo_app.RegistroPeso.id, modulo_app.RegistroPeso.fecha, modulo_app.RegistroPeso.peso
+        ).order_by(modulo_app.RegistroPeso.fecha).all()
+        assert [tuple(fila) for fila in pesos] == [
+            (1, date(2024, 3, 4), 80.0), (4, date(2024, 3, 5), 78.0), (5, date(2024, 3, 6), 77.0)]
+        db.session.add(modulo_app.RegistroPeso(usuario_id=1, peso=76.0, fecha=date(2024, 3, 6),
+                                               fecha_registro=datetime(2024, 3, 6, 21)))
+        with pytest.raises(IntegrityError):
+            db.session.flush()
+        db.session.rollback()
+
+        # Columnas nuevas y tablas derivadas calculadas desde los datos existentes
+        assert db.session.get(modulo_app.Usuario, 1).version_datos == 0
+        resumen = db.session.get(modulo_app.ResumenRegistro, 1)
+        assert (resumen.series_total, resumen.peso_primera_serie, resumen.reps_primera_serie) == (2, 80, 5)
+        assert modulo_app.ResumenEjercicioPeriodo.query.count() == 2
+        assert {r.peso: r.repeticiones for r in modulo_app.RecordRepeticiones.query} == {80: 5, 70: 8}
+        assert {r.tipo for r in modulo_app.RecordPersonal.query} == {'peso', '1rm', 'volumen'}
+
+
+def test_migrar_otra_vez_no_hace_nada(app, base_previa):
+    with app.app_context():
+        modulo_app.init_db()
+        assert modulo_app.migraciones.migrar() == []
+
+
+def test_base_nueva_siembra_el_catalogo_una_vez(app):
+    with app.app_context():
+        sistema = modulo_app.Ejercicio.query.filter_by(usuario_id=None)
+        creados = sistema.count()
+        assert creados > 0
+        assert modulo_app.migraciones.pendientes() == []
+
+        # Como un segundo contenedor arrancando sobre la misma base
+        modulo_app.init_db()
+        assert sistema.count() == creados
@@ -0,0 +1,73 @@
+from collections import namedtuple
+from datetime import date
+
+import app as modulo_app
+from conftest import registrar_sesion
+from records import mejores_marcas, mejores_repeticiones
+
+Serie = namedtuple('Serie', ['peso', 'repeticiones', 'completada'])
+
+
+def _records(cliente, ejercicio_id):
+    return cliente.get(f'/api/records?ejercicio_id={ejercicio_id}').get_json()['ejercicios'][str(ejercicio_id)]
+
+
+def _tablas(app):
+    with app.app_context():
+        return (
+            sorted((r.ejercicio_id, r.tipo, r.valor, r.registro_id) for r in modulo_app.RecordPersonal.query),
+            sorted((r.ejercicio_id, r.peso, r.repeticiones, r.registro_id)
+                   for r in modulo_app.RecordRepeticiones.query),
+        )
+
+
+def test_marcas_de_una_lista_de_sesiones():
+    sesiones = [
+        {'ejercicio_id': 1, 'fecha': date(2026, 1, 2), 'series': [Serie(100, 8, True), Serie(2, 20, True)]},
+        {'ejercicio_id': 1, 'fecha': date(2026, 1, 1), 'series': [Serie(100, 8, True), Serie(120, 1, False)]},
+    ]
+    marcas = mejores_marcas(sesiones)
+    assert marcas[(1, 'peso')].valor == 100
+    assert marcas[(1, 'peso')].sesion == 1  # Empate: la sesión más antigua
+    assert (1, 'repeticiones') not in marcas
+    assert {clave: marca.valor for clave, marca in mejores_repeticiones(sesiones).items()} == {
+        (1, 100): 8, (1, 2): 20
+    }
+
+
+def test_repeticiones_se_comparan_con_el_mismo_peso(cliente, usuario, ejercicios):
+    registrar_sesion(cliente, ejercicios[0], date(2026, 1, 1), [(100, 8)])
+    registrar_sesion(cliente, ejercicios[0], date(2026, 1, 3), [(2, 20)])
+    records = _records(cliente, ejercicios[0])
+    assert [(m['peso'], m['repeticiones']) for m in records['repeticiones']] == [(2, 20), (100, 8)]
+    assert records['records']['peso']['valor'] == 100
+
+    respuesta = registrar_sesion(cliente, ejercicios[0], date(2026, 1, 5), [(100, 10)])
+    assert respuesta.status_code == 302
+    mensajes = cliente.get('/dashboard').get_data(as_text=True)
+    assert 'repeticiones 10 con 100 kg' in mensajes
+    assert [(m['peso'], m['repeticiones']) for m in _records(cliente, ejercicios[0])['repeticiones']] == [
+        (2, 20), (100, 10)
+    ]
+
+
+def test_api_entrenamientos_devuelve_los_records_batidos(cliente, usuario, ejercicios):
+    registrar_sesion(cliente, ejercicios[0], date(2026, 1, 1), [(80, 5)])
+    respuesta = cliente.post('/api/entrenamientos', json={'sesiones': [
+        {'ejercicio_id': ejercicios[0], 'fecha': '2026-01-08', 'series': [{'peso': 85, 'repeticiones': 3}]}
+    ]})
+    batidos = {record['tipo']: record for record in respuesta.get_json()['records']}
+    assert batidos['peso']['valor'] == 85 and batidos['peso']['anterior'] == 80
+    assert 'repeticiones' not in batidos  # Primera vez con 85 kg: no hay récord anterior que batir
+
+
+def test_actualizacion_incremental_igual_a_reconstruir(app, cliente, usuario, ejercicios):
+    for dia, (ejercicio, series) in enumerate([
+        (0, [(60, 10), (70, 6)]), (1, [(20, 12)]), (0, [(70, 8), (75, 3)]),
+        (0, [(60, 10)]), (1, [(22.5, 10), (20, 15)]), (0, [(80, 1)]),
+    ], start=1):
+        registrar_sesion(cliente, ejercicios[ejercicio], date(2026, 2, dia), series)
+    incremental = _tablas(app)
+    with app.app_context():
+        modulo_app.reconstruir_records(usuario)
+    assert _tablas(app) == incremental
@@ -0,0 +1,78 @@
+import time
+
+import pytest
+from flask import Flask, session
+from flask_sqlalchemy import SQLAlchemy
+
+from instrumentacion import init_instrumentacion, presupuesto_sql
+from replicas import SesionEnrutada, init_replica
+
+
+@pytest.fixture
+def replica(tmp_path):
+    """App mínima con dos SQLite: la principal con 2 notas y la "réplica" sin ninguna"""
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        SECRET_KEY='pruebas',
+        SQL_CONTADOR_CABECERAS=True,
+        SQLALCHEMY_DATABASE_URI=f'sqlite:///{tmp_path / "principal.sqlite"}',
+        SQLALCHEMY_BINDS={'replica': f'sqlite:///{tmp_path / "replica.sqlite"}'},
+        REPLICA_INTERVALO=3600,
+    )
+    db = SQLAlchemy(app, session_options={'class_': SesionEnrutada})
+
+    class Nota(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+
+    init_instrumentacion(app)
+    estado = init_replica(app, db)
+    with app.app_context():
+        db.create_all(bind_key=None)
+        db.metadata.create_all(db.engines['replica'])
+        db.session.add_all([Nota(), Nota()])
+        db.session.commit()
+
+    @app.route('/notas')
+    @presupuesto_sql(1)
+    def notas():
+        return {'notas': Nota.query.count()}
+
+    @app.route('/notas', methods=['POST'])
+    def crear_nota():
+        session['user_id'] = 1
+        db.session.add(Nota())
+        db.session.commit()
+        return {}, 201
+
+    # Esperar a la primera comprobación del hilo; la siguiente tarda REPLICA_INTERVALO
+    estado.arrancar()
+    while not (estado.disponible and estado.motivo is None):
+        time.sleep(0.01)
+    yield app.test_client(), estado
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def test_lecturas_en_la_replica_sin_consultas_extra(replica):
+    cliente, estado = replica
+    respuesta = cliente.get('/notas')
+    assert respuesta.get_json() == {'notas': 0}
+    # La comprobación de la réplica va en segundo plano: solo cuenta la consulta de la vista
+    assert respuesta.headers['X-SQL-Queries'] == '1'
+
+
+def test_tras_escribir_se_lee_de_la_principal(replica):
+    cliente, estado = replica
+    cliente.post('/notas')
+    assert cliente.get('/notas').get_json() == {'notas': 3}
+
+
+def test_replica_caida_se_lee_de_la_principal(replica):
+    cliente, estado = replica
+    estado.marcar_caida(OSError('host=replica.interna user=secreto'))
+    assert cliente.get('/notas').get_json() == {'notas': 2}
+    assert estado.estadisticas()['motivo'] == 'OSError'
+    estado.comprobar()
+    assert cliente.get('/notas').get_json() == {'notas': 0}
@@ -0,0 +1,76 @@
+import io
+from datetime import date
+
+import pytest
+
+import app as modulo_app
+from conftest import CONTRASENA, registrar_sesion
+from transferencia import leer_registros
+
+
+def _historial(cliente, ejercicios):
+    cliente.post('/agregar_ejercicio', data={'nombre_ejercicio': 'Remo Pendlay',
+                                             'grupo_muscular_ejercicio': 'Espalda'})
+    with cliente.session_transaction() as sesion:
+        usuario_id = sesion['user_id']
+    propio = modulo_app.Ejercicio.query.filter_by(usuario_id=usuario_id).one().id
+    registrar_sesion(cliente, ejercicios[0], date(2026, 1, 5), [(60, 10), (62.5, 8)], notas='pesado, "bien"')
+    registrar_sesion(cliente, ejercicios[1], date(2026, 1, 7), [(20, 12)])
+    registrar_sesion(cliente, propio, date(2026, 1, 7), [(50, 8), (50, 8), (45, 10)])
+    cliente.post('/registrar_peso', data={'peso': '80.5', 'fecha_peso': '2026-01-05', 'notas_peso': 'ayunas'})
+    cliente.post('/registrar_peso', data={'peso': '80.1', 'fecha_peso': '2026-01-07'})
+    # Serie sin valor de "completada", como las anteriores a la columna
+    modulo_app.db.session.query(modulo_app.SerieEjercicio).filter_by(peso=62.5).update({'completada': None})
+    modulo_app.db.session.commit()
+
+
+def _completadas(app, usuario_id):
+    with app.app_context():
+        return sorted((serie.peso, serie.completada) for serie in modulo_app.SerieEjercicio.query.join(
+            modulo_app.RegistroEjercicio).filter(modulo_app.RegistroEjercicio.usuario_id == usuario_id))
+
+
+def _leer(exportado, formato):
+    """Registros exportados sin el id de sesión ni la línea, que cambian al importar"""
+    texto = io.TextIOWrapper(io.BytesIO(exportado), encoding='utf-8', newline='')
+    return [{clave: valor for clave, valor in registro.items() if clave not in ('sesion', 'linea')}
+            for registro in leer_registros(texto, formato)]
+
+
+def _otro_usuario(app):
+    cliente = app.test_client()
+    cliente.post('/register', data={'username': 'luis', 'email': 'luis@example.com', 'password': CONTRASENA})
+    cliente.post('/login', data={'username': 'luis', 'password': CONTRASENA})
+    return cliente
+
+
+@pytest.mark.parametrize('formato', ['csv', 'jsonl'])
+def test_exportar_e_importar_conserva_el_historial(app, cliente, usuario, ejercicios, formato):
+    with app.app_context():
+        _historial(cliente, ejercicios)
+    exportado = cliente.get(f'/exportar_historial?formato={formato}').get_data()
+
+    otro = _otro_usuario(app)
+    respuesta = otro.post(f'/importar_historial?formato={formato}', data={
+        'archivo': (io.BytesIO(exportado), f'historial.{formato}')
+    })
+    assert respuesta.status_code == 201
+    assert respuesta.get_json() == {'sesiones': 3, 'series': 6, 'pesos': 2, 'ejercicios_creados': 1}
+    reexportado = otro.get(f'/exportar_historial?formato={formato}').get_data()
+    assert _leer(reexportado, formato) == _leer(exportado, formato)
+    with otro.session_transaction() as sesion:
+        otro_id = sesion['user_id']
+    assert _completadas(app, otro_id) == _completadas(app, usuario)
+    assert (62.5, None) in _completadas(app, otro_id)
+
+
+def test_importacion_con_errores_no_guarda_nada(app, cliente, usuario, ejercicios):
+    with app.app_context():
+        _historial(cliente, ejercicios)
+    lineas = cliente.get('/exportar_historial?formato=jsonl').get_data().splitlines()
+    lineas.insert(1, b'{"tipo": "sesion", "ejercicio": "No existe", "fecha": "2026-01-06", "series": []}')
+
+    otro = _otro_usuario(app)
+    respuesta = otro.post('/importar_historial?formato=jsonl', data=b'\n'.join(lineas))
+    assert respuesta.status_code == 400
+    assert otro.get('/exportar_historial?formato=jsonl').get_data() == b''
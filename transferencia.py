@@ -0,0 +1,137 @@
+"""Formatos de exportación e importación del historial de entrenamiento.
+
+Todo funciona en streaming: la exportación genera el fichero por trozos a
+partir de un cursor y la importación lee línea a línea, de modo que la memoria
+no depende del tamaño del historial.
+
+Formatos:
+
+- CSV: una fila por serie (``tipo=serie``) o por peso corporal (``tipo=peso``).
+  Las series de una misma sesión comparten la columna ``sesion``; si no viene
+  (p. ej. una hoja de cálculo), se agrupan las filas consecutivas con la misma
+  fecha y ejercicio.
+- JSONL: un objeto por línea, ``{"tipo": "sesion", ..., "series": [...]}`` o
+  ``{"tipo": "peso", ...}``.
+"""
+import csv
+import io
+import json
+
+COLUMNAS_CSV = ['tipo', 'sesion', 'fecha', 'ejercicio', 'grupo_muscular', 'numero_serie',
+                'peso', 'repeticiones', 'completada', 'notas']
+
+# Filas que se acumulan antes de emitir un trozo de la respuesta
+FILAS_POR_TROZO = 500
+
+
+def generar_csv(filas):
+    """Convertir dicts con las columnas de COLUMNAS_CSV en trozos de texto CSV"""
+    buffer = io.StringIO()
+    escritor = csv.DictWriter(buffer, fieldnames=COLUMNAS_CSV, extrasaction='ignore')
+    escritor.writeheader()
+    for i, fila in enumerate(filas, 1):
+        escritor.writerow(fila)
+        if i % FILAS_POR_TROZO == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def generar_jsonl(objetos):
+    """Convertir dicts en trozos de texto JSONL"""
+    trozo = []
+    for objeto in objetos:
+        trozo.append(json.dumps(objeto, ensure_ascii=False))
+        if len(trozo) >= FILAS_POR_TROZO:
+            yield '\n'.join(trozo) + '\n'
+            trozo = []
+    if trozo:
+        yield '\n'.join(trozo) + '\n'
+
+
+def booleano(valor):
+    """Leer un booleano de CSV/JSON: "false", "no" o "0" son False; null o vacío, None
+
+    None es lo que exporta una serie sin valor guardado, así que se importa igual.
+    """
+    if valor is None or isinstance(valor, bool):
+        return valor
+    texto = str(valor).strip().lower()
+    if not texto:
+        return None
+    return texto not in ('0', 'false', 'no', 'n')
+
+
+def _leer_csv(texto):
+    sesion = None
+    clave_sesion = None
+    for linea, fila in enumerate(csv.DictReader(texto), 2):
+        tipo = (fila.get('tipo') or 'serie').strip().lower()
+        if tipo == 'peso':
+            if sesion:
+                yield sesion
+                sesion = clave_sesion = None
+            yield {'tipo': 'peso', 'linea': linea, 'fecha': fila.get('fecha'),
+                   'peso': fila.get('peso'), 'notas': fila.get('notas') or ''}
+            continue
+
+        clave = fila.get('sesion') or (fila.get('fecha'), fila.get('ejercicio'))
+        if sesion is None or clave != clave_sesion:
+            if sesion:
+                yield sesion
+            sesion = {'tipo': 'sesion', 'linea': linea, 'fecha': fila.get('fecha'),
+                      'ejercicio': fila.get('ejercicio'), 'grupo_muscular': fila.get('grupo_muscular'),
+                      'notas': fila.get('notas') or '', 'series': []}
+            clave_sesion = clave
+        if fila.get('peso') not in (None, ''):
+            sesion['series'].append({'peso': fila['peso'], 'repeticiones': fila.get('repeticiones'),
+                                     'completada': booleano(fila.get('completada', True))})
+    if sesion:
+        yield sesion
+
+
+def _leer_jsonl(texto):
+    for linea, contenido in enumerate(texto, 1):
+        if not contenido.strip():
+            continue
+        try:
+            objeto = json.loads(contenido)
+        except json.JSONDecodeError:
+            objeto = {'tipo': 'invalido'}
+        if not isinstance(objeto, dict):
+            objeto = {'tipo': 'invalido'}
+        objeto.setdefault('tipo', 'sesion')
+        objeto['linea'] = linea
+        yield objeto
+
+
+def leer_registros(texto, formato):
+    """Leer sesiones y pesos de un fichero de texto ('csv' o 'jsonl')
+
+    Devuelve un generador de dicts con ``tipo`` ('sesion' o 'peso') y ``linea``.
+    """
+    if formato == 'csv':
+        return _leer_csv(texto)
+    return _leer_jsonl(texto)
+
+
+def _valor_copy(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, bool):
+        return 't' if valor else 'f'
+    return valor
+
+
+def copiar_filas(conexion_dbapi, tabla, columnas, filas):
+    """Cargar filas con COPY ... FROM STDIN (psycopg2)"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    for fila in filas:
+        escritor.writerow([_valor_copy(fila[columna]) for columna in columnas])
+    buffer.seek(0)
+    with conexion_dbapi.cursor() as cursor:
+        cursor.copy_expert(
+            f'COPY {tabla} ({", ".join(columnas)}) FROM STDIN WITH (FORMAT csv)', buffer
+        )